@@ -4,6 +4,7 @@ import (
 	"log"
 	"os"
 
+	"github.com/go-go-golems/glazed/pkg/cli"
 	glazed_logging "github.com/go-go-golems/glazed/pkg/cmds/logging"
 	glaze_help "github.com/go-go-golems/glazed/pkg/help"
 	help_cmd "github.com/go-go-golems/glazed/pkg/help/cmd"
@@ -32,13 +33,10 @@ func main() {
 	cobra.CheckErr(err)
 	help_cmd.SetupCobraRootCommand(hs, rootCmd)
 
-	serveCmd := &cobra.Command{
-		Use:   "serve",
-		Short: "Start the mock server",
-		RunE: func(cmd *cobra.Command, args []string) error {
-			return server.StartHTTPServer()
-		},
-	}
+	serveCommand, err := NewServeCommand()
+	cobra.CheckErr(err)
+	serveCmd, err := cli.BuildCobraCommandFromCommand(serveCommand)
+	cobra.CheckErr(err)
 	rootCmd.AddCommand(serveCmd)
 
 	// Default to serve when no subcommand provided
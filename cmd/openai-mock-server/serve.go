@@ -0,0 +1,62 @@
+package main
+
+import (
+	"context"
+
+	"github.com/go-go-golems/glazed/pkg/cmds"
+	"github.com/go-go-golems/glazed/pkg/cmds/layers"
+	"github.com/go-go-golems/glazed/pkg/cmds/parameters"
+	server "mock-openai-server/pkg/server"
+)
+
+const serveSlug = "serve"
+
+// ServeSettings is the serve section of the command line; each setting
+// overrides its server.* config key for the run.
+type ServeSettings struct {
+	Listen    []string `glazed.parameter:"listen"`
+	ReadyFile string   `glazed.parameter:"ready-file"`
+	Workers   int      `glazed.parameter:"workers"`
+}
+
+// ServeCommand starts the mock server.
+type ServeCommand struct {
+	*cmds.CommandDescription
+}
+
+var _ cmds.BareCommand = (*ServeCommand)(nil)
+
+func NewServeCommand() (*ServeCommand, error) {
+	serveLayer, err := layers.NewParameterLayer(serveSlug, "Serve settings",
+		layers.WithParameterDefinitions(
+			parameters.NewParameterDefinition("listen", parameters.ParameterTypeStringList,
+				parameters.WithHelp("Addresses to serve on, repeatable or comma separated: host:port (port 0 picks a free one) or unix:/path.sock (default: server.listen, then server.port)")),
+			parameters.NewParameterDefinition("ready-file", parameters.ParameterTypeString,
+				parameters.WithHelp("Write the bound addresses to this file once listening (default: server.ready_file)")),
+			parameters.NewParameterDefinition("workers", parameters.ParameterTypeInteger,
+				parameters.WithDefault(0),
+				parameters.WithHelp("Run N server processes sharing the TCP addresses via SO_REUSEPORT (default: server.workers)")),
+		),
+	)
+	if err != nil {
+		return nil, err
+	}
+	return &ServeCommand{
+		CommandDescription: cmds.NewCommandDescription("serve",
+			cmds.WithShort("Start the mock server"),
+			cmds.WithLayersList(serveLayer),
+		),
+	}, nil
+}
+
+func (c *ServeCommand) Run(ctx context.Context, parsedLayers *layers.ParsedLayers) error {
+	s := &ServeSettings{}
+	if err := parsedLayers.InitializeStruct(serveSlug, s); err != nil {
+		return err
+	}
+	return server.Serve(server.ServeOptions{
+		Listen:    s.Listen,
+		ReadyFile: s.ReadyFile,
+		Workers:   s.Workers,
+	})
+}
@@ -0,0 +1,94 @@
+package server
+
+import (
+	"encoding/json"
+	"fmt"
+	"log"
+	"net"
+	"net/http"
+	"net/http/pprof"
+	"runtime"
+	"strconv"
+	"sync/atomic"
+
+	cfg "mock-openai-server/pkg/server/config"
+)
+
+// blockProfileRate remembers the rate last passed to
+// runtime.SetBlockProfileRate, which has no getter.
+var blockProfileRate atomic.Int64
+
+// startAdminServer starts the profiling listener when admin.listen is set
+// and applies the configured profile rates. It returns once the address is
+// bound, so a bad address fails startup rather than a background goroutine.
+func startAdminServer(conf cfg.AdminConfig) error {
+	if conf.Listen == "" {
+		return nil
+	}
+	setProfileRates(conf.MutexProfileFraction, conf.BlockProfileRate)
+	ln, err := net.Listen("tcp", conf.Listen)
+	if err != nil {
+		return fmt.Errorf("admin listener: %w", err)
+	}
+	log.Printf("[admin] Profiling on http://%s/debug/pprof/ (mutex fraction %d, block rate %d)", ln.Addr(), conf.MutexProfileFraction, conf.BlockProfileRate)
+	go func() {
+		if err := http.Serve(ln, newAdminMux()); err != nil {
+			log.Printf("[admin] Listener stopped: %v", err)
+		}
+	}()
+	return nil
+}
+
+// newAdminMux serves net/http/pprof (CPU, heap, goroutine, mutex, block and
+// the other runtime profiles, plus execution traces at /debug/pprof/trace)
+// and the profile rate controls. It is a mux of its own: importing pprof
+// also registers on http.DefaultServeMux, which is never served.
+func newAdminMux() *http.ServeMux {
+	m := http.NewServeMux()
+	m.HandleFunc("/debug/pprof/", pprof.Index)
+	m.HandleFunc("/debug/pprof/cmdline", pprof.Cmdline)
+	m.HandleFunc("/debug/pprof/profile", pprof.Profile)
+	m.HandleFunc("/debug/pprof/symbol", pprof.Symbol)
+	m.HandleFunc("/debug/pprof/trace", pprof.Trace)
+	m.HandleFunc("/debug/rates", handleProfileRates)
+	return m
+}
+
+func setProfileRates(mutex, block int) {
+	runtime.SetMutexProfileFraction(mutex)
+	runtime.SetBlockProfileRate(block)
+	blockProfileRate.Store(int64(block))
+}
+
+// handleProfileRates reports the mutex and block profile rates; a POST
+// with ?mutex=n and/or ?block=n changes them until the next restart.
+func handleProfileRates(w http.ResponseWriter, r *http.Request) {
+	if r.Method == http.MethodPost {
+		mutex := runtime.SetMutexProfileFraction(-1)
+		block := int(blockProfileRate.Load())
+		for _, p := range []struct {
+			name string
+			v    *int
+		}{{"mutex", &mutex}, {"block", &block}} {
+			s := r.URL.Query().Get(p.name)
+			if s == "" {
+				continue
+			}
+			n, err := strconv.Atoi(s)
+			if err != nil || n < 0 {
+				writeBadRequest(w, fmt.Errorf("%s: want a non-negative integer, got %q", p.name, s))
+				return
+			}
+			*p.v = n
+		}
+		setProfileRates(mutex, block)
+	} else if r.Method != http.MethodGet {
+		http.Error(w, "method not allowed", http.StatusMethodNotAllowed)
+		return
+	}
+	w.Header().Set("Content-Type", "application/json")
+	_ = json.NewEncoder(w).Encode(map[string]int{
+		"mutex_profile_fraction": runtime.SetMutexProfileFraction(-1),
+		"block_profile_rate":     int(blockProfileRate.Load()),
+	})
+}
@@ -0,0 +1,78 @@
+package server
+
+import (
+	"encoding/json"
+	"net/http"
+	"net/http/httptest"
+	"strings"
+	"testing"
+
+	cfg "mock-openai-server/pkg/server/config"
+)
+
+func TestAdminServer(t *testing.T) {
+	if err := startAdminServer(cfg.AdminConfig{}); err != nil {
+		t.Fatalf("disabled admin listener: %v", err)
+	}
+	if err := startAdminServer(cfg.AdminConfig{Listen: "256.0.0.1:1"}); err == nil {
+		t.Fatal("expected an error for an unusable admin address")
+	}
+
+	srv := httptest.NewServer(newAdminMux())
+	defer srv.Close()
+	defer setProfileRates(0, 0)
+
+	resp, err := http.Get(srv.URL + "/debug/pprof/")
+	if err != nil {
+		t.Fatal(err)
+	}
+	resp.Body.Close()
+	if resp.StatusCode != http.StatusOK {
+		t.Fatalf("pprof index: status %d", resp.StatusCode)
+	}
+	resp, err = http.Get(srv.URL + "/debug/pprof/goroutine?debug=1")
+	if err != nil {
+		t.Fatal(err)
+	}
+	resp.Body.Close()
+	if resp.StatusCode != http.StatusOK {
+		t.Fatalf("goroutine profile: status %d", resp.StatusCode)
+	}
+
+	rates := func(method, query string) (int, map[string]int) {
+		t.Helper()
+		req, _ := http.NewRequest(method, srv.URL+"/debug/rates"+query, nil)
+		resp, err := http.DefaultClient.Do(req)
+		if err != nil {
+			t.Fatal(err)
+		}
+		defer resp.Body.Close()
+		var out map[string]int
+		if resp.StatusCode == http.StatusOK {
+			if err := json.NewDecoder(resp.Body).Decode(&out); err != nil {
+				t.Fatal(err)
+			}
+		}
+		return resp.StatusCode, out
+	}
+	if code, got := rates(http.MethodPost, "?mutex=5&block=1000"); code != http.StatusOK || got["mutex_profile_fraction"] != 5 || got["block_profile_rate"] != 1000 {
+		t.Fatalf("set rates: %d %v", code, got)
+	}
+	if _, got := rates(http.MethodPost, "?block=0"); got["mutex_profile_fraction"] != 5 || got["block_profile_rate"] != 0 {
+		t.Fatalf("unset rates must be kept: %v", got)
+	}
+	if code, _ := rates(http.MethodPost, "?mutex=-1"); code != http.StatusBadRequest {
+		t.Fatalf("negative rate: status %d", code)
+	}
+	if code, _ := rates(http.MethodDelete, ""); code != http.StatusMethodNotAllowed {
+		t.Fatalf("DELETE: status %d", code)
+	}
+	if _, got := rates(http.MethodGet, ""); got["mutex_profile_fraction"] != 5 {
+		t.Fatalf("get rates: %v", got)
+	}
+
+	conf := &cfg.BotConfig{Admin: cfg.AdminConfig{BlockProfileRate: -1}}
+	if err := conf.Compile(); err == nil || !strings.Contains(err.Error(), "admin") {
+		t.Fatalf("negative configured rate: %v", err)
+	}
+}
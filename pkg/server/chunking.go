@@ -0,0 +1,114 @@
+package server
+
+import (
+	"strings"
+	"unicode"
+	"unicode/utf8"
+
+	cfg "mock-openai-server/pkg/server/config"
+	"mock-openai-server/pkg/server/tokenizer"
+)
+
+// splitChunks cuts text into stream deltas of k.Size units each. The deltas
+// are substrings of text and concatenate back to it exactly, so newlines
+// and indentation survive streaming. Whitespace belongs to the unit before
+// it (leading whitespace to the first unit). Token units are the model's
+// tokens when a vocabulary is loaded, and otherwise the pieces its
+// encoding's pre-tokenizer splits text into before BPE.
+func splitChunks(text string, k cfg.ChunkingConfig, conf *cfg.BotConfig, model string) []string {
+	if text == "" {
+		return nil
+	}
+	size := k.Size
+	if size <= 0 {
+		size = 1
+	}
+	var next func(s string) int
+	switch k.Unit {
+	case cfg.ChunkChars:
+		next = nextChar
+	case cfg.ChunkBytes:
+		return splitBytes(text, size)
+	case cfg.ChunkTokens:
+		if enc := conf.TokenizerFor(model); enc != nil {
+			return joinChunks(text, enc.Split(text), size)
+		}
+		if next = tokenizer.Pretokenizer(conf.EncodingFor(model)); next == nil {
+			next = tokenizer.Pretokenizer(tokenizer.O200K)
+		}
+	default:
+		next = nextWord
+	}
+	chunks := make([]string, 0, len(text)/(6*size)+1)
+	for text != "" {
+		n := 0
+		for u := 0; u < size && n < len(text); u++ {
+			n += next(text[n:])
+		}
+		chunks = append(chunks, text[:n])
+		text = text[n:]
+	}
+	return chunks
+}
+
+// joinChunks groups consecutive substrings of text, size at a time.
+func joinChunks(text string, parts []string, size int) []string {
+	if size == 1 {
+		return parts
+	}
+	chunks := make([]string, 0, len(parts)/size+1)
+	start := 0
+	for i := 0; i < len(parts); i += size {
+		n := 0
+		for _, p := range parts[i:min(i+size, len(parts))] {
+			n += len(p)
+		}
+		chunks = append(chunks, text[start:start+n])
+		start += n
+	}
+	return chunks
+}
+
+// splitBytes cuts text every size bytes, moving each cut back to a rune
+// boundary: a split rune would be replaced by U+FFFD when JSON-encoded.
+func splitBytes(text string, size int) []string {
+	chunks := make([]string, 0, len(text)/size+1)
+	for text != "" {
+		n := size
+		if n >= len(text) {
+			n = len(text)
+		} else {
+			for n > 0 && !utf8.RuneStart(text[n]) {
+				n--
+			}
+			if n == 0 {
+				// a single rune longer than size
+				_, n = utf8.DecodeRuneInString(text)
+			}
+		}
+		chunks = append(chunks, text[:n])
+		text = text[n:]
+	}
+	return chunks
+}
+
+func nextChar(s string) int {
+	if s[0] < utf8.RuneSelf {
+		return 1
+	}
+	_, n := utf8.DecodeRuneInString(s)
+	return n
+}
+
+// nextWord is one whitespace-separated word with the whitespace around it.
+func nextWord(s string) int {
+	n := 0
+	for _, space := range [...]bool{true, false, true} {
+		i := strings.IndexFunc(s[n:], func(r rune) bool { return unicode.IsSpace(r) != space })
+		if i < 0 {
+			return len(s)
+		}
+		n += i
+	}
+	return n
+}
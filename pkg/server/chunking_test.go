@@ -0,0 +1,146 @@
+package server
+
+import (
+	"context"
+	"fmt"
+	"strings"
+	"testing"
+	"time"
+	"unicode/utf8"
+
+	cfg "mock-openai-server/pkg/server/config"
+)
+
+const chunkingText = "  Hello, world!\n\n\tdef f(x):\n        return x*2  # dbl\nPrice: 12345.67 €, naïve café 🚀🚀 done.  \n"
+
+func TestSplitChunksPreservesText(t *testing.T) {
+	for _, unit := range []string{cfg.ChunkWords, cfg.ChunkChars, cfg.ChunkBytes, cfg.ChunkTokens} {
+		for _, size := range []int{1, 2, 3, 7, 1000} {
+			chunks := splitChunks(chunkingText, cfg.ChunkingConfig{Unit: unit, Size: size}, nil, "gpt-4o")
+			if got := strings.Join(chunks, ""); got != chunkingText {
+				t.Fatalf("%s/%d: chunks rebuild %q", unit, size, got)
+			}
+			for _, c := range chunks {
+				if c == "" || !utf8.ValidString(c) {
+					t.Fatalf("%s/%d: bad chunk %q", unit, size, c)
+				}
+			}
+		}
+	}
+}
+
+func TestSplitChunksUnits(t *testing.T) {
+	cases := []struct {
+		unit string
+		size int
+		text string
+		want []string
+	}{
+		{cfg.ChunkWords, 1, " a  b\nc ", []string{" a  ", "b\n", "c "}},
+		{cfg.ChunkWords, 2, "one two three", []string{"one two ", "three"}},
+		{cfg.ChunkChars, 2, "héllo", []string{"hé", "ll", "o"}},
+		{cfg.ChunkBytes, 2, "héllo", []string{"h", "é", "ll", "o"}},
+		{cfg.ChunkBytes, 1, "🚀", []string{"🚀"}},
+		{cfg.ChunkTokens, 1, "Hello, world  123456!", []string{"Hello", ",", " world", " ", " ", "123", "456", "!"}},
+	}
+	for _, tc := range cases {
+		got := splitChunks(tc.text, cfg.ChunkingConfig{Unit: tc.unit, Size: tc.size}, nil, "gpt-4o")
+		if fmt.Sprintf("%q", got) != fmt.Sprintf("%q", tc.want) {
+			t.Errorf("%s/%d %q: got %q, want %q", tc.unit, tc.size, tc.text, got, tc.want)
+		}
+	}
+
+	// without a vocabulary, tokens follow the model's encoding
+	for model, want := range map[string][]string{
+		"gpt-4o": {"It's", " done"},
+		"gpt-4":  {"It", "'s", " done"},
+	} {
+		got := splitChunks("It's done", cfg.ChunkingConfig{Unit: cfg.ChunkTokens, Size: 1}, nil, model)
+		if fmt.Sprintf("%q", got) != fmt.Sprintf("%q", want) {
+			t.Errorf("%s: got %q, want %q", model, got, want)
+		}
+	}
+}
+
+func TestStreamCoalescesFrames(t *testing.T) {
+	s := newStreamScheduler(1, time.Millisecond)
+	rec := &recordingStream{}
+	chunks := splitChunks(chunkingText, cfg.ChunkingConfig{Unit: cfg.ChunkChars, Size: 4}, nil, "gpt-4o")
+	s.run(context.Background(), streamJob{
+		w: rec, flusher: rec, n: len(chunks), batch: 5,
+		delay: constantGap(20 * time.Millisecond),
+		frame: func(i int) []byte { return []byte(chunks[i]) },
+	})
+	if strings.Join(rec.frames, "") != chunkingText {
+		t.Fatalf("stream rebuilt %q", strings.Join(rec.frames, ""))
+	}
+	// groups that fall due in the same tick (e.g. after a stall) share a
+	// flush, so this is an upper bound
+	if want := (len(chunks) + 4) / 5; rec.flushes > want || rec.flushes < 2 {
+		t.Fatalf("%d frames flushed %d times, want up to %d", len(chunks), rec.flushes, want)
+	}
+}
+
+// TestStreamDelayMatchesTotal checks a stream paced by a latency profile
+// takes as long as the non-streaming wait for the same text, however it is
+// chunked and coalesced.
+func TestStreamDelayMatchesTotal(t *testing.T) {
+	for _, vocab := range []bool{false, true} {
+		conf := &cfg.BotConfig{Models: []cfg.ModelConfig{{ID: "gpt-4o", Latency: &cfg.LatencyProfile{TTFTMs: 100, TokensPerSecond: 10}}}}
+		if vocab {
+			conf.Tokenizer.VocabDir = tinyVocabDir(t)
+		}
+		if err := conf.Compile(); err != nil {
+			t.Fatal(err)
+		}
+		tokens := tokenCounterFor(conf, "gpt-4o")
+		want := conf.LatencyFor("gpt-4o", nil).Total(tokens.count(chunkingText))
+		for _, k := range []cfg.ChunkingConfig{
+			{Unit: cfg.ChunkTokens, Size: 1, Coalesce: 1},
+			{Unit: cfg.ChunkTokens, Size: 3, Coalesce: 1},
+			{Unit: cfg.ChunkTokens, Size: 2, Coalesce: 4},
+			{Unit: cfg.ChunkWords, Size: 1, Coalesce: 1},
+			{Unit: cfg.ChunkChars, Size: 5, Coalesce: 2},
+			{Unit: cfg.ChunkBytes, Size: 1, Coalesce: 1},
+		} {
+			pacing := cfg.Pacing{Latency: conf.LatencyFor("gpt-4o", nil), Chunking: k}
+			chunks := splitChunks(chunkingText, k, conf, "gpt-4o")
+			delay := streamDelay(conf, "gpt-4o", latencyOverride{}, pacing, chunkingText, chunks)
+			var got time.Duration
+			for i := 0; i < len(chunks); i += k.Coalesce {
+				got += delay(i)
+			}
+			if got != want {
+				t.Errorf("vocab %v, %+v: stream takes %v, non-streaming %v", vocab, k, got, want)
+			}
+		}
+	}
+}
+
+// BenchmarkStreamChunking splits and encodes a 16KB response at different
+// frame granularities; SetBytes makes the result a throughput.
+func BenchmarkStreamChunking(b *testing.B) {
+	text := strings.Repeat(chunkingText, 16<<10/len(chunkingText))
+	for _, k := range []cfg.ChunkingConfig{
+		{Unit: cfg.ChunkBytes, Size: 1},
+		{Unit: cfg.ChunkChars, Size: 1},
+		{Unit: cfg.ChunkTokens, Size: 1},
+		{Unit: cfg.ChunkWords, Size: 1},
+		{Unit: cfg.ChunkWords, Size: 32},
+		{Unit: cfg.ChunkBytes, Size: 4096},
+	} {
+		b.Run(fmt.Sprintf("%s=%d", k.Unit, k.Size), func(b *testing.B) {
+			enc := newChatChunkEncoder("chatcmpl-1", "gpt-4o", 1700000000)
+			b.SetBytes(int64(len(text)))
+			b.ReportAllocs()
+			frames := 0
+			for i := 0; i < b.N; i++ {
+				for _, c := range splitChunks(text, k, nil, "gpt-4o") {
+					frames++
+					_ = enc.frame(c)
+				}
+			}
+			b.ReportMetric(float64(frames)/float64(b.N), "frames/op")
+		})
+	}
+}
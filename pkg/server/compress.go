@@ -0,0 +1,193 @@
+package server
+
+import (
+	"compress/gzip"
+	"io"
+	"net/http"
+	"strconv"
+	"strings"
+	"sync"
+
+	cfg "mock-openai-server/pkg/server/config"
+)
+
+// Defaults for server.compression.
+const (
+	defaultCompressMinBytes = 1024
+	defaultCompressLevel    = 6
+)
+
+// gzipPools keeps reusable compressors per level; a gzip.Writer carries
+// several hundred KB of state, so allocating one per response would cost
+// more than compressing a typical body.
+var gzipPools [gzip.BestCompression + 1]sync.Pool
+
+func getGzipWriter(w io.Writer, level int) *gzip.Writer {
+	if gz, ok := gzipPools[level].Get().(*gzip.Writer); ok {
+		gz.Reset(w)
+		return gz
+	}
+	gz, _ := gzip.NewWriterLevel(w, level) // level is validated by Compile
+	return gz
+}
+
+func putGzipWriter(gz *gzip.Writer, level int) {
+	gz.Reset(io.Discard) // drop the reference to the response
+	gzipPools[level].Put(gz)
+}
+
+// acceptsGzip reports whether the request's Accept-Encoding allows gzip,
+// named or through "*", with a non-zero quality.
+func acceptsGzip(r *http.Request) bool {
+	gzipQ, anyQ := -1.0, -1.0
+	for _, h := range r.Header.Values("Accept-Encoding") {
+		for _, part := range strings.Split(h, ",") {
+			name, params, _ := strings.Cut(part, ";")
+			q := 1.0
+			if v, ok := strings.CutPrefix(strings.TrimSpace(params), "q="); ok {
+				q, _ = strconv.ParseFloat(strings.TrimSpace(v), 64)
+			}
+			switch name = strings.TrimSpace(name); {
+			case strings.EqualFold(name, "gzip"):
+				gzipQ = q
+			case name == "*":
+				anyQ = q
+			}
+		}
+	}
+	if gzipQ >= 0 {
+		return gzipQ > 0
+	}
+	return anyQ > 0
+}
+
+// compressionMiddleware gzips responses for clients that accept it, per
+// server.compression. Bodies are held back until min_bytes have been
+// written: smaller ones go out as they are, since gzip would cost more
+// than it saves. It runs outside the metrics middleware, so handlers
+// still see the metrics writer (and the byte counts are uncompressed).
+func compressionMiddleware(next http.Handler) http.Handler {
+	return http.HandlerFunc(func(w http.ResponseWriter, r *http.Request) {
+		conf := cfg.Get()
+		if conf == nil || !conf.Server.Compression.Enabled {
+			next.ServeHTTP(w, r)
+			return
+		}
+		w.Header().Add("Vary", "Accept-Encoding")
+		if r.Method == http.MethodHead || !acceptsGzip(r) {
+			next.ServeHTTP(w, r)
+			return
+		}
+		cc := conf.Server.Compression
+		cw := &compressWriter{ResponseWriter: w, minBytes: cc.MinBytes, level: cc.Level, streams: cc.Streams}
+		if cw.minBytes == 0 {
+			cw.minBytes = defaultCompressMinBytes
+		}
+		if cw.level == 0 {
+			cw.level = defaultCompressLevel
+		}
+		next.ServeHTTP(cw, r)
+		cw.close()
+	})
+}
+
+// compressWriter decides on the encoding once the body reaches minBytes,
+// the handler returns or flushes, or an event stream starts.
+type compressWriter struct {
+	http.ResponseWriter
+	minBytes int
+	level    int
+	streams  bool
+
+	status  int
+	decided bool
+	buf     []byte // body held back until decided
+	gz      *gzip.Writer
+}
+
+func (c *compressWriter) WriteHeader(code int) {
+	if c.decided {
+		c.ResponseWriter.WriteHeader(code)
+		return
+	}
+	if c.status == 0 && code >= 200 {
+		c.status = code
+	}
+}
+
+func (c *compressWriter) Write(p []byte) (int, error) {
+	if !c.decided {
+		switch {
+		case c.isStream():
+			c.decide(c.streams)
+		case len(c.buf)+len(p) < c.minBytes:
+			c.buf = append(c.buf, p...)
+			return len(p), nil
+		default:
+			c.decide(true)
+		}
+	}
+	if c.gz != nil {
+		return c.gz.Write(p)
+	}
+	return c.ResponseWriter.Write(p)
+}
+
+// Flush sends everything written so far. For an SSE stream with
+// streams on, the compressor is sync-flushed so the client can decode
+// each frame as it arrives.
+func (c *compressWriter) Flush() {
+	if !c.decided {
+		c.decide(c.isStream() && c.streams)
+	}
+	if c.gz != nil {
+		_ = c.gz.Flush()
+	}
+	if f, ok := c.ResponseWriter.(http.Flusher); ok {
+		f.Flush()
+	}
+}
+
+// Unwrap lets http.ResponseController reach the underlying writer.
+func (c *compressWriter) Unwrap() http.ResponseWriter {
+	return c.ResponseWriter
+}
+
+func (c *compressWriter) isStream() bool {
+	return strings.HasPrefix(c.Header().Get("Content-Type"), "text/event-stream")
+}
+
+// decide sends the header, gzip-encoded if compress and the response
+// allows it, followed by the held-back body.
+func (c *compressWriter) decide(compress bool) {
+	c.decided = true
+	h := c.Header()
+	if compress && h.Get("Content-Encoding") == "" && c.status != http.StatusNoContent && c.status != http.StatusNotModified {
+		h.Set("Content-Encoding", "gzip")
+		h.Del("Content-Length")
+		c.gz = getGzipWriter(c.ResponseWriter, c.level)
+	}
+	if c.status != 0 {
+		c.ResponseWriter.WriteHeader(c.status)
+	}
+	if len(c.buf) > 0 {
+		if c.gz != nil {
+			_, _ = c.gz.Write(c.buf)
+		} else {
+			_, _ = c.ResponseWriter.Write(c.buf)
+		}
+		c.buf = nil
+	}
+}
+
+// close finishes the response once the handler has returned.
+func (c *compressWriter) close() {
+	if !c.decided {
+		c.decide(false)
+	}
+	if c.gz != nil {
+		_ = c.gz.Close()
+		putGzipWriter(c.gz, c.level)
+		c.gz = nil
+	}
+}
@@ -0,0 +1,199 @@
+package server
+
+import (
+	"bufio"
+	"compress/gzip"
+	"fmt"
+	"io"
+	"math/rand"
+	"net/http"
+	"net/http/httptest"
+	"strconv"
+	"strings"
+	"testing"
+
+	cfg "mock-openai-server/pkg/server/config"
+)
+
+func TestAcceptsGzip(t *testing.T) {
+	for header, want := range map[string]bool{
+		"":                        false,
+		"gzip":                    true,
+		"deflate, gzip;q=0.5":     true,
+		"br, GZIP":                true,
+		"gzip;q=0":                false,
+		"*":                       true,
+		"gzip;q=0, *":             false,
+		"identity, *;q=0":         false,
+		"deflate;q=1, gzip;q=0.0": false,
+	} {
+		r := httptest.NewRequest(http.MethodGet, "/", nil)
+		if header != "" {
+			r.Header.Set("Accept-Encoding", header)
+		}
+		if got := acceptsGzip(r); got != want {
+			t.Errorf("Accept-Encoding %q: got %v, want %v", header, got, want)
+		}
+	}
+}
+
+// useCompression installs a config with compression on for the test.
+func useCompression(tb testing.TB, cc cfg.CompressionConfig) {
+	tb.Helper()
+	cc.Enabled = true
+	conf := &cfg.BotConfig{Server: cfg.ServerConfig{Compression: cc}}
+	if err := conf.Compile(); err != nil {
+		tb.Fatal(err)
+	}
+	prev := cfg.Get()
+	cfg.Set(conf)
+	tb.Cleanup(func() { cfg.Set(prev) })
+}
+
+func TestCompressionThreshold(t *testing.T) {
+	useCompression(t, cfg.CompressionConfig{MinBytes: 100})
+	for _, size := range []int{10, 1000} {
+		body := strings.Repeat("x", size)
+		h := compressionMiddleware(http.HandlerFunc(func(w http.ResponseWriter, r *http.Request) {
+			w.Header().Set("Content-Type", "application/json")
+			w.WriteHeader(http.StatusCreated)
+			for i := 0; i < size; i += 10 {
+				_, _ = io.WriteString(w, body[i:i+10])
+			}
+		}))
+		r := httptest.NewRequest(http.MethodGet, "/", nil)
+		r.Header.Set("Accept-Encoding", "gzip")
+		rec := httptest.NewRecorder()
+		h.ServeHTTP(rec, r)
+
+		got := rec.Body.String()
+		if rec.Header().Get("Content-Encoding") == "gzip" {
+			zr, err := gzip.NewReader(rec.Body)
+			if err != nil {
+				t.Fatal(err)
+			}
+			b, _ := io.ReadAll(zr)
+			got = string(b)
+		} else if size >= 100 {
+			t.Errorf("%d bytes were not compressed", size)
+		}
+		if size < 100 && rec.Header().Get("Content-Encoding") != "" {
+			t.Errorf("%d bytes were compressed", size)
+		}
+		if rec.Code != http.StatusCreated || got != body || rec.Header().Get("Vary") != "Accept-Encoding" {
+			t.Errorf("%d bytes: status %d, vary %q, body intact %v", size, rec.Code, rec.Header().Get("Vary"), got == body)
+		}
+	}
+}
+
+// TestCompressedStream checks each SSE frame can be decoded as soon as it
+// is flushed, before the next one is written.
+func TestCompressedStream(t *testing.T) {
+	useCompression(t, cfg.CompressionConfig{Streams: true})
+	next := make(chan struct{})
+	srv := httptest.NewServer(compressionMiddleware(http.HandlerFunc(func(w http.ResponseWriter, r *http.Request) {
+		w.Header().Set("Content-Type", "text/event-stream")
+		for i := 0; i < 3; i++ {
+			fmt.Fprintf(w, "data: frame %d\n\n", i)
+			w.(http.Flusher).Flush()
+			<-next
+		}
+	})))
+	defer srv.Close()
+
+	req, _ := http.NewRequest(http.MethodGet, srv.URL, nil)
+	req.Header.Set("Accept-Encoding", "gzip") // set by hand, so the transport does not decode
+	resp, err := http.DefaultClient.Do(req)
+	if err != nil {
+		t.Fatal(err)
+	}
+	defer resp.Body.Close()
+	if resp.Header.Get("Content-Encoding") != "gzip" {
+		t.Fatal("stream was not compressed")
+	}
+	zr, err := gzip.NewReader(resp.Body)
+	if err != nil {
+		t.Fatal(err)
+	}
+	lines := bufio.NewReader(zr)
+	for i := 0; i < 3; i++ {
+		line, err := lines.ReadString('\n')
+		if err != nil || line != "data: frame "+strconv.Itoa(i)+"\n" {
+			t.Fatalf("frame %d: %q, %v", i, line, err)
+		}
+		_, _ = lines.ReadString('\n')
+		next <- struct{}{}
+	}
+}
+
+// wireCounter is a ResponseWriter that counts the bytes it is sent.
+type wireCounter struct {
+	h http.Header
+	n int
+}
+
+func (w *wireCounter) Header() http.Header         { return w.h }
+func (w *wireCounter) Write(b []byte) (int, error) { w.n += len(b); return len(b), nil }
+func (w *wireCounter) WriteHeader(int)             {}
+
+// BenchmarkCompression weighs the CPU cost of each gzip level against the
+// bytes saved on a Responses API list page and a long chat completion.
+func BenchmarkCompression(b *testing.B) {
+	// model output stand-in: random common words, about as compressible as prose
+	words := strings.Fields("the of and to in is that for it as with was on be by this are from at or an have not which but they all their can more has one will also been model data time when other into some these than its may used only two new first over such most")
+	rng := rand.New(rand.NewSource(1))
+	text := make([]string, 1500)
+	for i := range text {
+		text[i] = words[rng.Intn(len(words))]
+	}
+	conf := &cfg.BotConfig{Fallback: cfg.RespondWrapper{Text: strings.Join(text, " ")}}
+	if err := conf.Compile(); err != nil {
+		b.Fatal(err)
+	}
+	prev, prevStore := cfg.Get(), responseStore
+	cfg.Set(conf)
+	responseStore = newShardedStore(storeOptions{})
+	defer func() { cfg.Set(prev); responseStore = prevStore }()
+
+	for i := 0; i < 20; i++ {
+		body := `{"model":"gpt-4o","input":"question ` + strconv.Itoa(i) + `"}`
+		handleResponsesCreate(httptest.NewRecorder(), httptest.NewRequest(http.MethodPost, "/v1/responses", strings.NewReader(body)))
+	}
+	list := httptest.NewRecorder()
+	handleResponsesList(list, httptest.NewRequest(http.MethodGet, "/v1/responses?limit=20", nil))
+	chat := httptest.NewRecorder()
+	handleChatCompletions(chat, httptest.NewRequest(http.MethodPost, "/v1/chat/completions", strings.NewReader(`{"model":"gpt-4o","messages":[{"role":"user","content":"hi"}]}`)))
+
+	for _, payload := range []struct {
+		name string
+		body []byte
+	}{{"list20", list.Body.Bytes()}, {"chat", chat.Body.Bytes()}} {
+		for _, level := range []int{0, 1, 6, 9} {
+			b.Run(fmt.Sprintf("%s/level=%d", payload.name, level), func(b *testing.B) {
+				useCompression(b, cfg.CompressionConfig{Level: level})
+				body := payload.body
+				h := compressionMiddleware(http.HandlerFunc(func(w http.ResponseWriter, r *http.Request) {
+					w.Header().Set("Content-Type", "application/json")
+					_, _ = w.Write(body)
+				}))
+				r := httptest.NewRequest(http.MethodGet, "/v1/responses", nil)
+				if level > 0 { // level=0: a client without gzip, the baseline
+					r.Header.Set("Accept-Encoding", "gzip")
+				}
+				w := &wireCounter{h: http.Header{}}
+				b.SetBytes(int64(len(body)))
+				b.ReportAllocs()
+				b.ResetTimer()
+				for i := 0; i < b.N; i++ {
+					w.n = 0
+					for k := range w.h {
+						delete(w.h, k)
+					}
+					h.ServeHTTP(w, r)
+				}
+				b.ReportMetric(float64(w.n), "wire-B/op")
+				b.ReportMetric(float64(len(body))/float64(w.n), "ratio")
+			})
+		}
+	}
+}
@@ -0,0 +1,151 @@
+package config
+
+// acMatcher is an Aho–Corasick automaton over every lowercased `contains`
+// needle in the rule set. A single pass over a text reports, for every rule,
+// whether any of its needles occurs, so the cost of the contains check no
+// longer grows with the number of rules and needles.
+//
+// The automaton is a dense DFA over byte equivalence classes: bytes that do
+// not appear in any needle share class 0, which keeps the transition table
+// small even for large rule sets.
+type acMatcher struct {
+	classes  [256]uint16
+	nclasses int
+	// delta[state*nclasses+class] is the next state
+	delta []int32
+	// out lists the rules whose needle ends at a state; dict points to the
+	// nearest suffix state that has outputs of its own (or -1)
+	out  [][]int32
+	dict []int32
+	// always marks rules with an empty needle, which match any text
+	always []int32
+}
+
+type acTrieNode struct {
+	next map[uint16]int32
+	out  []int32
+}
+
+// newACMatcher builds the automaton from needles[rule] (already lowercased).
+// It returns nil when there are no needles at all.
+func newACMatcher(needles [][]string) *acMatcher {
+	m := &acMatcher{}
+
+	// byte classes
+	var seen [256]bool
+	for _, ns := range needles {
+		for _, n := range ns {
+			for i := 0; i < len(n); i++ {
+				seen[n[i]] = true
+			}
+		}
+	}
+	m.nclasses = 1
+	for b := 0; b < 256; b++ {
+		if seen[b] {
+			m.classes[b] = uint16(m.nclasses)
+			m.nclasses++
+		}
+	}
+
+	// trie
+	trie := []acTrieNode{{next: map[uint16]int32{}}}
+	hasNeedles := false
+	for rule, ns := range needles {
+		for _, n := range ns {
+			hasNeedles = true
+			if n == "" {
+				m.always = appendUnique(m.always, int32(rule))
+				continue
+			}
+			s := int32(0)
+			for i := 0; i < len(n); i++ {
+				c := m.classes[n[i]]
+				nx, ok := trie[s].next[c]
+				if !ok {
+					nx = int32(len(trie))
+					trie = append(trie, acTrieNode{next: map[uint16]int32{}})
+					trie[s].next[c] = nx
+				}
+				s = nx
+			}
+			trie[s].out = appendUnique(trie[s].out, int32(rule))
+		}
+	}
+	if !hasNeedles {
+		return nil
+	}
+
+	// breadth-first construction of failure links, folded straight into
+	// the DFA transitions
+	n := len(trie)
+	m.delta = make([]int32, n*m.nclasses)
+	m.out = make([][]int32, n)
+	m.dict = make([]int32, n)
+	fail := make([]int32, n)
+	for i := range trie {
+		m.out[i] = trie[i].out
+		m.dict[i] = -1
+	}
+	queue := make([]int32, 0, n)
+	for c := 0; c < m.nclasses; c++ {
+		if nx, ok := trie[0].next[uint16(c)]; ok {
+			m.delta[c] = nx
+			fail[nx] = 0
+			queue = append(queue, nx)
+		}
+	}
+	for len(queue) > 0 {
+		s := queue[0]
+		queue = queue[1:]
+		f := fail[s]
+		if len(m.out[f]) > 0 {
+			m.dict[s] = f
+		} else {
+			m.dict[s] = m.dict[f]
+		}
+		for c := 0; c < m.nclasses; c++ {
+			if nx, ok := trie[s].next[uint16(c)]; ok {
+				m.delta[int(s)*m.nclasses+c] = nx
+				fail[nx] = m.delta[int(f)*m.nclasses+c]
+				queue = append(queue, nx)
+			} else {
+				m.delta[int(s)*m.nclasses+c] = m.delta[int(f)*m.nclasses+c]
+			}
+		}
+	}
+	return m
+}
+
+func appendUnique(list []int32, v int32) []int32 {
+	for _, x := range list {
+		if x == v {
+			return list
+		}
+	}
+	return append(list, v)
+}
+
+// ruleSet is a bitset over rule indices.
+type ruleSet []uint64
+
+func newRuleSet(n int) ruleSet { return make(ruleSet, (n+63)/64) }
+
+func (s ruleSet) add(i int32)    { s[i>>6] |= 1 << (uint(i) & 63) }
+func (s ruleSet) has(i int) bool { return s[i>>6]&(1<<(uint(i)&63)) != 0 }
+
+// scan marks every rule that has a needle occurring in text.
+func (m *acMatcher) scan(text string, matched ruleSet) {
+	for _, r := range m.always {
+		matched.add(r)
+	}
+	s := int32(0)
+	for i := 0; i < len(text); i++ {
+		s = m.delta[int(s)*m.nclasses+int(m.classes[text[i]])]
+		for o := s; o > 0; o = m.dict[o] {
+			for _, r := range m.out[o] {
+				matched.add(r)
+			}
+		}
+	}
+}
@@ -0,0 +1,111 @@
+package config
+
+import (
+	"fmt"
+	"math/rand"
+	"strings"
+	"testing"
+)
+
+func TestACMatcherAgreesWithStringsContains(t *testing.T) {
+	rng := rand.New(rand.NewSource(7))
+	alphabet := "abcab c\n"
+	randStr := func(n int) string {
+		b := make([]byte, n)
+		for i := range b {
+			b[i] = alphabet[rng.Intn(len(alphabet))]
+		}
+		return string(b)
+	}
+	for round := 0; round < 200; round++ {
+		needles := make([][]string, 1+rng.Intn(20))
+		for i := range needles {
+			for j := rng.Intn(4); j >= 0; j-- {
+				needles[i] = append(needles[i], randStr(rng.Intn(5)))
+			}
+		}
+		m := newACMatcher(needles)
+		text := randStr(rng.Intn(60))
+		hits := newRuleSet(len(needles))
+		m.scan(text, hits)
+		for i, ns := range needles {
+			want := false
+			for _, n := range ns {
+				if strings.Contains(text, n) {
+					want = true
+				}
+			}
+			if hits.has(i) != want {
+				t.Fatalf("round %d: rule %d needles %q in %q: got %v want %v", round, i, ns, text, hits.has(i), want)
+			}
+		}
+	}
+}
+
+// evaluateRulesLoop is the previous per-rule, per-needle strings.Contains
+// evaluation, kept as the benchmark baseline.
+func evaluateRulesLoop(rs *compiledRuleSet, endpoint, model, lastUser, fullText string) *Rule {
+	lu := strings.ToLower(lastUser)
+	ft := strings.ToLower(fullText)
+	for i := range rs.rules {
+		cr := &rs.rules[i]
+		r := cr.rule
+		if r.Match.Endpoint != "" && r.Match.Endpoint != endpoint {
+			continue
+		}
+		if !isModelMatch(model, r.Match.Model) {
+			continue
+		}
+		if len(cr.contains) > 0 {
+			found := false
+			for _, c := range cr.contains {
+				if strings.Contains(lu, c) || strings.Contains(ft, c) {
+					found = true
+					break
+				}
+			}
+			if !found {
+				continue
+			}
+		}
+		if cr.regex != nil && !cr.regex.MatchString(fullText) {
+			continue
+		}
+		if !r.Continue {
+			return r
+		}
+	}
+	return nil
+}
+
+// Compare with: go test -run x -bench 'Contains' ./pkg/server/config
+func benchmarkContains(b *testing.B, automaton bool) {
+	for _, rules := range []int{30, 300, 3000} {
+		for _, kb := range []int{1, 16, 64} {
+			b.Run(fmt.Sprintf("rules=%d/transcript=%dKB", rules, kb), func(b *testing.B) {
+				c := benchRuleSet(rules)
+				for i := range c.Rules {
+					// isolate the contains check
+					c.Rules[i].Match.Regex = ""
+					c.Rules[i].Match.Endpoint = ""
+					c.Rules[i].Match.Model = nil
+				}
+				withConfig(b, c)
+				text := strings.Repeat("A long multi-turn transcript that mentions nothing relevant.\n", kb*1024/62)
+				b.SetBytes(int64(2 * len(text)))
+				b.ReportAllocs()
+				b.ResetTimer()
+				for i := 0; i < b.N; i++ {
+					if automaton {
+						Get().EvaluateRules("chat", "gpt-4o", "user", "last message", text, nil)
+					} else {
+						evaluateRulesLoop(c.compiled, "chat", "gpt-4o", "last message", text)
+					}
+				}
+			})
+		}
+	}
+}
+
+func BenchmarkContainsAutomaton(b *testing.B) { benchmarkContains(b, true) }
+func BenchmarkContainsLoop(b *testing.B)      { benchmarkContains(b, false) }
@@ -0,0 +1,300 @@
+package config
+
+import (
+	"fmt"
+	"math/rand"
+	"regexp"
+	"strconv"
+	"strings"
+	"sync"
+	"sync/atomic"
+)
+
+// compiledRule is the load-time form of a Rule: everything that used to be
+// recomputed on every request (regex compilation, needle lowercasing) is done
+// once when the config is loaded.
+type compiledRule struct {
+	rule     *Rule
+	contains []string // lowercased needles
+	regex    *regexp.Regexp
+}
+
+// compiledRuleSet holds the compiled rules in their original order.
+type compiledRuleSet struct {
+	rules []compiledRule
+	// contains is one automaton over every rule's needles (nil if none)
+	contains *acMatcher
+	hitPool  sync.Pool
+	// dispatch lists, per (endpoint, model, role), the indices of the rules
+	// that can apply, in their original order
+	dispatch dispatchIndex
+	// matches counts how often each rule matched, for metrics
+	matches []atomic.Uint64
+}
+
+// dispatchKey selects a candidate list. Values not named by any rule are
+// looked up as "" so that only rules without that constraint apply.
+type dispatchKey struct {
+	endpoint, model, role string
+}
+
+type dispatchIndex struct {
+	endpoints map[string]struct{}
+	models    map[string]struct{}
+	roles     map[string]struct{}
+	lists     map[dispatchKey][]int32
+}
+
+func buildDispatchIndex(rules []compiledRule) dispatchIndex {
+	idx := dispatchIndex{
+		endpoints: map[string]struct{}{"": {}},
+		models:    map[string]struct{}{"": {}},
+		roles:     map[string]struct{}{"": {}},
+		lists:     map[dispatchKey][]int32{},
+	}
+	for i := range rules {
+		m := &rules[i].rule.Match
+		idx.endpoints[m.Endpoint] = struct{}{}
+		idx.roles[m.Role] = struct{}{}
+		for _, model := range m.Model {
+			idx.models[model] = struct{}{}
+		}
+	}
+	for e := range idx.endpoints {
+		for model := range idx.models {
+			for role := range idx.roles {
+				var list []int32
+				for i := range rules {
+					m := &rules[i].rule.Match
+					if m.Endpoint != "" && m.Endpoint != e {
+						continue
+					}
+					if !isModelMatch(model, m.Model) {
+						continue
+					}
+					if m.Role != "" && m.Role != role {
+						continue
+					}
+					list = append(list, int32(i))
+				}
+				idx.lists[dispatchKey{e, model, role}] = list
+			}
+		}
+	}
+	return idx
+}
+
+// candidates returns the indices of the rules whose endpoint, model and role
+// constraints admit the request, in rule order.
+func (idx *dispatchIndex) candidates(endpoint, model, role string) []int32 {
+	k := dispatchKey{endpoint, model, role}
+	if _, ok := idx.endpoints[k.endpoint]; !ok {
+		k.endpoint = ""
+	}
+	if _, ok := idx.models[k.model]; !ok {
+		k.model = ""
+	}
+	if _, ok := idx.roles[k.role]; !ok {
+		k.role = ""
+	}
+	return idx.lists[k]
+}
+
+// containsHits lowercases and scans the texts once and returns the set of
+// rules whose contains condition holds. Release it with putHits.
+func (rs *compiledRuleSet) containsHits(texts ...string) ruleSet {
+	var hits ruleSet
+	if p, ok := rs.hitPool.Get().(*ruleSet); ok {
+		hits = *p
+		clear(hits)
+	} else {
+		hits = newRuleSet(len(rs.rules))
+	}
+	for i, t := range texts {
+		if i > 0 && t == texts[i-1] {
+			continue
+		}
+		rs.contains.scan(strings.ToLower(t), hits)
+	}
+	return hits
+}
+
+func (rs *compiledRuleSet) putHits(hits ruleSet) {
+	rs.hitPool.Put(&hits)
+}
+
+// Compile validates the configuration and builds the compiled rule set used
+// by EvaluateRules, the weighted tables used by PickTemplate, the parsed
+// response templates, the models' latency profiles and the tokenizer
+// vocabularies. It is called by LoadConfig; configs built in code must call
+// it before being used.
+func (c *BotConfig) Compile() error {
+	rs, err := compileRules(c, true)
+	if err != nil {
+		return err
+	}
+	if err := compileLatencies(c); err != nil {
+		return err
+	}
+	if err := loadEncodings(c); err != nil {
+		return err
+	}
+	if err := c.Streaming.Chunking.validate(); err != nil {
+		return fmt.Errorf("streaming: %w", err)
+	}
+	if h := c.Server.HTTP; h.MaxHeaderBytes < 0 || h.MaxConnections < 0 || h.H2CMaxConcurrentStreams < 0 {
+		return fmt.Errorf("server.http: max_header_bytes, max_connections and h2c_max_concurrent_streams must not be negative")
+	}
+	if cc := c.Server.Compression; cc.MinBytes < 0 || cc.Level < 0 || cc.Level > 9 {
+		return fmt.Errorf("server.compression: min_bytes must not be negative and level must be 1-9")
+	}
+	if c.Server.Workers < 0 || c.Server.Workers > 256 {
+		return fmt.Errorf("server.workers must be between 0 and 256")
+	}
+	if c.Admin.MutexProfileFraction < 0 || c.Admin.BlockProfileRate < 0 {
+		return fmt.Errorf("admin: profile rates must not be negative")
+	}
+	for i, r := range c.Rules {
+		if r.StreamOverride != nil {
+			if err := r.StreamOverride.Chunking.validate(); err != nil {
+				return fmt.Errorf("rule %d (%q): stream_override: %w", i, r.ID, err)
+			}
+		}
+	}
+	for i := range c.Rules {
+		c.Rules[i].Respond.chooser = newAliasTable(c.Rules[i].Respond.Choose)
+	}
+	c.Fallback.chooser = newAliasTable(c.Fallback.Choose)
+	compileTemplates(c)
+	c.compiled = rs
+	return nil
+}
+
+// compileRules compiles every rule in order. When strict is false, invalid
+// regexes are tolerated and their rules simply never match.
+func compileRules(c *BotConfig, strict bool) (*compiledRuleSet, error) {
+	rs := &compiledRuleSet{rules: make([]compiledRule, len(c.Rules)), matches: make([]atomic.Uint64, len(c.Rules))}
+	for i := range c.Rules {
+		r := &c.Rules[i]
+		cr := compiledRule{rule: r}
+		for _, needle := range r.Match.Contains {
+			cr.contains = append(cr.contains, strings.ToLower(needle))
+		}
+		if r.Match.Regex != "" {
+			re, err := regexp.Compile(r.Match.Regex)
+			if err != nil && strict {
+				return nil, fmt.Errorf("rule %d (%q): invalid regex: %w", i, r.ID, err)
+			}
+			cr.regex = re
+		}
+		rs.rules[i] = cr
+	}
+	needles := make([][]string, len(rs.rules))
+	for i := range rs.rules {
+		needles[i] = rs.rules[i].contains
+	}
+	rs.contains = newACMatcher(needles)
+	rs.dispatch = buildDispatchIndex(rs.rules)
+	return rs, nil
+}
+
+// RuleMatch is how often a rule has matched since its config was loaded.
+type RuleMatch struct {
+	Rule    string // the rule's id, or rule_<index> when it has none
+	Matches uint64
+}
+
+// RuleMatches returns the match count of every rule, in rule order. The
+// counts start from zero with each loaded config.
+func (c *BotConfig) RuleMatches() []RuleMatch {
+	if c == nil || c.compiled == nil {
+		return nil
+	}
+	out := make([]RuleMatch, len(c.compiled.rules))
+	for i, cr := range c.compiled.rules {
+		out[i] = RuleMatch{Rule: cr.rule.ID, Matches: c.compiled.matches[i].Load()}
+		if out[i].Rule == "" {
+			out[i].Rule = "rule_" + strconv.Itoa(i)
+		}
+	}
+	return out
+}
+
+// aliasTable samples weighted choices in O(1) using Vose's alias method.
+// Non-positive weights count as 1, as they always have for choose entries.
+type aliasTable struct {
+	prob  []float64
+	alias []int
+}
+
+func newAliasTable(choices []WeightedText) *aliasTable {
+	if len(choices) == 0 {
+		return nil
+	}
+	weights := make([]float64, len(choices))
+	for i, c := range choices {
+		weights[i] = float64(effectiveWeight(c.Weight))
+	}
+	return newWeightedAliasTable(weights)
+}
+
+// newWeightedAliasTable builds a table over positive weights.
+func newWeightedAliasTable(weights []float64) *aliasTable {
+	n := len(weights)
+	total := 0.0
+	for _, w := range weights {
+		total += w
+	}
+	t := &aliasTable{prob: make([]float64, n), alias: make([]int, n)}
+	scaled := make([]float64, n)
+	var small, large []int
+	for i, w := range weights {
+		scaled[i] = w * float64(n) / total
+		if scaled[i] < 1 {
+			small = append(small, i)
+		} else {
+			large = append(large, i)
+		}
+	}
+	for len(small) > 0 && len(large) > 0 {
+		s, l := small[len(small)-1], large[len(large)-1]
+		small = small[:len(small)-1]
+		t.prob[s] = scaled[s]
+		t.alias[s] = l
+		scaled[l] = scaled[l] + scaled[s] - 1
+		if scaled[l] < 1 {
+			large = large[:len(large)-1]
+			small = append(small, l)
+		}
+	}
+	// leftovers are (up to rounding) exactly 1
+	for _, i := range large {
+		t.prob[i] = 1
+	}
+	for _, i := range small {
+		t.prob[i] = 1
+	}
+	return t
+}
+
+func effectiveWeight(w int) int {
+	if w <= 0 {
+		return 1
+	}
+	return w
+}
+
+// pick returns the index of the sampled choice, drawn from rng.
+func (t *aliasTable) pick(rng *rand.Rand) int {
+	var i int
+	var f float64
+	if rng != nil {
+		i, f = rng.Intn(len(t.prob)), rng.Float64()
+	} else {
+		i, f = rand.Intn(len(t.prob)), rand.Float64()
+	}
+	if f < t.prob[i] {
+		return i
+	}
+	return t.alias[i]
+}
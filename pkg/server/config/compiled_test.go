@@ -0,0 +1,221 @@
+package config
+
+import (
+	"fmt"
+	"strings"
+	"testing"
+)
+
+func withConfig(t testing.TB, c *BotConfig) {
+	t.Helper()
+	if err := c.Compile(); err != nil {
+		t.Fatalf("compile: %v", err)
+	}
+	prev := Get()
+	Set(c)
+	t.Cleanup(func() { Set(prev) })
+}
+
+func TestCompileRejectsInvalidRegex(t *testing.T) {
+	c := &BotConfig{Rules: []Rule{
+		{ID: "ok", Match: Match{Regex: `^hello`}},
+		{ID: "broken", Match: Match{Regex: `(unclosed`}},
+	}}
+	err := c.Compile()
+	if err == nil || !strings.Contains(err.Error(), `"broken"`) {
+		t.Fatalf("expected an error naming the broken rule, got %v", err)
+	}
+}
+
+func TestEvaluateRulesCompiled(t *testing.T) {
+	withConfig(t, &BotConfig{Rules: []Rule{
+		{ID: "chat-greet", Match: Match{Endpoint: "chat", Contains: []string{"HeLLo"}}},
+		{ID: "numbers", Match: Match{Regex: `\d{3}`}},
+		{ID: "override", Match: Match{Endpoint: "responses"}, Continue: true},
+		{ID: "last", Match: Match{Endpoint: "responses", Contains: []string{"final"}}},
+	}})
+
+	cases := []struct {
+		endpoint, text, want string
+	}{
+		{"chat", "well HELLO there", "chat-greet"},
+		{"chat", "call 555 now", "numbers"},
+		{"chat", "nothing", ""},
+		{"responses", "the final answer", "last"},
+		{"responses", "something else", "override"},
+	}
+	for _, tc := range cases {
+		mr := Get().EvaluateRules(tc.endpoint, "gpt-4o", "user", tc.text, tc.text, nil)
+		got := ""
+		if mr != nil {
+			got = mr.Rule.ID
+		}
+		if got != tc.want {
+			t.Errorf("%s %q: got rule %q, want %q", tc.endpoint, tc.text, got, tc.want)
+		}
+	}
+}
+
+func TestPickTemplateRespectsWeights(t *testing.T) {
+	c := &BotConfig{Fallback: RespondWrapper{Choose: []WeightedText{
+		{Weight: 1, Text: "rare"},
+		{Weight: 3, Text: "common"},
+		{Weight: 0, Text: "zero-counts-as-one"},
+	}}}
+	if err := c.Compile(); err != nil {
+		t.Fatal(err)
+	}
+	counts := map[string]int{}
+	const n = 50000
+	rng := NewRand(1)
+	for i := 0; i < n; i++ {
+		counts[PickTemplate(c.Fallback, rng).Render(nil)]++
+	}
+	for text, want := range map[string]float64{"rare": 0.2, "common": 0.6, "zero-counts-as-one": 0.2} {
+		got := float64(counts[text]) / n
+		if got < want-0.02 || got > want+0.02 {
+			t.Errorf("%s: frequency %.3f, want ~%.2f", text, got, want)
+		}
+	}
+}
+
+func TestSeededRandIsReproducible(t *testing.T) {
+	half := 0.5
+	c := &BotConfig{
+		Rules: []Rule{{ID: "coin", Probability: &half, Respond: RespondWrapper{Text: "heads"}}},
+		Fallback: RespondWrapper{Choose: []WeightedText{
+			{Weight: 1, Text: "a"}, {Weight: 2, Text: "b"}, {Weight: 3, Text: "c"},
+		}},
+	}
+	if err := c.Compile(); err != nil {
+		t.Fatal(err)
+	}
+	draw := func(seed int64) string {
+		rng := NewRand(seed)
+		var b strings.Builder
+		for i := 0; i < 64; i++ {
+			if c.EvaluateRules("chat", "gpt-4o", "user", "x", "x", rng) != nil {
+				b.WriteString("H")
+			}
+			b.WriteString(PickTemplate(c.Fallback, rng).Render(nil))
+		}
+		return b.String()
+	}
+	if draw(42) != draw(42) {
+		t.Fatal("the same seed gave different draws")
+	}
+	if draw(42) == draw(43) {
+		t.Fatal("different seeds gave the same draws")
+	}
+}
+
+// BenchmarkPickTemplateParallel compares the shared global source with a
+// source per goroutine, as each request now has.
+func BenchmarkPickTemplateParallel(b *testing.B) {
+	c := &BotConfig{Fallback: RespondWrapper{Choose: []WeightedText{
+		{Weight: 1, Text: "a"}, {Weight: 2, Text: "b"}, {Weight: 3, Text: "c"},
+	}}}
+	if err := c.Compile(); err != nil {
+		b.Fatal(err)
+	}
+	b.Run("global", func(b *testing.B) {
+		b.RunParallel(func(pb *testing.PB) {
+			for pb.Next() {
+				_ = PickTemplate(c.Fallback, nil)
+			}
+		})
+	})
+	b.Run("per-request", func(b *testing.B) {
+		b.RunParallel(func(pb *testing.PB) {
+			rng := NewRand(1)
+			for pb.Next() {
+				_ = PickTemplate(c.Fallback, rng)
+			}
+		})
+	})
+}
+
+// benchRuleSet builds a config with n rules spread over a few models and
+// endpoints, most of them using contains needles and some a regex.
+func benchRuleSet(n int) *BotConfig {
+	c := &BotConfig{}
+	models := []string{"gpt-4o", "gpt-4o-mini", "gpt-3.5-turbo"}
+	for i := 0; i < n; i++ {
+		r := Rule{ID: fmt.Sprintf("rule-%d", i), Match: Match{
+			Endpoint: []string{"chat", "responses"}[i%2],
+			Model:    StringOrSlice{models[i%len(models)]},
+			Contains: []string{fmt.Sprintf("Keyword%d", i), fmt.Sprintf("Topic %d", i)},
+		}}
+		if i%5 == 0 {
+			r.Match.Regex = fmt.Sprintf(`order #%d\b`, i)
+		}
+		r.Respond.Choose = []WeightedText{{Weight: 2, Text: "a"}, {Weight: 1, Text: "b"}}
+		c.Rules = append(c.Rules, r)
+	}
+	return c
+}
+
+func BenchmarkEvaluateRules300(b *testing.B) {
+	withConfig(b, benchRuleSet(300))
+	text := strings.Repeat("Some long user prompt without any matching needle. ", 20)
+	b.ReportAllocs()
+	b.ResetTimer()
+	for i := 0; i < b.N; i++ {
+		Get().EvaluateRules("chat", "gpt-4o", "user", text, text, nil)
+	}
+}
+
+func TestDispatchIndexMatchesLinearFilter(t *testing.T) {
+	c := &BotConfig{}
+	endpoints := []string{"", "chat", "responses"}
+	models := [][]string{nil, {"gpt-4o"}, {"gpt-4o-mini", "gpt-4o"}, {"o3"}}
+	roles := []string{"", "user", "system"}
+	for i := 0; i < 60; i++ {
+		c.Rules = append(c.Rules, Rule{ID: fmt.Sprint(i), Match: Match{
+			Endpoint: endpoints[i%3],
+			Model:    models[(i/3)%4],
+			Role:     roles[(i/12)%3],
+		}})
+	}
+	if err := c.Compile(); err != nil {
+		t.Fatal(err)
+	}
+	for _, e := range append(endpoints, "embeddings") {
+		for _, m := range []string{"", "gpt-4o", "gpt-4o-mini", "o3", "unknown"} {
+			for _, role := range append(roles, "assistant") {
+				var want []int32
+				for i, r := range c.Rules {
+					if (r.Match.Endpoint == "" || r.Match.Endpoint == e) && isModelMatch(m, r.Match.Model) && (r.Match.Role == "" || r.Match.Role == role) {
+						want = append(want, int32(i))
+					}
+				}
+				got := c.compiled.dispatch.candidates(e, m, role)
+				if fmt.Sprint(got) != fmt.Sprint(want) {
+					t.Fatalf("(%q,%q,%q): got %v want %v", e, m, role, got, want)
+				}
+			}
+		}
+	}
+}
+
+// BenchmarkEvaluateRulesManyModels models one server carrying separate rule
+// packs for many model IDs; only the requested model's pack is evaluated.
+func BenchmarkEvaluateRulesManyModels(b *testing.B) {
+	c := &BotConfig{}
+	for m := 0; m < 40; m++ {
+		for i := 0; i < 25; i++ {
+			c.Rules = append(c.Rules, Rule{ID: fmt.Sprintf("m%d-%d", m, i), Match: Match{
+				Endpoint: []string{"chat", "responses"}[i%2],
+				Model:    StringOrSlice{fmt.Sprintf("model-%d", m)},
+				Regex:    fmt.Sprintf(`ticket-%d-%d\b`, m, i),
+			}})
+		}
+	}
+	withConfig(b, c)
+	text := strings.Repeat("nothing to see here ", 50)
+	b.ReportAllocs()
+	b.ResetTimer()
+	for i := 0; i < b.N; i++ {
+		Get().EvaluateRules("responses", "model-7", "", text, text, nil)
+	}
+}
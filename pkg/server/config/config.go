@@ -2,44 +2,214 @@ package config
 
 import (
 	"errors"
+	"fmt"
 	"log"
 	"math/rand"
 	"os"
 	"path/filepath"
-	"regexp"
-	"strings"
-	"time"
+	"sync/atomic"
 
 	yaml "gopkg.in/yaml.v3"
+	"mock-openai-server/pkg/server/tokenizer"
 )
 
-// Global configuration instance
-var Current *BotConfig
+// current is the active configuration. Handlers take one snapshot with Get
+// at the start of a request and use it throughout, so a reload never mixes
+// two configs within a request.
+var current atomic.Pointer[BotConfig]
+
+// Get returns the active configuration snapshot (nil before loading).
+func Get() *BotConfig {
+	return current.Load()
+}
+
+// Set publishes c as the active configuration. c must be compiled.
+func Set(c *BotConfig) {
+	current.Store(c)
+}
 
 type BotConfig struct {
 	Version   int               `yaml:"version"`
 	Server    ServerConfig      `yaml:"server"`
 	Models    []ModelConfig     `yaml:"models"`
 	Streaming StreamingConfig   `yaml:"streaming"`
+	Storage   StorageConfig     `yaml:"storage"`
+	Admin     AdminConfig       `yaml:"admin"`
+	Tokenizer TokenizerConfig   `yaml:"tokenizer"`
 	Tools     ToolsConfig       `yaml:"tools"`
 	Variables map[string]string `yaml:"variables"`
 	Rules     []Rule            `yaml:"rules"`
 	Fallback  RespondWrapper    `yaml:"fallback"`
+
+	// compiled is built by Compile (called from LoadConfig)
+	compiled *compiledRuleSet
+	// latencies holds the compiled latency profile of each model that has one
+	latencies map[string]Latency
+	// encodings holds the loaded tokenizer vocabularies by encoding name
+	encodings map[string]*tokenizer.Encoding
+	// dir is the directory of the config file, for relative paths in it
+	dir string
 }
 
 type ServerConfig struct {
 	Port string `yaml:"port"`
 	CORS string `yaml:"cors"`
+	// Listen lists addresses to serve on at once (host:port, port 0 for a
+	// free one, or unix:/path.sock); it replaces Port when set.
+	Listen []string `yaml:"listen"`
+	// ReadyFile receives the bound addresses once the server is listening.
+	ReadyFile string `yaml:"ready_file"`
+	// Workers runs that many server processes sharing the TCP listen
+	// addresses through SO_REUSEPORT (0 or 1 = a single process).
+	Workers int `yaml:"workers"`
+	// WatchConfig reloads the config file when it changes (SIGHUP always
+	// triggers a reload).
+	WatchConfig     *bool `yaml:"watch_config"`
+	WatchIntervalMs int   `yaml:"watch_interval_ms"`
+	// AllowLatencyHeaders honours the per-request X-Mock-Chunk-Delay-Ms,
+	// X-Mock-TTFT-Ms and X-Mock-Seed headers.
+	AllowLatencyHeaders bool `yaml:"allow_latency_headers"`
+	// ServerTiming reports the time spent in each phase of chat and
+	// Responses API requests in a Server-Timing header.
+	ServerTiming bool `yaml:"server_timing"`
+	// HTTP tunes the HTTP server (read at startup only).
+	HTTP HTTPConfig `yaml:"http"`
+	// Compression gzips responses for clients that accept it.
+	Compression CompressionConfig `yaml:"compression"`
+}
+
+// CompressionConfig negotiates gzip response compression through
+// Accept-Encoding. It is read per request, so a reload applies at once.
+type CompressionConfig struct {
+	Enabled  bool `yaml:"enabled"`
+	MinBytes int  `yaml:"min_bytes"` // smaller bodies are sent as is; default 1024
+	Level    int  `yaml:"level"`     // 1 (fastest) to 9 (smallest); default 6
+	// Streams compresses SSE too, flushing the compressor after every
+	// frame so events are not held back.
+	Streams bool `yaml:"streams"`
+}
+
+// HTTPConfig tunes the HTTP server. Zero values take the defaults noted and
+// negative timeouts disable that timeout.
+type HTTPConfig struct {
+	ReadHeaderTimeoutMs int `yaml:"read_header_timeout_ms"` // default 10000
+	ReadTimeoutMs       int `yaml:"read_timeout_ms"`        // request headers and body; default 60000
+	// WriteTimeoutMs bounds each write to the client rather than the whole
+	// response, so long streams and latency holds are unaffected but a
+	// client that stops reading is dropped. Default 30000.
+	WriteTimeoutMs int   `yaml:"write_timeout_ms"`
+	IdleTimeoutMs  int   `yaml:"idle_timeout_ms"`   // idle keep-alive connections; default 120000
+	MaxHeaderBytes int   `yaml:"max_header_bytes"`  // default 1 MiB
+	MaxConnections int   `yaml:"max_connections"`   // open connections at once; 0 = unlimited
+	KeepAlive      *bool `yaml:"keep_alive"`        // HTTP keep-alive; default true
+	TCPKeepAliveMs int   `yaml:"tcp_keep_alive_ms"` // TCP keep-alive probe period; default 15000
+	// H2C serves HTTP/2 without TLS (prior knowledge) next to HTTP/1.1, so
+	// many streams can share one connection.
+	H2C                     bool `yaml:"h2c"`
+	H2CMaxConcurrentStreams int  `yaml:"h2c_max_concurrent_streams"` // per connection; default 250
 }
 
 type StreamingConfig struct {
-	Enabled      *bool `yaml:"enabled"`
-	ChunkDelayMs *int  `yaml:"chunk_delay_ms"`
+	Enabled      *bool           `yaml:"enabled"`
+	ChunkDelayMs *int            `yaml:"chunk_delay_ms"`
+	Chunking     *ChunkingConfig `yaml:"chunking"`
+}
+
+// Chunking units.
+const (
+	ChunkWords  = "words"
+	ChunkChars  = "chars"
+	ChunkBytes  = "bytes"
+	ChunkTokens = "tokens"
+)
+
+// ChunkingConfig controls how response text is cut into SSE deltas. Each
+// delta holds Size units (default 1) of the text, whitespace included, and
+// Coalesce deltas (default 1) are written back to back per flush. The
+// stream delay applies between flushes.
+type ChunkingConfig struct {
+	Unit     string `yaml:"unit"`
+	Size     int    `yaml:"size"`
+	Coalesce int    `yaml:"coalesce"`
+}
+
+func (k *ChunkingConfig) validate() error {
+	if k == nil {
+		return nil
+	}
+	switch k.Unit {
+	case "", ChunkWords, ChunkChars, ChunkBytes, ChunkTokens:
+	default:
+		return fmt.Errorf("unknown chunking unit %q (want words, chars, bytes or tokens)", k.Unit)
+	}
+	if k.Size < 0 || k.Coalesce < 0 {
+		return fmt.Errorf("chunking size and coalesce must not be negative")
+	}
+	return nil
+}
+
+// ChunkingFor resolves the chunking of a streamed response: a matched rule's
+// stream_override.chunking, then streaming.chunking, then one word per delta.
+// Unit, Size and Coalesce are always set in the result.
+func (c *BotConfig) ChunkingFor(mr *matchedRule) ChunkingConfig {
+	var k ChunkingConfig
+	switch {
+	case mr != nil && mr.Rule.StreamOverride != nil && mr.Rule.StreamOverride.Chunking != nil:
+		k = *mr.Rule.StreamOverride.Chunking
+	case c != nil && c.Streaming.Chunking != nil:
+		k = *c.Streaming.Chunking
+	}
+	if k.Unit == "" {
+		k.Unit = ChunkWords
+	}
+	if k.Size <= 0 {
+		k.Size = 1
+	}
+	if k.Coalesce <= 0 {
+		k.Coalesce = 1
+	}
+	return k
+}
+
+// Pacing is how a response is streamed: when each delta is sent and how the
+// text is cut into deltas.
+type Pacing struct {
+	Latency  Latency
+	Chunking ChunkingConfig
+}
+
+// PacingFor resolves LatencyFor and ChunkingFor together.
+func (c *BotConfig) PacingFor(model string, mr *matchedRule) Pacing {
+	return Pacing{Latency: c.LatencyFor(model, mr), Chunking: c.ChunkingFor(mr)}
+}
+
+// StorageConfig bounds the in-memory Responses API store. Zero values mean
+// unlimited.
+type StorageConfig struct {
+	MaxEntries           int   `yaml:"max_entries"`
+	MaxBytes             int64 `yaml:"max_bytes"`
+	TTLSeconds           int   `yaml:"ttl_seconds"`
+	SweepIntervalSeconds int   `yaml:"sweep_interval_seconds"`
+}
+
+// AdminConfig configures the profiling listener, which serves
+// net/http/pprof and runtime traces apart from the public port. It is off
+// unless Listen is set, and like the port it is only read at startup.
+type AdminConfig struct {
+	Listen string `yaml:"listen"` // e.g. "127.0.0.1:6060"
+	// MutexProfileFraction samples 1 in n mutex contention events (0 = off).
+	MutexProfileFraction int `yaml:"mutex_profile_fraction"`
+	// BlockProfileRate samples one blocking event per n nanoseconds spent
+	// blocked (0 = off, 1 = every event).
+	BlockProfileRate int `yaml:"block_profile_rate"`
 }
 
 type ModelConfig struct {
-	ID      string `yaml:"id"`
-	OwnedBy string `yaml:"owned_by"`
+	ID      string          `yaml:"id"`
+	OwnedBy string          `yaml:"owned_by"`
+	Latency *LatencyProfile `yaml:"latency"`
+	// Encoding overrides the tokenizer encoding tiktoken would pick for ID.
+	Encoding string `yaml:"encoding"`
 }
 
 type StringOrSlice []string
@@ -78,6 +248,8 @@ type Match struct {
 type WeightedText struct {
 	Weight int    `yaml:"weight"`
 	Text   string `yaml:"text"`
+
+	tmpl *Template
 }
 
 type AnnotationOut struct {
@@ -89,6 +261,8 @@ type AnnotationOut struct {
 type MessageOut struct {
 	Text        string          `yaml:"text"`
 	Annotations []AnnotationOut `yaml:"annotations"`
+
+	tmpl *Template
 }
 
 type ToolOut struct {
@@ -114,6 +288,11 @@ type RespondWrapper struct {
 
 	// Error injection
 	Error *ErrorOut `yaml:"error"`
+
+	// chooser is the prebuilt weighted table for Choose and textTmpl the
+	// parsed Text (set by Compile)
+	chooser  *aliasTable
+	textTmpl *Template
 }
 
 type Rule struct {
@@ -143,15 +322,23 @@ func LoadConfigFromEnv() {
 	if path == "" {
 		path = filepath.Join("pkg", "server", "config", "bot.yaml")
 	}
+	configPath.Store(&path)
 	cfg, err := LoadConfig(path)
 	if err != nil {
-		log.Printf("[config] No config file found (%v). Using built-in default configuration.", err)
-		Current = defaultConfig()
-		ensureDefaultTools(Current)
+		if errors.Is(err, os.ErrNotExist) {
+			log.Printf("[config] No config file found (%v). Using built-in default configuration.", err)
+		} else {
+			log.Printf("[config] Invalid config %s (%v). Using built-in default configuration.", path, err)
+		}
+		def := defaultConfig()
+		ensureDefaultTools(def)
+		if err := def.Compile(); err != nil {
+			log.Fatalf("[config] built-in default configuration is invalid: %v", err)
+		}
+		Set(def)
 		return
 	}
-	Current = cfg
-	ensureDefaultTools(Current)
+	Set(cfg)
 	log.Printf("[config] Loaded config from %s (version %d)", path, cfg.Version)
 }
 
@@ -164,6 +351,11 @@ func LoadConfig(path string) (*BotConfig, error) {
 	if err := yaml.Unmarshal(b, &cfg); err != nil {
 		return nil, err
 	}
+	ensureDefaultTools(&cfg)
+	cfg.dir = filepath.Dir(path)
+	if err := cfg.Compile(); err != nil {
+		return nil, err
+	}
 	return &cfg, nil
 }
 
@@ -215,21 +407,21 @@ func ensureDefaultTools(cfg *BotConfig) {
 	}
 }
 
-func IsToolEnabled(name string) bool {
-	if Current == nil {
+func (c *BotConfig) IsToolEnabled(name string) bool {
+	if c == nil {
 		return false
 	}
-	if len(Current.Tools.Enabled) == 0 {
+	if len(c.Tools.Enabled) == 0 {
 		return true
 	}
-	return containsString(Current.Tools.Enabled, name)
+	return containsString(c.Tools.Enabled, name)
 }
 
-func GetToolDef(name string) (ToolDef, bool) {
-	if Current == nil {
+func (c *BotConfig) GetToolDef(name string) (ToolDef, bool) {
+	if c == nil {
 		return ToolDef{}, false
 	}
-	td, ok := Current.Tools.Registry[name]
+	td, ok := c.Tools.Registry[name]
 	return td, ok
 }
 
@@ -246,6 +438,7 @@ func defaultConfig() *BotConfig {
 			{ID: "gpt-3.5-turbo", OwnedBy: "openai"},
 		},
 		Streaming: StreamingConfig{Enabled: &enabled, ChunkDelayMs: &delay},
+		Storage:   StorageConfig{MaxEntries: 100000, MaxBytes: 256 << 20, TTLSeconds: 3600},
 		Variables: map[string]string{"bot_name": "Mock OpenAI"},
 		Tools: ToolsConfig{
 			Enabled: []string{"web_search", "file_search"},
@@ -269,19 +462,9 @@ func defaultConfig() *BotConfig {
 	return cfg
 }
 
-// Utility: render a minimal template expansion using {{var}} placeholders
-func RenderTemplate(s string, ctx map[string]string) string {
-	out := s
-	for k, v := range ctx {
-		out = strings.ReplaceAll(out, "{{"+k+"}}", v)
-	}
-	return out
-}
-
 // Rule evaluation helpers
 type matchedRule struct {
-	Rule  *Rule
-	Delay time.Duration
+	Rule *Rule
 }
 
 func getStreamingDelayMs(global StreamingConfig, override *StreamingConfig, defaultMs int) int {
@@ -294,36 +477,24 @@ func getStreamingDelayMs(global StreamingConfig, override *StreamingConfig, defa
 	return defaultMs
 }
 
+// PickText returns the response text, unrendered, sampling choose entries by
+// weight from the shared source.
+//
+// Deprecated: use PickTemplate, which samples from a per-request rng and
+// returns the precompiled template to render.
 func PickText(resp RespondWrapper) string {
 	if len(resp.Choose) > 0 {
-		total := 0
-		for _, c := range resp.Choose {
-			total += c.Weight
-		}
-		if total <= 0 {
-			total = len(resp.Choose)
+		t := resp.chooser
+		if t == nil {
+			// not compiled (config built in code without Compile)
+			t = newAliasTable(resp.Choose)
 		}
-		r := rand.Intn(total)
-		sum := 0
-		for _, c := range resp.Choose {
-			w := c.Weight
-			if w <= 0 {
-				w = 1
-			}
-			if r < sum+w {
-				return c.Text
-			}
-			sum += w
-		}
-		return resp.Choose[0].Text
+		return resp.Choose[t.pick(nil)].Text
 	}
 	if resp.Text != "" {
 		return resp.Text
 	}
-	if resp.Message.Text != "" {
-		return resp.Message.Text
-	}
-	return ""
+	return resp.Message.Text
 }
 
 func isModelMatch(model string, cand []string) bool {
@@ -339,48 +510,45 @@ func isModelMatch(model string, cand []string) bool {
 }
 
 // Evaluate rules and return the first applicable one. If continue=true, it will
-// pick the last matching rule in sequence, allowing overrides.
-func EvaluateRules(endpoint string, model string, role string, lastUser string, fullText string) *matchedRule {
-	if Current == nil || len(Current.Rules) == 0 {
+// pick the last matching rule in sequence, allowing overrides. Probability
+// gates draw from rng.
+func (c *BotConfig) EvaluateRules(endpoint string, model string, role string, lastUser string, fullText string, rng *rand.Rand) *matchedRule {
+	if c == nil || len(c.Rules) == 0 {
 		return nil
 	}
-	var current *matchedRule
-	for i := range Current.Rules {
-		r := &Current.Rules[i]
-		if r.Match.Endpoint != "" && r.Match.Endpoint != endpoint {
-			continue
-		}
-		if !isModelMatch(model, r.Match.Model) {
-			continue
-		}
-		if r.Match.Role != "" && r.Match.Role != role {
-			continue
+	rs := c.compiled
+	if rs == nil {
+		// not compiled (config built in code without Compile)
+		rs, _ = compileRules(c, false)
+	}
+	// contains conditions for all rules are resolved by a single automaton
+	// pass, done lazily the first time a candidate rule needs it
+	var hits ruleSet
+	defer func() {
+		if hits != nil {
+			rs.putHits(hits)
 		}
+	}()
+	var current *matchedRule
+	// only rules whose endpoint/model/role constraints admit this request
+	for _, ci := range rs.dispatch.candidates(endpoint, model, role) {
+		i := int(ci)
+		cr := &rs.rules[i]
+		r := cr.rule
 
 		// contains check against last user and full text
-		if len(r.Match.Contains) > 0 {
-			found := false
-			lu := strings.ToLower(lastUser)
-			ft := strings.ToLower(fullText)
-			for _, c := range r.Match.Contains {
-				c = strings.ToLower(c)
-				if strings.Contains(lu, c) || strings.Contains(ft, c) {
-					found = true
-					break
-				}
+		if len(cr.contains) > 0 {
+			if hits == nil {
+				hits = rs.containsHits(lastUser, fullText)
 			}
-			if !found {
+			if !hits.has(i) {
 				continue
 			}
 		}
 
 		// regex on full text
 		if r.Match.Regex != "" {
-			re, err := regexp.Compile(r.Match.Regex)
-			if err != nil {
-				continue
-			}
-			if !re.MatchString(fullText) {
+			if cr.regex == nil || !cr.regex.MatchString(fullText) {
 				continue
 			}
 		}
@@ -392,34 +560,18 @@ func EvaluateRules(endpoint string, model string, role string, lastUser string,
 				continue
 			}
 			if p < 1.0 {
-				if rand.Float64() > p {
+				if rngFloat64(rng) > p {
 					continue
 				}
 			}
 		}
 
 		// matched
-		delayMs := getStreamingDelayMs(Current.Streaming, r.StreamOverride, 150)
-		current = &matchedRule{Rule: r, Delay: time.Duration(delayMs) * time.Millisecond}
+		rs.matches[i].Add(1)
+		current = &matchedRule{Rule: r}
 		if !r.Continue {
 			break
 		}
 	}
 	return current
 }
-
-// Build template context
-func BuildTemplateContext(model, lastUser, fullText string) map[string]string {
-	ctx := map[string]string{
-		"model":             model,
-		"last_user_message": lastUser,
-		"input_text":        fullText,
-		"timestamp":         time.Now().Format(time.RFC3339),
-	}
-	if Current != nil && Current.Variables != nil {
-		for k, v := range Current.Variables {
-			ctx[k] = v
-		}
-	}
-	return ctx
-}
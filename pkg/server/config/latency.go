@@ -0,0 +1,321 @@
+package config
+
+import (
+	"bufio"
+	"fmt"
+	"math"
+	"math/rand"
+	"os"
+	"path/filepath"
+	"strconv"
+	"strings"
+	"time"
+)
+
+// defaultChunkDelayMs paces streams when neither a rule, a model latency
+// profile nor streaming.chunk_delay_ms says otherwise.
+const defaultChunkDelayMs = 150
+
+// LatencyProfile describes how quickly a model answers: the time to the first
+// token, the steady token rate after it, and how individual delays vary.
+type LatencyProfile struct {
+	TTFTMs          float64      `yaml:"ttft_ms"`
+	TokensPerSecond float64      `yaml:"tokens_per_second"`
+	Jitter          JitterConfig `yaml:"jitter"`
+}
+
+// JitterConfig selects the distribution delays are drawn from.
+//
+//   - none (default): every gap is exactly 1/tokens_per_second.
+//   - normal: gaps and TTFT get added N(0, stddev_ms) noise.
+//   - lognormal: gaps and TTFT are scaled by a mean-one lognormal factor with
+//     shape sigma, giving the long right tail seen on real endpoints.
+//   - empirical: gaps are sampled from histogram_file, one observed gap in
+//     ms per line, optionally followed by a count (`12.5 40`). Lines
+//     starting with # are ignored. Relative paths are resolved against the
+//     config file's directory.
+type JitterConfig struct {
+	Distribution  string  `yaml:"distribution"`
+	StdDevMs      float64 `yaml:"stddev_ms"`
+	Sigma         float64 `yaml:"sigma"`
+	HistogramFile string  `yaml:"histogram_file"`
+}
+
+type jitterKind int
+
+const (
+	jitterNone jitterKind = iota
+	jitterNormal
+	jitterLognormal
+	jitterEmpirical
+)
+
+// Latency is the resolved timing of one response: a delay before the first
+// token and a (possibly random) gap before each later one. The zero value
+// emits every token immediately.
+type Latency struct {
+	TTFT time.Duration
+	Gap  time.Duration // mean gap between tokens
+
+	kind   jitterKind
+	stddev float64 // ns, normal
+	sigma  float64 // lognormal
+	hist   *gapHistogram
+	// fixedTTFT and fixedGap turn jitter off for that delay
+	fixedTTFT, fixedGap bool
+	// rng, when set, makes the samples reproducible; it is not safe for
+	// concurrent use, which is fine for the one response it belongs to
+	rng *rand.Rand
+}
+
+// WithTTFT returns l with a fixed, jitter-free time to first token.
+func (l Latency) WithTTFT(d time.Duration) Latency {
+	l.TTFT, l.fixedTTFT = d, true
+	return l
+}
+
+// WithGap returns l with a fixed, jitter-free gap between tokens.
+func (l Latency) WithGap(d time.Duration) Latency {
+	l.Gap, l.fixedGap = d, true
+	return l
+}
+
+// WithRand returns l drawing its jitter from rng (see NewRand).
+func (l Latency) WithRand(rng *rand.Rand) Latency {
+	l.rng = rng
+	return l
+}
+
+// fixedLatency sends the first token straight away and later ones every gap.
+func fixedLatency(gap time.Duration) Latency {
+	return Latency{Gap: gap}
+}
+
+// newLatency compiles a profile. dir resolves a relative histogram_file.
+func newLatency(p *LatencyProfile, dir string) (Latency, error) {
+	if p.TTFTMs < 0 || p.TokensPerSecond < 0 {
+		return Latency{}, fmt.Errorf("ttft_ms and tokens_per_second must not be negative")
+	}
+	l := Latency{TTFT: msDuration(p.TTFTMs)}
+	if p.TokensPerSecond > 0 {
+		l.Gap = time.Duration(float64(time.Second) / p.TokensPerSecond)
+	}
+	switch strings.ToLower(p.Jitter.Distribution) {
+	case "", "none":
+	case "normal":
+		l.kind = jitterNormal
+		l.stddev = p.Jitter.StdDevMs * float64(time.Millisecond)
+	case "lognormal":
+		l.kind = jitterLognormal
+		l.sigma = p.Jitter.Sigma
+	case "empirical":
+		path := p.Jitter.HistogramFile
+		if path == "" {
+			return Latency{}, fmt.Errorf("empirical jitter needs histogram_file")
+		}
+		if !filepath.IsAbs(path) && dir != "" {
+			path = filepath.Join(dir, path)
+		}
+		h, err := loadGapHistogram(path)
+		if err != nil {
+			return Latency{}, err
+		}
+		l.kind = jitterEmpirical
+		l.hist = h
+	default:
+		return Latency{}, fmt.Errorf("unknown jitter distribution %q", p.Jitter.Distribution)
+	}
+	return l, nil
+}
+
+// Delay returns how long to wait before token i: the time to first token for
+// i == 0 and an inter-token gap after that.
+func (l Latency) Delay(i int) time.Duration {
+	if i == 0 {
+		return l.FirstToken()
+	}
+	return l.NextGap()
+}
+
+// FirstToken samples the time to first token.
+func (l Latency) FirstToken() time.Duration {
+	if l.fixedTTFT || l.kind == jitterEmpirical {
+		return l.TTFT
+	}
+	return l.jitter(l.TTFT)
+}
+
+// NextGap samples the gap before the next token.
+func (l Latency) NextGap() time.Duration {
+	switch {
+	case l.fixedGap:
+		return l.Gap
+	case l.kind == jitterEmpirical:
+		return l.hist.sample(l.rng)
+	}
+	return l.jitter(l.Gap)
+}
+
+// Total samples how long generating tokens tokens takes end to end; it is
+// what non-streaming responses wait before answering.
+func (l Latency) Total(tokens int) time.Duration {
+	return l.Span(true, tokens)
+}
+
+// Span samples how long generating the next tokens tokens takes: from the
+// request when first is set (the first of them is the first token), from the
+// token before them otherwise. A stream whose flushes each wait the Span of
+// the tokens they complete ends when Total says.
+func (l Latency) Span(first bool, tokens int) time.Duration {
+	var d time.Duration
+	if first {
+		d = l.FirstToken()
+		tokens--
+	}
+	for ; tokens > 0; tokens-- {
+		d += l.NextGap()
+	}
+	return d
+}
+
+func (l Latency) jitter(d time.Duration) time.Duration {
+	switch l.kind {
+	case jitterNormal:
+		d += time.Duration(l.normFloat64() * l.stddev)
+	case jitterLognormal:
+		d = time.Duration(float64(d) * math.Exp(l.sigma*l.normFloat64()-l.sigma*l.sigma/2))
+	case jitterNone, jitterEmpirical:
+	}
+	if d < 0 {
+		return 0
+	}
+	return d
+}
+
+func (l Latency) normFloat64() float64 {
+	if l.rng != nil {
+		return l.rng.NormFloat64()
+	}
+	return rand.NormFloat64()
+}
+
+func msDuration(ms float64) time.Duration {
+	return time.Duration(ms * float64(time.Millisecond))
+}
+
+// gapHistogram samples observed inter-token gaps by their frequency.
+type gapHistogram struct {
+	gaps  []time.Duration
+	table *aliasTable
+}
+
+func (h *gapHistogram) sample(rng *rand.Rand) time.Duration {
+	return h.gaps[h.table.pick(rng)]
+}
+
+func loadGapHistogram(path string) (*gapHistogram, error) {
+	f, err := os.Open(path)
+	if err != nil {
+		return nil, err
+	}
+	defer f.Close()
+	h := &gapHistogram{}
+	var weights []float64
+	sc := bufio.NewScanner(f)
+	for n := 1; sc.Scan(); n++ {
+		line := strings.TrimSpace(sc.Text())
+		if line == "" || strings.HasPrefix(line, "#") {
+			continue
+		}
+		fields := strings.FieldsFunc(line, func(r rune) bool { return r == ',' || r == ' ' || r == '\t' })
+		if len(fields) == 0 {
+			return nil, fmt.Errorf("%s:%d: no gap in %q", path, n, line)
+		}
+		gap, err := strconv.ParseFloat(fields[0], 64)
+		if err != nil || gap < 0 {
+			return nil, fmt.Errorf("%s:%d: invalid gap %q", path, n, fields[0])
+		}
+		weight := 1.0
+		if len(fields) > 1 {
+			weight, err = strconv.ParseFloat(fields[1], 64)
+			if err != nil || weight < 0 {
+				return nil, fmt.Errorf("%s:%d: invalid count %q", path, n, fields[1])
+			}
+		}
+		if weight == 0 {
+			continue
+		}
+		h.gaps = append(h.gaps, msDuration(gap))
+		weights = append(weights, weight)
+	}
+	if err := sc.Err(); err != nil {
+		return nil, err
+	}
+	if len(h.gaps) == 0 {
+		return nil, fmt.Errorf("%s: histogram has no samples", path)
+	}
+	h.table = newWeightedAliasTable(weights)
+	return h, nil
+}
+
+// compileLatencies resolves each model's latency profile and the fallback
+// pacing used by models without one.
+func compileLatencies(c *BotConfig) error {
+	c.latencies = map[string]Latency{}
+	for _, m := range c.Models {
+		if m.Latency == nil {
+			continue
+		}
+		l, err := newLatency(m.Latency, c.dir)
+		if err != nil {
+			return fmt.Errorf("model %q: latency: %w", m.ID, err)
+		}
+		c.latencies[m.ID] = l
+	}
+	return nil
+}
+
+// HasLatencyProfile reports whether model has a latency profile configured.
+// Non-streaming responses are only delayed for such models.
+func (c *BotConfig) HasLatencyProfile(model string) bool {
+	if c == nil {
+		return false
+	}
+	if c.latencies != nil {
+		_, ok := c.latencies[model]
+		return ok
+	}
+	for _, m := range c.Models {
+		if m.ID == model && m.Latency != nil {
+			return true
+		}
+	}
+	return false
+}
+
+// LatencyFor resolves the pacing of a response for model. A matched rule's
+// stream_override.chunk_delay_ms wins, then the model's latency profile,
+// then streaming.chunk_delay_ms, then the built-in default.
+func (c *BotConfig) LatencyFor(model string, mr *matchedRule) Latency {
+	if mr != nil && mr.Rule.StreamOverride != nil && mr.Rule.StreamOverride.ChunkDelayMs != nil {
+		return fixedLatency(time.Duration(*mr.Rule.StreamOverride.ChunkDelayMs) * time.Millisecond)
+	}
+	if c == nil {
+		return fixedLatency(defaultChunkDelayMs * time.Millisecond)
+	}
+	if c.latencies != nil {
+		if l, ok := c.latencies[model]; ok {
+			return l
+		}
+	} else {
+		// not compiled (config built in code without Compile)
+		for _, m := range c.Models {
+			if m.ID == model && m.Latency != nil {
+				if l, err := newLatency(m.Latency, c.dir); err == nil {
+					return l
+				}
+			}
+		}
+	}
+	return fixedLatency(time.Duration(getStreamingDelayMs(c.Streaming, nil, defaultChunkDelayMs)) * time.Millisecond)
+}
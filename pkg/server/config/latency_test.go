@@ -0,0 +1,130 @@
+package config
+
+import (
+	"os"
+	"path/filepath"
+	"strings"
+	"testing"
+	"time"
+)
+
+func TestLatencyForPrecedence(t *testing.T) {
+	global, override := 80, 5
+	c := &BotConfig{
+		Models: []ModelConfig{
+			{ID: "fast", Latency: &LatencyProfile{TTFTMs: 300, TokensPerSecond: 100}},
+			{ID: "plain"},
+		},
+		Streaming: StreamingConfig{ChunkDelayMs: &global},
+		Rules:     []Rule{{ID: "slow", StreamOverride: &StreamingConfig{ChunkDelayMs: &override}}},
+	}
+	if err := c.Compile(); err != nil {
+		t.Fatal(err)
+	}
+	mr := c.EvaluateRules("chat", "fast", "user", "x", "x", nil)
+
+	cases := []struct {
+		name      string
+		got       Latency
+		ttft, gap time.Duration
+	}{
+		{"rule override", c.LatencyFor("fast", mr), 0, 5 * time.Millisecond},
+		{"model profile", c.LatencyFor("fast", nil), 300 * time.Millisecond, 10 * time.Millisecond},
+		{"global delay", c.LatencyFor("plain", nil), 0, 80 * time.Millisecond},
+		{"built-in default", (*BotConfig)(nil).LatencyFor("plain", nil), 0, 150 * time.Millisecond},
+	}
+	for _, tc := range cases {
+		if tc.got.Delay(0) != tc.ttft || tc.got.Delay(1) != tc.gap {
+			t.Errorf("%s: ttft %v gap %v, want %v and %v", tc.name, tc.got.Delay(0), tc.got.Delay(1), tc.ttft, tc.gap)
+		}
+	}
+	if !c.HasLatencyProfile("fast") || c.HasLatencyProfile("plain") {
+		t.Error("HasLatencyProfile disagrees with the models section")
+	}
+}
+
+func TestLatencyJitterDistributions(t *testing.T) {
+	dir := t.TempDir()
+	hist := "# gap_ms count\n10 3\n40,1\n\n"
+	if err := os.WriteFile(filepath.Join(dir, "gaps.txt"), []byte(hist), 0o644); err != nil {
+		t.Fatal(err)
+	}
+	const n = 20000
+	mean := func(l Latency) time.Duration {
+		var sum time.Duration
+		for i := 0; i < n; i++ {
+			g := l.NextGap()
+			if g < 0 {
+				t.Fatalf("negative gap %v", g)
+			}
+			sum += g
+		}
+		return sum / n
+	}
+	for _, tc := range []struct {
+		jitter JitterConfig
+		want   time.Duration
+	}{
+		{JitterConfig{Distribution: "normal", StdDevMs: 2}, 20 * time.Millisecond},
+		{JitterConfig{Distribution: "lognormal", Sigma: 0.5}, 20 * time.Millisecond},
+		// (3*10 + 1*40) / 4
+		{JitterConfig{Distribution: "empirical", HistogramFile: "gaps.txt"}, 17500 * time.Microsecond},
+	} {
+		l, err := newLatency(&LatencyProfile{TokensPerSecond: 50, Jitter: tc.jitter}, dir)
+		if err != nil {
+			t.Fatalf("%s: %v", tc.jitter.Distribution, err)
+		}
+		if got := mean(l); got < tc.want*95/100 || got > tc.want*105/100 {
+			t.Errorf("%s: mean gap %v, want ~%v", tc.jitter.Distribution, got, tc.want)
+		}
+	}
+}
+
+func TestCompileRejectsBadLatencyProfile(t *testing.T) {
+	for _, j := range []JitterConfig{
+		{Distribution: "gamma"},
+		{Distribution: "empirical"},
+		{Distribution: "empirical", HistogramFile: "does-not-exist.txt"},
+	} {
+		c := &BotConfig{Models: []ModelConfig{{ID: "m", Latency: &LatencyProfile{Jitter: j}}}}
+		if err := c.Compile(); err == nil || !strings.Contains(err.Error(), `model "m"`) {
+			t.Errorf("%+v: expected an error naming the model, got %v", j, err)
+		}
+	}
+}
+
+func TestLoadGapHistogramRejectsBadLines(t *testing.T) {
+	dir := t.TempDir()
+	for hist, want := range map[string]string{
+		"10 3\n,\n":     ":2: no gap",
+		"10 3\n , \t\n": ":2: no gap",
+		"x 3\n":         ":1: invalid gap",
+		"10 -1\n":       ":1: invalid count",
+		"# none\n":      "no samples",
+	} {
+		path := filepath.Join(dir, "gaps.txt")
+		if err := os.WriteFile(path, []byte(hist), 0o644); err != nil {
+			t.Fatal(err)
+		}
+		if _, err := loadGapHistogram(path); err == nil || !strings.Contains(err.Error(), want) {
+			t.Errorf("%q: got %v, want an error with %q", hist, err, want)
+		}
+	}
+}
+
+func TestLatencySeedIsReproducible(t *testing.T) {
+	l, err := newLatency(&LatencyProfile{TTFTMs: 200, TokensPerSecond: 40, Jitter: JitterConfig{Distribution: "lognormal", Sigma: 0.6}}, "")
+	if err != nil {
+		t.Fatal(err)
+	}
+	a, b := l.WithRand(NewRand(42)), l.WithRand(NewRand(42))
+	for i := 0; i < 50; i++ {
+		if da, db := a.Delay(i), b.Delay(i); da != db {
+			t.Fatalf("delay %d differs for the same seed: %v vs %v", i, da, db)
+		}
+	}
+	fixed := l.WithGap(0).WithTTFT(5 * time.Millisecond)
+	if fixed.Delay(0) != 5*time.Millisecond || fixed.Delay(1) != 0 {
+		t.Fatalf("fixed overrides still jitter: %v %v", fixed.Delay(0), fixed.Delay(1))
+	}
+}
@@ -0,0 +1,43 @@
+package config
+
+import "math/rand"
+
+// NewRand returns the random source of one request. Weighted choices,
+// probability gates and latency jitter drawn from it are reproducible for a
+// given seed, and requests never share it, so it needs no lock. It is not
+// safe for concurrent use.
+//
+// Functions taking a *rand.Rand fall back to the global math/rand source
+// when given nil, for callers outside a request.
+func NewRand(seed int64) *rand.Rand {
+	return rand.New(&splitMix64{state: uint64(seed)})
+}
+
+// splitMix64 is a rand.Source64 with 8 bytes of state: creating and seeding
+// one per request is nearly free, unlike math/rand's default ~5 KB source.
+type splitMix64 struct {
+	state uint64
+}
+
+func (s *splitMix64) Uint64() uint64 {
+	s.state += 0x9e3779b97f4a7c15
+	z := s.state
+	z = (z ^ (z >> 30)) * 0xbf58476d1ce4e5b9
+	z = (z ^ (z >> 27)) * 0x94d049bb133111eb
+	return z ^ (z >> 31)
+}
+
+func (s *splitMix64) Int63() int64 {
+	return int64(s.Uint64() >> 1)
+}
+
+func (s *splitMix64) Seed(seed int64) {
+	s.state = uint64(seed)
+}
+
+func rngFloat64(rng *rand.Rand) float64 {
+	if rng != nil {
+		return rng.Float64()
+	}
+	return rand.Float64()
+}
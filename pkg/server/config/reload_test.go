@@ -0,0 +1,93 @@
+package config
+
+import (
+	"os"
+	"path/filepath"
+	"sync"
+	"sync/atomic"
+	"testing"
+)
+
+// writeConfig writes a config whose single rule answers "ping" with the
+// config version, so a request can tell which snapshot served it. (The
+// configs are written in the JSON subset of YAML.)
+func writeConfig(t *testing.T, path, version, regex string) {
+	t.Helper()
+	body := `{"version": ` + version + `, "rules": [{"id": "v", "match": {"contains": ["ping"], "regex": "` + regex + `"}, "respond": {"text": "` + version + `"}}]}`
+	if err := os.WriteFile(path, []byte(body), 0o600); err != nil {
+		t.Fatal(err)
+	}
+}
+
+func TestReloadSwapsAtomicallyUnderLoad(t *testing.T) {
+	path := filepath.Join(t.TempDir(), "bot.yaml")
+	writeConfig(t, path, "1", "p")
+	prevPath, prevCfg := configPath.Load(), Get()
+	configPath.Store(&path)
+	t.Cleanup(func() { configPath.Store(prevPath); Set(prevCfg) })
+	if err := Reload(); err != nil {
+		t.Fatal(err)
+	}
+
+	stop := make(chan struct{})
+	var served, inconsistent atomic.Int64
+	var wg sync.WaitGroup
+	for g := 0; g < 8; g++ {
+		wg.Add(1)
+		go func() {
+			defer wg.Done()
+			for {
+				select {
+				case <-stop:
+					return
+				default:
+				}
+				conf := Get()
+				mr := conf.EvaluateRules("chat", "gpt-4o", "user", "ping", "ping", nil)
+				if mr == nil || mr.Rule != &conf.Rules[0] {
+					inconsistent.Add(1)
+				}
+				served.Add(1)
+			}
+		}()
+	}
+	for i := 2; i < 40; i++ {
+		writeConfig(t, path, string(rune('0'+i%10)), "p")
+		if err := Reload(); err != nil {
+			t.Fatal(err)
+		}
+	}
+	close(stop)
+	wg.Wait()
+
+	if inconsistent.Load() != 0 {
+		t.Fatalf("%d of %d requests saw an inconsistent config", inconsistent.Load(), served.Load())
+	}
+	if st := GetReloadStats(); st.Reloads < 39 || st.LastDurationMs <= 0 {
+		t.Fatalf("unexpected reload stats %+v", st)
+	}
+}
+
+func TestReloadKeepsConfigOnError(t *testing.T) {
+	path := filepath.Join(t.TempDir(), "bot.yaml")
+	writeConfig(t, path, "1", "p")
+	prevPath, prevCfg := configPath.Load(), Get()
+	configPath.Store(&path)
+	t.Cleanup(func() { configPath.Store(prevPath); Set(prevCfg) })
+	if err := Reload(); err != nil {
+		t.Fatal(err)
+	}
+	good := Get()
+	failures := GetReloadStats().Failures
+
+	writeConfig(t, path, "2", "(")
+	if err := Reload(); err == nil {
+		t.Fatal("expected invalid regex to fail the reload")
+	}
+	if Get() != good {
+		t.Fatal("a failed reload must keep the active config")
+	}
+	if st := GetReloadStats(); st.Failures != failures+1 || st.LastError == "" {
+		t.Fatalf("unexpected reload stats %+v", st)
+	}
+}
@@ -0,0 +1,239 @@
+package config
+
+import (
+	"math/rand"
+	"strings"
+	"sync"
+	"time"
+)
+
+// Template is a response text parsed once into literal and {{var}}
+// placeholder segments, so rendering is a single pass with no per-variable
+// string replacement.
+type Template struct {
+	segments []templateSegment
+}
+
+type templateSegment struct {
+	text  string // literal text, or the variable name for placeholders
+	isVar bool
+}
+
+// ParseTemplate splits s into literal and placeholder segments. Placeholders
+// are exact `{{name}}` references; unknown names are rendered back verbatim.
+func ParseTemplate(s string) *Template {
+	t := &Template{}
+	for s != "" {
+		end := strings.Index(s, "}}")
+		open := -1
+		if end >= 0 {
+			// the placeholder is the innermost "{{" before the closing braces
+			open = strings.LastIndex(s[:end], "{{")
+		}
+		if open < 0 {
+			if end < 0 {
+				t.addLiteral(s)
+				break
+			}
+			t.addLiteral(s[:end+2])
+			s = s[end+2:]
+			continue
+		}
+		t.addLiteral(s[:open])
+		t.segments = append(t.segments, templateSegment{text: s[open+2 : end], isVar: true})
+		s = s[end+2:]
+	}
+	return t
+}
+
+func (t *Template) addLiteral(s string) {
+	if s == "" {
+		return
+	}
+	// merge adjacent literals
+	if n := len(t.segments); n > 0 && !t.segments[n-1].isVar {
+		t.segments[n-1].text += s
+	} else {
+		t.segments = append(t.segments, templateSegment{text: s})
+	}
+}
+
+// IsEmpty reports whether the template renders to the empty string.
+func (t *Template) IsEmpty() bool {
+	return t == nil || len(t.segments) == 0
+}
+
+var renderBufPool = sync.Pool{New: func() interface{} { b := make([]byte, 0, 1024); return &b }}
+
+// Render expands the template against ctx. Variables are only resolved when
+// the template references them.
+func (t *Template) Render(ctx *TemplateContext) string {
+	if t.IsEmpty() {
+		return ""
+	}
+	if len(t.segments) == 1 && !t.segments[0].isVar {
+		return t.segments[0].text
+	}
+	bp := renderBufPool.Get().(*[]byte)
+	buf := (*bp)[:0]
+	for _, seg := range t.segments {
+		if !seg.isVar {
+			buf = append(buf, seg.text...)
+			continue
+		}
+		if v, ok := ctx.lookup(seg.text); ok {
+			buf = append(buf, v...)
+		} else {
+			buf = append(buf, "{{"...)
+			buf = append(buf, seg.text...)
+			buf = append(buf, "}}"...)
+		}
+	}
+	out := string(buf)
+	// don't let one huge render pin a large buffer in the pool
+	if cap(buf) <= 64<<10 {
+		*bp = buf
+		renderBufPool.Put(bp)
+	}
+	return out
+}
+
+// TemplateContext supplies template variables for one request. Built-in
+// values are plain fields; derived values such as the timestamp are computed
+// at most once and only when a template asks for them. Config variables take
+// precedence over built-ins.
+type TemplateContext struct {
+	Model           string
+	LastUserMessage string
+	InputText       string
+
+	vars      map[string]string
+	timestamp string
+}
+
+// NewTemplateContext builds the template context for a request against this
+// configuration.
+func (c *BotConfig) NewTemplateContext(model, lastUser, fullText string) *TemplateContext {
+	ctx := &TemplateContext{Model: model, LastUserMessage: lastUser, InputText: fullText}
+	if c != nil {
+		ctx.vars = c.Variables
+	}
+	return ctx
+}
+
+func (c *TemplateContext) lookup(name string) (string, bool) {
+	if c == nil {
+		return "", false
+	}
+	if v, ok := c.vars[name]; ok {
+		return v, true
+	}
+	switch name {
+	case "model":
+		return c.Model, true
+	case "last_user_message":
+		return c.LastUserMessage, true
+	case "input_text":
+		return c.InputText, true
+	case "timestamp":
+		if c.timestamp == "" {
+			c.timestamp = time.Now().Format(time.RFC3339)
+		}
+		return c.timestamp, true
+	}
+	return "", false
+}
+
+// BuildTemplateContext returns the template variables of a request under
+// the active configuration as a map.
+//
+// Deprecated: use Get().NewTemplateContext, which only computes the
+// timestamp when a template uses it.
+func BuildTemplateContext(model, lastUser, fullText string) map[string]string {
+	ctx := map[string]string{
+		"model":             model,
+		"last_user_message": lastUser,
+		"input_text":        fullText,
+		"timestamp":         time.Now().Format(time.RFC3339),
+	}
+	if c := Get(); c != nil {
+		for k, v := range c.Variables {
+			ctx[k] = v
+		}
+	}
+	return ctx
+}
+
+// RenderTemplate parses s and renders it against the variables in ctx.
+//
+// Deprecated: parse once with ParseTemplate (or use the templates Compile
+// precompiles: PickTemplate, MessageOut.Template) and render with a
+// BotConfig.NewTemplateContext.
+func RenderTemplate(s string, ctx map[string]string) string {
+	return ParseTemplate(s).Render(&TemplateContext{vars: ctx})
+}
+
+// compileTemplates parses every response text in the config.
+func compileTemplates(c *BotConfig) {
+	compileRespond := func(r *RespondWrapper) {
+		r.textTmpl = parseNonEmpty(r.Text)
+		for i := range r.Choose {
+			r.Choose[i].tmpl = ParseTemplate(r.Choose[i].Text)
+		}
+		r.Message.tmpl = parseNonEmpty(r.Message.Text)
+	}
+	for i := range c.Rules {
+		compileRespond(&c.Rules[i].Respond)
+	}
+	compileRespond(&c.Fallback)
+	for name, def := range c.Tools.Registry {
+		if def.Message != nil {
+			msg := *def.Message
+			msg.tmpl = parseNonEmpty(msg.Text)
+			def.Message = &msg
+			c.Tools.Registry[name] = def
+		}
+	}
+}
+
+func parseNonEmpty(s string) *Template {
+	if s == "" {
+		return nil
+	}
+	return ParseTemplate(s)
+}
+
+// Template returns the precompiled message text template.
+func (m MessageOut) Template() *Template {
+	if m.tmpl == nil && m.Text != "" {
+		return ParseTemplate(m.Text)
+	}
+	return m.tmpl
+}
+
+// PickTemplate returns the precompiled template of a response: it samples
+// choose entries by weight from rng, then falls back to text and
+// message.text. It returns nil when the response has no text.
+func PickTemplate(resp RespondWrapper, rng *rand.Rand) *Template {
+	if len(resp.Choose) > 0 {
+		t := resp.chooser
+		if t == nil {
+			t = newAliasTable(resp.Choose)
+		}
+		c := resp.Choose[t.pick(rng)]
+		if c.tmpl == nil {
+			return ParseTemplate(c.Text)
+		}
+		return c.tmpl
+	}
+	if resp.Text != "" {
+		if resp.textTmpl == nil {
+			return ParseTemplate(resp.Text)
+		}
+		return resp.textTmpl
+	}
+	if resp.Message.Text != "" {
+		return resp.Message.Template()
+	}
+	return nil
+}
@@ -0,0 +1,100 @@
+package config
+
+import (
+	"strings"
+	"testing"
+)
+
+func TestTemplateRender(t *testing.T) {
+	ctx := &TemplateContext{Model: "gpt-4o", LastUserMessage: "hi there", InputText: "full", vars: map[string]string{"bot_name": "Mock", "model": "overridden"}}
+	cases := map[string]string{
+		"":                                     "",
+		"plain text":                           "plain text",
+		"Hello! I'm {{bot_name}}.":             "Hello! I'm Mock.",
+		"{{last_user_message}}|{{input_text}}": "hi there|full",
+		"{{model}}":                            "overridden",
+		"keep {{unknown}} and {{}}":            "keep {{unknown}} and {{}}",
+		"nested {{a{{bot_name}}":               "nested {{aMock",
+		"stray }} and {{ open":                 "stray }} and {{ open",
+	}
+	for in, want := range cases {
+		if got := ParseTemplate(in).Render(ctx); got != want {
+			t.Errorf("%q: got %q want %q", in, got, want)
+		}
+	}
+}
+
+func TestTemplateTimestampIsLazy(t *testing.T) {
+	ctx := (&BotConfig{}).NewTemplateContext("gpt-4o", "hi", "hi")
+	ParseTemplate("no timestamp {{model}}").Render(ctx)
+	if ctx.timestamp != "" {
+		t.Fatal("timestamp computed for a template that does not use it")
+	}
+	if out := ParseTemplate("{{timestamp}}").Render(ctx); out == "" || out != ctx.timestamp {
+		t.Fatalf("timestamp not rendered: %q", out)
+	}
+}
+
+func TestDeprecatedTemplateHelpers(t *testing.T) {
+	prev := Get()
+	Set(&BotConfig{Variables: map[string]string{"bot_name": "Mock"}})
+	defer Set(prev)
+	ctx := BuildTemplateContext("gpt-4o", "hi", "all of it")
+	if got := RenderTemplate("{{bot_name}} on {{model}}: {{last_user_message}} / {{input_text}} {{other}}", ctx); got != "Mock on gpt-4o: hi / all of it {{other}}" {
+		t.Fatalf("rendered %q", got)
+	}
+	if ctx["timestamp"] == "" {
+		t.Fatal("no timestamp in the context")
+	}
+	choose := RespondWrapper{Choose: []WeightedText{{Weight: 1, Text: "{{model}} a"}, {Weight: 0, Text: "b"}}}
+	for i := 0; i < 20; i++ {
+		if got := PickText(choose); got != "{{model}} a" && got != "b" {
+			t.Fatalf("PickText picked %q", got)
+		}
+	}
+	if got := PickText(RespondWrapper{Message: MessageOut{Text: "m"}}); got != "m" {
+		t.Fatalf("PickText fell back to %q", got)
+	}
+}
+
+func TestCompileParsesToolTemplates(t *testing.T) {
+	c := defaultConfig()
+	ensureDefaultTools(c)
+	if err := c.Compile(); err != nil {
+		t.Fatal(err)
+	}
+	if c.Tools.Registry["custom_demo"].Message.tmpl == nil {
+		t.Fatal("tool message template not compiled")
+	}
+	if PickTemplate(c.Rules[0].Respond, nil) != c.Rules[0].Respond.textTmpl {
+		t.Fatal("PickTemplate should return the precompiled template")
+	}
+}
+
+var benchTemplate = strings.Repeat("Hello {{bot_name}}, you said '{{last_user_message}}' to {{model}}. ", 20)
+
+func BenchmarkTemplateCompiled(b *testing.B) {
+	withConfig(b, &BotConfig{Variables: map[string]string{"bot_name": "Mock", "team": "x", "env": "dev"}})
+	tmpl := ParseTemplate(benchTemplate)
+	b.ReportAllocs()
+	for i := 0; i < b.N; i++ {
+		tmpl.Render(Get().NewTemplateContext("gpt-4o", "tell me a joke", "tell me a joke"))
+	}
+}
+
+// BenchmarkTemplateReplaceAll is the previous map + ReplaceAll-per-key
+// rendering, kept as the baseline.
+func BenchmarkTemplateReplaceAll(b *testing.B) {
+	vars := map[string]string{"bot_name": "Mock", "team": "x", "env": "dev"}
+	b.ReportAllocs()
+	for i := 0; i < b.N; i++ {
+		ctx := map[string]string{"model": "gpt-4o", "last_user_message": "tell me a joke", "input_text": "tell me a joke", "timestamp": "2025-01-01T00:00:00Z"}
+		for k, v := range vars {
+			ctx[k] = v
+		}
+		out := benchTemplate
+		for k, v := range ctx {
+			out = strings.ReplaceAll(out, "{{"+k+"}}", v)
+		}
+	}
+}
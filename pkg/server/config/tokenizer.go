@@ -0,0 +1,98 @@
+package config
+
+import (
+	"fmt"
+	"os"
+	"path/filepath"
+
+	"mock-openai-server/pkg/server/tokenizer"
+)
+
+// TokenizerConfig points the server at tiktoken vocabularies so usage is
+// counted in real tokens. Without a vocab_dir, usage falls back to
+// whitespace-separated word counts.
+type TokenizerConfig struct {
+	// VocabDir holds <encoding>.tiktoken files (e.g. o200k_base.tiktoken),
+	// relative to the config file's directory.
+	VocabDir string `yaml:"vocab_dir"`
+	// Encoding is used for models tiktoken does not know; default o200k_base.
+	Encoding string `yaml:"encoding"`
+}
+
+func (t TokenizerConfig) defaultEncoding() string {
+	if t.Encoding != "" {
+		return t.Encoding
+	}
+	return tokenizer.O200K
+}
+
+// EncodingFor returns the name of the encoding model is counted with: the
+// model's encoding if set, else the one tiktoken uses for it, else
+// tokenizer.encoding. It does not need the vocabulary to be loaded.
+func (c *BotConfig) EncodingFor(model string) string {
+	if c != nil {
+		for _, m := range c.Models {
+			if m.ID == model && m.Encoding != "" {
+				return m.Encoding
+			}
+		}
+	}
+	if enc := tokenizer.ForModel(model); enc != "" {
+		return enc
+	}
+	if c == nil {
+		return tokenizer.O200K
+	}
+	return c.Tokenizer.defaultEncoding()
+}
+
+// loadEncodings loads the vocabulary of the default encoding and of every
+// configured model, which must exist, plus any other supported vocabulary
+// found in vocab_dir (for requests naming unlisted models). Vocabularies are
+// cached by the tokenizer package, so a reload only reads files that
+// changed.
+func loadEncodings(c *BotConfig) error {
+	c.encodings = nil
+	dir := c.Tokenizer.VocabDir
+	if dir == "" {
+		return nil
+	}
+	if !filepath.IsAbs(dir) && c.dir != "" {
+		dir = filepath.Join(c.dir, dir)
+	}
+	required := map[string]bool{c.Tokenizer.defaultEncoding(): true}
+	for _, m := range c.Models {
+		required[c.EncodingFor(m.ID)] = true
+	}
+	for name := range required {
+		if name != tokenizer.CL100K && name != tokenizer.O200K {
+			return fmt.Errorf("tokenizer: unsupported encoding %q (want %s or %s)", name, tokenizer.CL100K, tokenizer.O200K)
+		}
+	}
+	c.encodings = map[string]*tokenizer.Encoding{}
+	for _, name := range []string{tokenizer.CL100K, tokenizer.O200K} {
+		path := filepath.Join(dir, name+".tiktoken")
+		if _, err := os.Stat(path); err != nil && !required[name] {
+			continue
+		}
+		enc, err := tokenizer.Load(name, path)
+		if err != nil {
+			return fmt.Errorf("tokenizer: %w", err)
+		}
+		c.encodings[name] = enc
+	}
+	return nil
+}
+
+// TokenizerFor returns the tokenizer for model: the model's encoding if
+// set, else the one tiktoken uses for it, else tokenizer.encoding. It
+// returns nil when no vocabulary is configured; callers then count words.
+func (c *BotConfig) TokenizerFor(model string) *tokenizer.Encoding {
+	if c == nil || c.encodings == nil {
+		return nil
+	}
+	if enc, ok := c.encodings[c.EncodingFor(model)]; ok {
+		return enc
+	}
+	return c.encodings[c.Tokenizer.defaultEncoding()]
+}
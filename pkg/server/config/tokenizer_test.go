@@ -0,0 +1,42 @@
+package config
+
+import (
+	"os"
+	"path/filepath"
+	"testing"
+
+	"mock-openai-server/pkg/server/tokenizer"
+)
+
+func TestTokenizerFor(t *testing.T) {
+	dir := t.TempDir()
+	vocab, err := os.ReadFile(filepath.Join("..", "tokenizer", "testdata", "tiny.tiktoken"))
+	if err != nil {
+		t.Fatal(err)
+	}
+	if err := os.WriteFile(filepath.Join(dir, "o200k_base.tiktoken"), vocab, 0o644); err != nil {
+		t.Fatal(err)
+	}
+
+	if (&BotConfig{}).TokenizerFor("gpt-4o") != nil {
+		t.Fatal("a config without vocab_dir should count words")
+	}
+	// gpt-4 would use cl100k_base, which is not in dir
+	c := &BotConfig{Tokenizer: TokenizerConfig{VocabDir: dir}, Models: []ModelConfig{{ID: "gpt-4"}}}
+	if err := c.Compile(); err == nil {
+		t.Fatal("expected an error for the missing cl100k_base vocabulary")
+	}
+	c.Models[0].Encoding = tokenizer.O200K
+	if err := c.Compile(); err != nil {
+		t.Fatal(err)
+	}
+	for _, model := range []string{"gpt-4", "gpt-4o", "gpt-3.5-turbo", "custom"} {
+		if enc := c.TokenizerFor(model); enc == nil || enc.Name() != tokenizer.O200K {
+			t.Errorf("%s: got %v, want the o200k_base fallback", model, enc)
+		}
+	}
+	c.Tokenizer.Encoding = "p50k_base"
+	if err := c.Compile(); err == nil {
+		t.Fatal("expected an error for an unsupported encoding")
+	}
+}
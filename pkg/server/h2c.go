@@ -0,0 +1,16 @@
+package server
+
+import "net/http"
+
+// enableH2C serves unencrypted HTTP/2 next to HTTP/1.1. Clients must use
+// prior knowledge (curl --http2-prior-knowledge); the HTTP/1.1 Upgrade
+// dance is not supported.
+func enableH2C(srv *http.Server, maxStreams int) {
+	var p http.Protocols
+	p.SetHTTP1(true)
+	p.SetUnencryptedHTTP2(true)
+	srv.Protocols = &p
+	if maxStreams > 0 {
+		srv.HTTP2 = &http.HTTP2Config{MaxConcurrentStreams: maxStreams}
+	}
+}
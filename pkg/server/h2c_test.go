@@ -0,0 +1,96 @@
+package server
+
+import (
+	"io"
+	"net/http"
+	"strings"
+	"sync"
+	"testing"
+
+	cfg "mock-openai-server/pkg/server/config"
+)
+
+// startTestServer serves the API on a loopback port the way StartHTTPServer
+// does and returns its base URL.
+func startTestServer(tb testing.TB, hc cfg.HTTPConfig) string {
+	tb.Helper()
+	ln, err := listenTCP(hc, "127.0.0.1:0")
+	if err != nil {
+		tb.Fatal(err)
+	}
+	srv := newHTTPServer(hc, newRouter())
+	go func() { _ = srv.Serve(ln) }()
+	tb.Cleanup(func() { _ = srv.Close() })
+	return "http://" + ln.Addr().String()
+}
+
+func h2cClient() *http.Client {
+	var p http.Protocols
+	p.SetUnencryptedHTTP2(true)
+	return &http.Client{Transport: &http.Transport{Protocols: &p}}
+}
+
+func TestH2C(t *testing.T) {
+	url := startTestServer(t, cfg.HTTPConfig{H2C: true})
+	for _, tc := range []struct {
+		client *http.Client
+		proto  int
+	}{{h2cClient(), 2}, {http.DefaultClient, 1}} {
+		resp, err := tc.client.Get(url + "/health")
+		if err != nil {
+			t.Fatal(err)
+		}
+		resp.Body.Close()
+		if resp.StatusCode != http.StatusOK || resp.ProtoMajor != tc.proto {
+			t.Fatalf("got %s %d, want HTTP/%d 200", resp.Proto, resp.StatusCode, tc.proto)
+		}
+	}
+}
+
+// BenchmarkSSEStreams runs batches of concurrent chat streams over
+// HTTP/1.1, one connection per stream, and over h2c, multiplexed on one
+// connection.
+func BenchmarkSSEStreams(b *testing.B) {
+	const streams = 64
+	noDelay := 0
+	conf := &cfg.BotConfig{
+		Streaming: cfg.StreamingConfig{ChunkDelayMs: &noDelay},
+		Fallback:  cfg.RespondWrapper{Text: strings.Repeat("streamed token ", 100)},
+	}
+	if err := conf.Compile(); err != nil {
+		b.Fatal(err)
+	}
+	prev := cfg.Get()
+	cfg.Set(conf)
+	defer cfg.Set(prev)
+	body := `{"model":"gpt-4o","stream":true,"messages":[{"role":"user","content":"hi"}]}`
+
+	for _, h2c := range []bool{false, true} {
+		name, client := "http1", &http.Client{Transport: &http.Transport{MaxIdleConnsPerHost: streams}}
+		if h2c {
+			name, client = "h2c", h2cClient()
+		}
+		b.Run(name, func(b *testing.B) {
+			url := startTestServer(b, cfg.HTTPConfig{H2C: h2c})
+			b.ResetTimer()
+			for i := 0; i < b.N; i++ {
+				var wg sync.WaitGroup
+				for s := 0; s < streams; s++ {
+					wg.Add(1)
+					go func() {
+						defer wg.Done()
+						resp, err := client.Post(url+"/v1/chat/completions", "application/json", strings.NewReader(body))
+						if err != nil {
+							b.Error(err)
+							return
+						}
+						_, _ = io.Copy(io.Discard, resp.Body)
+						resp.Body.Close()
+					}()
+				}
+				wg.Wait()
+			}
+			b.ReportMetric(float64(b.N*streams)/b.Elapsed().Seconds(), "streams/s")
+		})
+	}
+}
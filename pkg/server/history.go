@@ -0,0 +1,75 @@
+package server
+
+import (
+	"sync/atomic"
+	"unicode"
+	"unicode/utf8"
+)
+
+// historyNode is one turn of a Responses API conversation: the input that was
+// sent and the text that was returned, linked to the turn it continued from.
+//
+// Nodes are immutable once created, so continuing or forking a conversation
+// from any previous_response_id is O(1): the new turn simply points at its
+// parent and siblings share their common ancestry. Nothing flattens the
+// conversation: prompt usage comes from the running token count.
+type historyNode struct {
+	parent *historyNode
+	input  string
+	output string
+	// turns and tokens are cumulative over the whole path from the root so
+	// that sizes and usage can be computed without walking the tree.
+	turns  int
+	tokens int
+	// refs counts the stored responses and retained child turns that point
+	// at this turn; the store charges its size while refs is non-zero.
+	refs atomic.Int32
+}
+
+// newHistoryNode appends a turn after parent (which may be nil for a new
+// conversation). tokens is the token count of input and output together.
+func newHistoryNode(parent *historyNode, input, output string, tokens int) *historyNode {
+	n := &historyNode{parent: parent, input: input, output: output, turns: 1, tokens: tokens}
+	if parent != nil {
+		n.turns += parent.turns
+		n.tokens += parent.tokens
+	}
+	return n
+}
+
+// Tokens returns the token count of the whole conversation.
+func (n *historyNode) Tokens() int {
+	if n == nil {
+		return 0
+	}
+	return n.tokens
+}
+
+// size is the memory owned by this turn alone; each ancestor is charged
+// separately for as long as anything retains it (see shardedStore.retain).
+func (n *historyNode) size() int64 {
+	if n == nil {
+		return 0
+	}
+	return int64(64 + len(n.input) + len(n.output))
+}
+
+// countWords returns len(strings.Fields(s)) without allocating.
+func countWords(s string) int {
+	n := 0
+	inWord := false
+	for i := 0; i < len(s); {
+		r, size := rune(s[i]), 1
+		if r >= utf8.RuneSelf {
+			r, size = utf8.DecodeRuneInString(s[i:])
+		}
+		i += size
+		if unicode.IsSpace(r) {
+			inWord = false
+		} else if !inWord {
+			inWord = true
+			n++
+		}
+	}
+	return n
+}
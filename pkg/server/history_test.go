@@ -0,0 +1,96 @@
+package server
+
+import (
+	"math/rand"
+	"strconv"
+	"strings"
+	"testing"
+)
+
+// texts returns the conversation ending at n as alternating inputs and
+// outputs, oldest first.
+func texts(n *historyNode) []string {
+	var out []string
+	for ; n != nil; n = n.parent {
+		out = append([]string{n.input, n.output}, out...)
+	}
+	return out
+}
+
+func TestHistoryForksDoNotShareState(t *testing.T) {
+	root := newHistoryNode(nil, "hi", "hello", 2)
+	a := newHistoryNode(root, "tell a joke", "an impasta", 5)
+	b := newHistoryNode(root, "weather?", "always sunny", 3)
+
+	if got := strings.Join(texts(a), "|"); got != "hi|hello|tell a joke|an impasta" {
+		t.Fatalf("fork a: %q", got)
+	}
+	if got := strings.Join(texts(b), "|"); got != "hi|hello|weather?|always sunny" {
+		t.Fatalf("fork b: %q", got)
+	}
+	if a.Tokens() != 7 || b.Tokens() != 5 {
+		t.Fatalf("tokens: got %d and %d, want 7 and 5", a.Tokens(), b.Tokens())
+	}
+	for _, in := range []string{"", "  ", "one", " two  words\n", "tab\tsep\u00a0nbsp", "ünï côdé"} {
+		if got, want := countWords(in), len(strings.Fields(in)); got != want {
+			t.Fatalf("countWords(%q) = %d, want %d", in, got, want)
+		}
+	}
+	var none *historyNode
+	if none.Tokens() != 0 || texts(none) != nil {
+		t.Fatal("nil history should be empty")
+	}
+}
+
+const benchTurns = 1000
+
+var benchInputs = func() []string {
+	in := make([]string, benchTurns)
+	for i := range in {
+		in[i] = "user says " + strconv.Itoa(i)
+	}
+	return in
+}()
+
+// sliceHistory reproduces the previous copy-on-append history representation
+// as a baseline.
+func sliceHistory(parent []string, input, output string) []string {
+	h := make([]string, 0, len(parent)+2)
+	h = append(h, parent...)
+	return append(h, input, output)
+}
+
+// Both benchmarks grow 1,000-turn conversations where every fourth turn forks
+// from a random earlier response instead of the latest one.
+
+func BenchmarkHistoryTreeForking(b *testing.B) {
+	b.ReportAllocs()
+	for i := 0; i < b.N; i++ {
+		rng := rand.New(rand.NewSource(1))
+		turns := make([]*historyNode, 0, benchTurns)
+		var cur *historyNode
+		for t := 0; t < benchTurns; t++ {
+			if t > 0 && t%4 == 0 {
+				cur = turns[rng.Intn(len(turns))]
+			}
+			cur = newHistoryNode(cur, benchInputs[t], "assistant replies", 5)
+			turns = append(turns, cur)
+		}
+	}
+}
+
+func BenchmarkHistorySliceCopyForking(b *testing.B) {
+	b.ReportAllocs()
+	for i := 0; i < b.N; i++ {
+		rng := rand.New(rand.NewSource(1))
+		turns := make([][]string, 0, benchTurns)
+		var cur []string
+		for t := 0; t < benchTurns; t++ {
+			if t > 0 && t%4 == 0 {
+				cur = turns[rng.Intn(len(turns))]
+			}
+			cur = sliceHistory(cur, benchInputs[t], "assistant replies")
+			turns = append(turns, cur)
+		}
+	}
+}
@@ -0,0 +1,174 @@
+package server
+
+import (
+	"context"
+	"net"
+	"net/http"
+	"sync"
+	"syscall"
+	"time"
+
+	cfg "mock-openai-server/pkg/server/config"
+)
+
+// Defaults for server.http.
+const (
+	defaultReadHeaderTimeout = 10 * time.Second
+	defaultReadTimeout       = 60 * time.Second
+	defaultWriteTimeout      = 30 * time.Second
+	defaultIdleTimeout       = 120 * time.Second
+	defaultTCPKeepAlive      = 15 * time.Second
+)
+
+// msOr converts a server.http duration: 0 takes def and a negative value
+// disables it (returns 0).
+func msOr(ms int, def time.Duration) time.Duration {
+	switch {
+	case ms == 0:
+		return def
+	case ms < 0:
+		return 0
+	default:
+		return time.Duration(ms) * time.Millisecond
+	}
+}
+
+// newHTTPServer builds the public server from server.http.
+func newHTTPServer(hc cfg.HTTPConfig, handler http.Handler) *http.Server {
+	if d := msOr(hc.WriteTimeoutMs, defaultWriteTimeout); d > 0 {
+		handler = writeDeadlineHandler(handler, d)
+	}
+	srv := &http.Server{
+		Handler:           handler,
+		ReadHeaderTimeout: msOr(hc.ReadHeaderTimeoutMs, defaultReadHeaderTimeout),
+		ReadTimeout:       msOr(hc.ReadTimeoutMs, defaultReadTimeout),
+		IdleTimeout:       msOr(hc.IdleTimeoutMs, defaultIdleTimeout),
+		MaxHeaderBytes:    hc.MaxHeaderBytes,
+	}
+	if hc.KeepAlive != nil && !*hc.KeepAlive {
+		srv.SetKeepAlivesEnabled(false)
+	}
+	if hc.H2C {
+		enableH2C(srv, hc.H2CMaxConcurrentStreams)
+	}
+	return srv
+}
+
+// listenTCP opens addr with server.http's TCP keep-alive and connection cap.
+func listenTCP(hc cfg.HTTPConfig, addr string) (net.Listener, error) {
+	return listenTCPControl(hc, addr, nil)
+}
+
+// listenTCPControl is listenTCP with a hook to set socket options before
+// binding (SO_REUSEPORT for workers).
+func listenTCPControl(hc cfg.HTTPConfig, addr string, control func(network, address string, c syscall.RawConn) error) (net.Listener, error) {
+	lc := net.ListenConfig{KeepAlive: msOr(hc.TCPKeepAliveMs, defaultTCPKeepAlive), Control: control}
+	if hc.TCPKeepAliveMs < 0 {
+		lc.KeepAlive = -1
+	}
+	ln, err := lc.Listen(context.Background(), "tcp", addr)
+	if err != nil {
+		return nil, err
+	}
+	return limitListener(ln, hc.MaxConnections), nil
+}
+
+// limitListener caps the connections open at once at n (0 = no cap):
+// Accept waits for one to close before taking another, so a flood of
+// clients queues in the kernel backlog instead of exhausting descriptors.
+func limitListener(ln net.Listener, n int) net.Listener {
+	if n <= 0 {
+		return ln
+	}
+	return &connLimiter{Listener: ln, slots: make(chan struct{}, n), done: make(chan struct{})}
+}
+
+type connLimiter struct {
+	net.Listener
+	slots     chan struct{}
+	done      chan struct{}
+	closeOnce sync.Once
+}
+
+func (l *connLimiter) Accept() (net.Conn, error) {
+	select {
+	case l.slots <- struct{}{}:
+	case <-l.done:
+		return nil, net.ErrClosed
+	}
+	c, err := l.Listener.Accept()
+	if err != nil {
+		<-l.slots
+		return nil, err
+	}
+	return &limitedConn{Conn: c, slots: l.slots}, nil
+}
+
+func (l *connLimiter) Close() error {
+	l.closeOnce.Do(func() { close(l.done) })
+	return l.Listener.Close()
+}
+
+type limitedConn struct {
+	net.Conn
+	slots       chan struct{}
+	releaseOnce sync.Once
+}
+
+func (c *limitedConn) Close() error {
+	err := c.Conn.Close()
+	c.releaseOnce.Do(func() { <-c.slots })
+	return err
+}
+
+// writeDeadlineHandler gives every write to the client d to complete. It
+// replaces http.Server.WriteTimeout, which bounds the whole response and so
+// would cut off streams and latency holds longer than d; a per-write
+// deadline only drops clients that stop reading, so their handlers (and
+// the stream slots they hold) are released.
+//
+// The deadline is also moved when the request starts (for the 100 Continue
+// and header-only responses), on WriteHeader, and once the handler returns:
+// net/http writes the end of the body afterwards, which a deadline left by
+// the last write would cut off after a hold longer than d.
+func writeDeadlineHandler(next http.Handler, d time.Duration) http.Handler {
+	return http.HandlerFunc(func(w http.ResponseWriter, r *http.Request) {
+		dw := &deadlineWriter{ResponseWriter: w, rc: http.NewResponseController(w), d: d}
+		dw.extend()
+		next.ServeHTTP(dw, r)
+		dw.extend()
+	})
+}
+
+type deadlineWriter struct {
+	http.ResponseWriter
+	rc *http.ResponseController
+	d  time.Duration
+}
+
+func (w *deadlineWriter) extend() {
+	// an error means the writer has no deadlines (e.g. a recorder in tests)
+	_ = w.rc.SetWriteDeadline(time.Now().Add(w.d))
+}
+
+func (w *deadlineWriter) WriteHeader(code int) {
+	w.extend()
+	w.ResponseWriter.WriteHeader(code)
+}
+
+func (w *deadlineWriter) Write(b []byte) (int, error) {
+	w.extend()
+	return w.ResponseWriter.Write(b)
+}
+
+func (w *deadlineWriter) Flush() {
+	w.extend()
+	if f, ok := w.ResponseWriter.(http.Flusher); ok {
+		f.Flush()
+	}
+}
+
+// Unwrap lets http.ResponseController reach the underlying writer.
+func (w *deadlineWriter) Unwrap() http.ResponseWriter {
+	return w.ResponseWriter
+}
@@ -0,0 +1,154 @@
+package server
+
+import (
+	"bufio"
+	"fmt"
+	"io"
+	"net"
+	"net/http"
+	"strings"
+	"testing"
+	"time"
+
+	cfg "mock-openai-server/pkg/server/config"
+)
+
+func TestNewHTTPServerDefaults(t *testing.T) {
+	mux := http.NewServeMux()
+	srv := newHTTPServer(cfg.HTTPConfig{}, mux)
+	if srv.ReadHeaderTimeout != defaultReadHeaderTimeout || srv.ReadTimeout != defaultReadTimeout || srv.IdleTimeout != defaultIdleTimeout || srv.WriteTimeout != 0 {
+		t.Fatalf("defaults: %+v", srv)
+	}
+	if srv.Handler == http.Handler(mux) {
+		t.Fatal("the per-write deadline handler is not installed")
+	}
+	srv = newHTTPServer(cfg.HTTPConfig{ReadTimeoutMs: -1, IdleTimeoutMs: 5000, WriteTimeoutMs: -1}, mux)
+	if srv.ReadTimeout != 0 || srv.IdleTimeout != 5*time.Second {
+		t.Fatalf("overrides: %+v", srv)
+	}
+	if srv.Handler != http.Handler(mux) {
+		t.Fatal("write_timeout_ms: -1 should not install the deadline handler")
+	}
+}
+
+func TestConnectionLimit(t *testing.T) {
+	ln, err := listenTCP(cfg.HTTPConfig{MaxConnections: 1}, "127.0.0.1:0")
+	if err != nil {
+		t.Fatal(err)
+	}
+	defer ln.Close()
+	accepted := make(chan net.Conn, 2)
+	go func() {
+		for {
+			c, err := ln.Accept()
+			if err != nil {
+				return
+			}
+			accepted <- c
+		}
+	}()
+	for i := 0; i < 2; i++ {
+		c, err := net.Dial("tcp", ln.Addr().String())
+		if err != nil {
+			t.Fatal(err)
+		}
+		defer c.Close()
+	}
+	first := <-accepted
+	select {
+	case <-accepted:
+		t.Fatal("a second connection was accepted past the limit")
+	case <-time.After(50 * time.Millisecond):
+	}
+	first.Close()
+	select {
+	case c := <-accepted:
+		c.Close()
+	case <-time.After(2 * time.Second):
+		t.Fatal("closing a connection did not free its slot")
+	}
+}
+
+// TestWriteDeadlineDropsStalledClient streams to a client that never reads:
+// with a per-write deadline the handler's writes fail instead of blocking.
+func TestWriteDeadlineDropsStalledClient(t *testing.T) {
+	writeErr := make(chan error, 1)
+	chunk := []byte(strings.Repeat("x", 64<<10))
+	handler := http.HandlerFunc(func(w http.ResponseWriter, r *http.Request) {
+		for {
+			if _, err := w.Write(chunk); err != nil {
+				writeErr <- err
+				return
+			}
+			w.(http.Flusher).Flush()
+		}
+	})
+	ln, err := listenTCP(cfg.HTTPConfig{}, "127.0.0.1:0")
+	if err != nil {
+		t.Fatal(err)
+	}
+	srv := newHTTPServer(cfg.HTTPConfig{WriteTimeoutMs: 100}, handler)
+	go func() { _ = srv.Serve(ln) }()
+	defer srv.Close()
+
+	c, err := net.Dial("tcp", ln.Addr().String())
+	if err != nil {
+		t.Fatal(err)
+	}
+	defer c.Close()
+	fmt.Fprintf(c, "GET / HTTP/1.1\r\nHost: x\r\n\r\n")
+	if _, err := bufio.NewReader(c).ReadString('\n'); err != nil {
+		t.Fatal(err)
+	}
+	// stop reading; the socket buffers fill and the next write must time out
+	select {
+	case <-writeErr:
+	case <-time.After(10 * time.Second):
+		t.Fatal("write to a stalled client never timed out")
+	}
+}
+
+// TestWriteDeadlineOnKeepAlive sends requests on one connection after
+// pauses longer than the write timeout: idle between requests, and inside a
+// handler that returns after holding a flushed response.
+func TestWriteDeadlineOnKeepAlive(t *testing.T) {
+	handler := http.HandlerFunc(func(w http.ResponseWriter, r *http.Request) {
+		switch r.Method {
+		case http.MethodOptions:
+			w.WriteHeader(http.StatusNoContent)
+		default:
+			_, _ = w.Write([]byte("ok"))
+			w.(http.Flusher).Flush()
+			time.Sleep(150 * time.Millisecond) // net/http ends the body after this
+		}
+	})
+	ln, err := listenTCP(cfg.HTTPConfig{}, "127.0.0.1:0")
+	if err != nil {
+		t.Fatal(err)
+	}
+	srv := newHTTPServer(cfg.HTTPConfig{WriteTimeoutMs: 50}, handler)
+	go func() { _ = srv.Serve(ln) }()
+	defer srv.Close()
+
+	c, err := net.Dial("tcp", ln.Addr().String())
+	if err != nil {
+		t.Fatal(err)
+	}
+	defer c.Close()
+	br := bufio.NewReader(c)
+	for i, method := range []string{"GET", "OPTIONS", "GET", "OPTIONS"} {
+		if i > 0 {
+			time.Sleep(150 * time.Millisecond)
+		}
+		fmt.Fprintf(c, "%s / HTTP/1.1\r\nHost: x\r\n\r\n", method)
+		_ = c.SetReadDeadline(time.Now().Add(2 * time.Second))
+		resp, err := http.ReadResponse(br, nil)
+		if err == nil {
+			_, err = io.ReadAll(resp.Body)
+			resp.Body.Close()
+		}
+		if err != nil {
+			t.Fatalf("request %d (%s): %v", i, method, err)
+		}
+	}
+}
@@ -0,0 +1,111 @@
+package server
+
+import (
+	crand "crypto/rand"
+	"encoding/binary"
+	"strconv"
+	"strings"
+	"sync"
+	"sync/atomic"
+	"time"
+)
+
+// IDs are a random per-process tag followed by a counter, in fixed-width
+// hex: they never repeat within a process (the response store relies on
+// that) and are vanishingly unlikely to repeat across restarts. Counter
+// values are reserved in blocks by per-P sources held in a sync.Pool, so
+// concurrent requests neither lock nor share a hot cache line. In worker
+// mode the tag's top byte is the worker index, so any worker can tell which
+// one owns an ID (see workers.go).
+
+// idBlock is how many counter values a source reserves at a time.
+const idBlock = 1024
+
+var (
+	idTag     = newIDTag()
+	idReserve atomic.Uint64 // end of the last reserved block
+	idSources = sync.Pool{New: func() interface{} { return new(idSource) }}
+)
+
+type idSource struct {
+	next, end uint64
+}
+
+func newIDTag() uint32 {
+	var b [4]byte
+	if _, err := crand.Read(b[:]); err != nil {
+		return uint32(time.Now().UnixNano())
+	}
+	return binary.LittleEndian.Uint32(b[:])
+}
+
+// setIDWorker puts worker in the top byte of the tag. It must run before
+// the first ID is made.
+func setIDWorker(worker int) {
+	idTag = uint32(worker)<<24 | idTag&0xffffff
+}
+
+// idWorker returns the worker index from an ID made by newID.
+func idWorker(id string) (int, bool) {
+	i := strings.IndexAny(id, "_-")
+	if i < 0 || len(id)-i-1 != 24 {
+		return 0, false
+	}
+	n, err := strconv.ParseUint(id[i+1:i+3], 16, 8)
+	if err != nil {
+		return 0, false
+	}
+	return int(n), true
+}
+
+// nextIDCounter returns a counter value no other call has returned. Values
+// are unique but only roughly ordered across goroutines.
+func nextIDCounter() uint64 {
+	s := idSources.Get().(*idSource)
+	if s.next == s.end {
+		s.end = idReserve.Add(idBlock)
+		s.next = s.end - idBlock
+	}
+	n := s.next
+	s.next++
+	idSources.Put(s)
+	return n
+}
+
+// newID returns prefix followed by 24 hex digits: the process tag and the
+// counter.
+func newID(prefix string) string {
+	var b [48]byte
+	buf := append(b[:0], prefix...)
+	buf = appendHex(buf, uint64(idTag), 8)
+	buf = appendHex(buf, nextIDCounter(), 16)
+	return string(buf)
+}
+
+// appendHex appends the low 4*digits bits of v as zero-padded hex.
+func appendHex(dst []byte, v uint64, digits int) []byte {
+	for i := digits - 1; i >= 0; i-- {
+		dst = append(dst, hexDigits[v>>(uint(i)*4)&0xf])
+	}
+	return dst
+}
+
+// Generate unique response ID
+func generateResponseID() string {
+	return newID("resp_")
+}
+
+// Generate unique message ID
+func generateMessageID() string {
+	return newID("msg_")
+}
+
+// Generate unique tool call ID
+func generateToolCallID() string {
+	return newID("ws_")
+}
+
+// Generate unique chat completion ID
+func generateChatID() string {
+	return newID("chatcmpl-")
+}
@@ -0,0 +1,62 @@
+package server
+
+import (
+	"fmt"
+	"math/rand"
+	"strings"
+	"sync"
+	"testing"
+	"time"
+)
+
+func TestIDsUnique(t *testing.T) {
+	const goroutines, perGoroutine = 16, 5000
+	ids := make([][]string, goroutines)
+	var wg sync.WaitGroup
+	for g := 0; g < goroutines; g++ {
+		wg.Add(1)
+		go func(g int) {
+			defer wg.Done()
+			for i := 0; i < perGoroutine; i++ {
+				ids[g] = append(ids[g], generateResponseID())
+			}
+		}(g)
+	}
+	wg.Wait()
+
+	seen := make(map[string]bool, goroutines*perGoroutine)
+	for _, batch := range ids {
+		for _, id := range batch {
+			if seen[id] {
+				t.Fatalf("duplicate ID %s", id)
+			}
+			seen[id] = true
+		}
+	}
+	for _, id := range []string{generateResponseID(), generateMessageID(), generateToolCallID(), generateChatID()} {
+		if i := strings.IndexAny(id, "_-"); i < 0 || len(id)-i-1 != 24 {
+			t.Errorf("malformed ID %q", id)
+		}
+	}
+}
+
+// BenchmarkNewID compares the ID generator with the fmt.Sprintf scheme it
+// replaced, from concurrent goroutines.
+func BenchmarkNewID(b *testing.B) {
+	b.Run("sprintf", func(b *testing.B) {
+		b.ReportAllocs()
+		b.RunParallel(func(pb *testing.PB) {
+			for pb.Next() {
+				_ = fmt.Sprintf("resp_%d_%d", time.Now().Unix(), rand.Intn(10000))
+			}
+		})
+	})
+	b.Run("counter", func(b *testing.B) {
+		b.ReportAllocs()
+		b.RunParallel(func(pb *testing.PB) {
+			for pb.Next() {
+				_ = generateResponseID()
+			}
+		})
+	})
+}
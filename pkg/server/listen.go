@@ -0,0 +1,191 @@
+package server
+
+import (
+	"context"
+	"fmt"
+	"log"
+	"net"
+	"os"
+	"strconv"
+	"strings"
+	"syscall"
+	"time"
+
+	cfg "mock-openai-server/pkg/server/config"
+)
+
+// ServeOptions override the config's listen settings for one run of the
+// server (the serve command's flags).
+type ServeOptions struct {
+	// Listen lists the addresses to serve on at once: host:port, :port or a
+	// bare port (0 picks a free one), or unix:/path/to.sock. Empty means
+	// server.listen, then server.port.
+	Listen []string
+	// ReadyFile receives the bound addresses, one per line, once every
+	// listener is open. Empty means server.ready_file.
+	ReadyFile string
+	// Workers runs that many processes sharing the TCP addresses through
+	// SO_REUSEPORT (see workers.go). 0 means server.workers.
+	Workers int
+
+	reusePort bool // bind TCP addresses with SO_REUSEPORT (in a worker)
+	noAdmin   bool // leave the admin listener to another worker
+}
+
+// listenAddrs resolves the addresses to serve on.
+func listenAddrs(conf *cfg.BotConfig, opts ServeOptions) []string {
+	if len(opts.Listen) > 0 {
+		return opts.Listen
+	}
+	if conf != nil && len(conf.Server.Listen) > 0 {
+		return conf.Server.Listen
+	}
+	port := "3117"
+	if conf != nil && conf.Server.Port != "" {
+		port = conf.Server.Port
+	}
+	return []string{":" + port}
+}
+
+// listen opens addr and returns the listener with the address clients
+// should use: http://host:port, with the actual port and 127.0.0.1 for an
+// unspecified host, or unix:/path. reusePort lets other processes bind the
+// same TCP address.
+func listen(hc cfg.HTTPConfig, addr string, reusePort bool) (net.Listener, string, error) {
+	if path, ok := strings.CutPrefix(addr, "unix:"); ok {
+		if err := removeStaleSocket(path); err != nil {
+			return nil, "", err
+		}
+		ln, err := net.Listen("unix", path)
+		if err != nil {
+			return nil, "", err
+		}
+		return limitListener(ln, hc.MaxConnections), "unix:" + path, nil
+	}
+	if !strings.Contains(addr, ":") {
+		addr = ":" + addr
+	}
+	var control func(string, string, syscall.RawConn) error
+	if reusePort {
+		control = reusePortControl
+	}
+	ln, err := listenTCPControl(hc, addr, control)
+	if err != nil {
+		return nil, "", err
+	}
+	tcp := ln.Addr().(*net.TCPAddr)
+	host := tcp.IP.String()
+	if tcp.IP == nil || tcp.IP.IsUnspecified() {
+		host = "127.0.0.1"
+	}
+	return ln, "http://" + net.JoinHostPort(host, strconv.Itoa(tcp.Port)), nil
+}
+
+// removeStaleSocket deletes a socket file left behind by a server that did
+// not shut down cleanly. A socket something still listens on is an error.
+func removeStaleSocket(path string) error {
+	fi, err := os.Lstat(path)
+	if err != nil || fi.Mode()&os.ModeSocket == 0 {
+		return nil
+	}
+	if c, err := net.DialTimeout("unix", path, time.Second); err == nil {
+		_ = c.Close()
+		return fmt.Errorf("%s is in use by another server", path)
+	}
+	return os.Remove(path)
+}
+
+// writeReadyFile writes addrs to path atomically, so a harness polling for
+// the file never reads it half-written.
+func writeReadyFile(path string, addrs []string) error {
+	tmp := path + ".tmp"
+	if err := os.WriteFile(tmp, []byte(strings.Join(addrs, "\n")+"\n"), 0o644); err != nil {
+		return err
+	}
+	return os.Rename(tmp, path)
+}
+
+// serve runs the server on every listen address until one fails or ctx is
+// done. The bound addresses are printed to stdout, one
+// "listening on <addr>" line each, and written to the ready file.
+func serve(ctx context.Context, opts ServeOptions) error {
+	conf := cfg.Get()
+
+	// Bounded response store (limits are read once at startup)
+	if conf != nil {
+		responseStore = newShardedStore(storeOptionsFromConfig(conf.Storage))
+		if !opts.noAdmin {
+			if err := startAdminServer(conf.Admin); err != nil {
+				return err
+			}
+		}
+	}
+	var hc cfg.HTTPConfig
+	readyFile := opts.ReadyFile
+	if conf != nil {
+		hc = conf.Server.HTTP
+		if readyFile == "" {
+			readyFile = conf.Server.ReadyFile
+		}
+	}
+
+	var lns []net.Listener
+	var addrs []string
+	for _, a := range listenAddrs(conf, opts) {
+		ln, addr, err := listen(hc, a, opts.reusePort)
+		if err != nil {
+			for _, ln := range lns {
+				_ = ln.Close()
+			}
+			return fmt.Errorf("listen on %s: %w", a, err)
+		}
+		lns = append(lns, ln)
+		addrs = append(addrs, addr)
+	}
+	srv := newHTTPServer(hc, newRouter())
+	// a Serve that starts after Close returns without closing its
+	// listener, so close them all explicitly (unlinking unix sockets)
+	stop := func() {
+		_ = srv.Close()
+		for _, ln := range lns {
+			_ = ln.Close()
+		}
+	}
+
+	// Hot reload on SIGHUP and config file changes
+	go cfg.WatchForReload(ctx)
+	logBanner(addrs)
+	for _, a := range addrs {
+		fmt.Println("listening on " + a)
+	}
+	if readyFile != "" {
+		if err := writeReadyFile(readyFile, addrs); err != nil {
+			stop()
+			return fmt.Errorf("ready file: %w", err)
+		}
+	}
+
+	errc := make(chan error, len(lns))
+	for _, ln := range lns {
+		go func(ln net.Listener) { errc <- srv.Serve(ln) }(ln)
+	}
+	select {
+	case err := <-errc:
+		stop()
+		return err
+	case <-ctx.Done():
+		stop()
+		return nil
+	}
+}
+
+func logBanner(addrs []string) {
+	log.Printf("🚀 Mock OpenAI Server with Responses API starting on %s", strings.Join(addrs, ", "))
+	log.Println("")
+	log.Println("Available APIs:")
+	log.Println("📝 Chat Completions API:\n  POST /v1/chat/completions")
+	log.Println("🔄 Responses API:\n  POST /v1/responses\n  GET /v1/responses\n  GET /v1/responses/{response_id}")
+	log.Println("🔧 Utility endpoints:\n  GET /v1/models\n  GET /health\n  GET /metrics\n  GET /help, /help/{slug}")
+	log.Println("")
+	log.Println("Features:\n✅ Streaming support for both APIs\n✅ Built-in tools (web_search, file_search)\n✅ Stateful conversations\n✅ Conversation forking\n✅ CORS enabled")
+}
@@ -0,0 +1,127 @@
+package server
+
+import (
+	"context"
+	"io"
+	"net"
+	"net/http"
+	"os"
+	"path/filepath"
+	"strings"
+	"testing"
+	"time"
+
+	cfg "mock-openai-server/pkg/server/config"
+)
+
+// startServing runs serve on addrs and returns the addresses from its ready
+// file; the server stops when the test ends.
+func startServing(tb testing.TB, addrs ...string) []string {
+	tb.Helper()
+	ready := filepath.Join(tb.TempDir(), "ready")
+	ctx, cancel := context.WithCancel(context.Background())
+	done := make(chan error, 1)
+	go func() { done <- serve(ctx, ServeOptions{Listen: addrs, ReadyFile: ready}) }()
+	tb.Cleanup(func() {
+		cancel()
+		if err := <-done; err != nil {
+			tb.Errorf("serve: %v", err)
+		}
+	})
+	return waitReadyFile(tb, ready, done)
+}
+
+// waitReadyFile polls for a ready file until the server writes it or its
+// serve call returns.
+func waitReadyFile(tb testing.TB, ready string, done <-chan error) []string {
+	tb.Helper()
+	deadline := time.Now().Add(5 * time.Second)
+	for {
+		if b, err := os.ReadFile(ready); err == nil {
+			return strings.Fields(string(b))
+		}
+		select {
+		case err := <-done:
+			tb.Fatalf("serve returned early: %v", err)
+		case <-time.After(5 * time.Millisecond):
+		}
+		if time.Now().After(deadline) {
+			tb.Fatal("no ready file")
+		}
+	}
+}
+
+// clientFor returns a client and base URL for an address from the ready
+// file.
+func clientFor(addr string) (*http.Client, string) {
+	path, ok := strings.CutPrefix(addr, "unix:")
+	if !ok {
+		return &http.Client{}, addr
+	}
+	return &http.Client{Transport: &http.Transport{
+		DialContext: func(ctx context.Context, _, _ string) (net.Conn, error) {
+			var d net.Dialer
+			return d.DialContext(ctx, "unix", path)
+		},
+	}}, "http://mock"
+}
+
+func TestServeOnSeveralListeners(t *testing.T) {
+	sock := filepath.Join(t.TempDir(), "mock.sock")
+	// a socket file left behind by a crashed server is replaced
+	stale, err := net.Listen("unix", sock)
+	if err != nil {
+		t.Fatal(err)
+	}
+	stale.(*net.UnixListener).SetUnlinkOnClose(false)
+	stale.Close()
+
+	addrs := startServing(t, "127.0.0.1:0", "unix:"+sock)
+	if len(addrs) != 2 || !strings.HasPrefix(addrs[0], "http://127.0.0.1:") || strings.HasSuffix(addrs[0], ":0") || addrs[1] != "unix:"+sock {
+		t.Fatalf("ready file lists %q", addrs)
+	}
+	for _, addr := range addrs {
+		client, base := clientFor(addr)
+		resp, err := client.Get(base + "/health")
+		if err != nil {
+			t.Fatalf("%s: %v", addr, err)
+		}
+		resp.Body.Close()
+		if resp.StatusCode != http.StatusOK {
+			t.Fatalf("%s: status %d", addr, resp.StatusCode)
+		}
+	}
+
+	// a socket something is listening on is not taken over
+	if _, _, err := listen(cfg.HTTPConfig{}, "unix:"+sock, false); err == nil {
+		t.Fatal("expected an error for a socket in use")
+	}
+}
+
+// BenchmarkChatLoopback compares the round trip of a non-streaming chat
+// completion over TCP loopback and over a Unix domain socket.
+func BenchmarkChatLoopback(b *testing.B) {
+	conf := &cfg.BotConfig{Fallback: cfg.RespondWrapper{Text: "The mock server is working correctly."}}
+	if err := conf.Compile(); err != nil {
+		b.Fatal(err)
+	}
+	prev := cfg.Get()
+	cfg.Set(conf)
+	defer cfg.Set(prev)
+	addrs := startServing(b, "127.0.0.1:0", "unix:"+filepath.Join(b.TempDir(), "mock.sock"))
+	body := `{"model":"gpt-4o","messages":[{"role":"user","content":"hi"}]}`
+
+	for i, name := range []string{"tcp", "unix"} {
+		client, base := clientFor(addrs[i])
+		b.Run(name, func(b *testing.B) {
+			for n := 0; n < b.N; n++ {
+				resp, err := client.Post(base+"/v1/chat/completions", "application/json", strings.NewReader(body))
+				if err != nil {
+					b.Fatal(err)
+				}
+				_, _ = io.Copy(io.Discard, resp.Body)
+				resp.Body.Close()
+			}
+		})
+	}
+}
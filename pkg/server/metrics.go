@@ -0,0 +1,310 @@
+package server
+
+import (
+	"bytes"
+	"net/http"
+	"sort"
+	"strconv"
+	"strings"
+	"sync"
+	"sync/atomic"
+	"time"
+
+	"github.com/gorilla/mux"
+	cfg "mock-openai-server/pkg/server/config"
+)
+
+// Metrics are kept in atomic counters updated on the request path and
+// rendered in the Prometheus text format only when /metrics is scraped.
+
+// latencyBuckets are the upper bounds, in seconds, of the latency
+// histograms.
+var latencyBuckets = [...]float64{.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60}
+
+// maxRequestSeries caps the distinct endpoint/model/status combinations.
+// The model comes from the client, so past the cap new models are counted
+// as "other".
+const maxRequestSeries = 1000
+
+type histogram struct {
+	counts [len(latencyBuckets) + 1]atomic.Uint64 // the last one is +Inf
+	sumNs  atomic.Int64
+}
+
+func (h *histogram) observe(d time.Duration) {
+	s := d.Seconds()
+	i := 0
+	for i < len(latencyBuckets) && s > latencyBuckets[i] {
+		i++
+	}
+	h.counts[i].Add(1)
+	h.sumNs.Add(int64(d))
+}
+
+type requestKey struct {
+	endpoint, model string
+	status          int
+}
+
+type requestSeries struct {
+	count, bytes atomic.Uint64
+}
+
+type metrics struct {
+	// mu guards the maps; series are only added under it, and their
+	// counters are atomic, so the request path takes just the read lock
+	mu        sync.RWMutex
+	requests  map[requestKey]*requestSeries
+	durations map[string]*histogram // by endpoint
+	ttft      map[string]*histogram // by endpoint
+}
+
+var mockMetrics = &metrics{
+	requests:  map[requestKey]*requestSeries{},
+	durations: map[string]*histogram{},
+	ttft:      map[string]*histogram{},
+}
+
+func (m *metrics) request(key requestKey) *requestSeries {
+	m.mu.RLock()
+	s, ok := m.requests[key]
+	m.mu.RUnlock()
+	if ok {
+		return s
+	}
+	m.mu.Lock()
+	defer m.mu.Unlock()
+	if len(m.requests) >= maxRequestSeries {
+		key.model = "other"
+	}
+	if s, ok := m.requests[key]; ok {
+		return s
+	}
+	s = &requestSeries{}
+	m.requests[key] = s
+	return s
+}
+
+// histogram returns the histogram of endpoint in hs (m.durations or m.ttft).
+func (m *metrics) histogram(hs map[string]*histogram, endpoint string) *histogram {
+	m.mu.RLock()
+	h, ok := hs[endpoint]
+	m.mu.RUnlock()
+	if ok {
+		return h
+	}
+	m.mu.Lock()
+	defer m.mu.Unlock()
+	if h, ok := hs[endpoint]; ok {
+		return h
+	}
+	h = &histogram{}
+	hs[endpoint] = h
+	return h
+}
+
+// metricsWriter records the status and size of a response. Handlers tag it
+// with the request's model through setRequestModel.
+type metricsWriter struct {
+	http.ResponseWriter
+	start    time.Time
+	endpoint string
+	model    string
+	status   int
+	bytes    uint64
+}
+
+func (w *metricsWriter) WriteHeader(code int) {
+	if w.status == 0 {
+		w.status = code
+	}
+	w.ResponseWriter.WriteHeader(code)
+}
+
+func (w *metricsWriter) Write(b []byte) (int, error) {
+	if w.status == 0 {
+		w.status = http.StatusOK
+	}
+	n, err := w.ResponseWriter.Write(b)
+	w.bytes += uint64(n)
+	return n, err
+}
+
+func (w *metricsWriter) Flush() {
+	if f, ok := w.ResponseWriter.(http.Flusher); ok {
+		f.Flush()
+	}
+}
+
+// Unwrap lets http.ResponseController reach the underlying writer.
+func (w *metricsWriter) Unwrap() http.ResponseWriter {
+	return w.ResponseWriter
+}
+
+var metricsWriterPool = sync.Pool{New: func() interface{} { return new(metricsWriter) }}
+
+// metricsMiddleware counts every routed request by endpoint (the route
+// template), model and status, with its duration and bytes written.
+func metricsMiddleware(next http.Handler) http.Handler {
+	return http.HandlerFunc(func(w http.ResponseWriter, r *http.Request) {
+		mw := metricsWriterPool.Get().(*metricsWriter)
+		*mw = metricsWriter{ResponseWriter: w, start: time.Now(), endpoint: routeEndpoint(r)}
+		next.ServeHTTP(mw, r)
+
+		status := mw.status
+		if status == 0 {
+			status = http.StatusOK
+		}
+		s := mockMetrics.request(requestKey{endpoint: mw.endpoint, model: mw.model, status: status})
+		s.count.Add(1)
+		s.bytes.Add(mw.bytes)
+		mockMetrics.histogram(mockMetrics.durations, mw.endpoint).observe(time.Since(mw.start))
+
+		*mw = metricsWriter{}
+		metricsWriterPool.Put(mw)
+	})
+}
+
+func routeEndpoint(r *http.Request) string {
+	if route := mux.CurrentRoute(r); route != nil {
+		if tmpl, err := route.GetPathTemplate(); err == nil {
+			return tmpl
+		}
+	}
+	return "other"
+}
+
+// setRequestModel labels the request's metrics with model.
+func setRequestModel(w http.ResponseWriter, model string) {
+	if mw, ok := w.(*metricsWriter); ok {
+		mw.model = model
+	}
+}
+
+// observeFirstToken records the time from the start of the request to the
+// first streamed token. The stream scheduler calls it after writing the
+// first frame.
+func observeFirstToken(w http.ResponseWriter) {
+	if mw, ok := w.(*metricsWriter); ok {
+		mockMetrics.histogram(mockMetrics.ttft, mw.endpoint).observe(time.Since(mw.start))
+	}
+}
+
+// handleMetrics renders all metrics in the Prometheus text format.
+func handleMetrics(w http.ResponseWriter, r *http.Request) {
+	var b bytes.Buffer
+	mockMetrics.write(&b, cfg.Get())
+	w.Header().Set("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+	_, _ = w.Write(b.Bytes())
+}
+
+func (m *metrics) write(b *bytes.Buffer, conf *cfg.BotConfig) {
+	type entry struct {
+		key requestKey
+		s   *requestSeries
+	}
+	m.mu.RLock()
+	reqs := make([]entry, 0, len(m.requests))
+	for k, s := range m.requests {
+		reqs = append(reqs, entry{k, s})
+	}
+	m.mu.RUnlock()
+	sort.Slice(reqs, func(i, j int) bool {
+		a, c := reqs[i].key, reqs[j].key
+		if a.endpoint != c.endpoint {
+			return a.endpoint < c.endpoint
+		}
+		if a.model != c.model {
+			return a.model < c.model
+		}
+		return a.status < c.status
+	})
+	requestLabels := func(k requestKey) string {
+		return labels("endpoint", k.endpoint, "model", k.model, "status", strconv.Itoa(k.status))
+	}
+
+	header(b, "mock_openai_requests_total", "counter", "Requests served, by endpoint, model and status.")
+	for _, e := range reqs {
+		sample(b, "mock_openai_requests_total", requestLabels(e.key), float64(e.s.count.Load()))
+	}
+	header(b, "mock_openai_response_bytes_total", "counter", "Response body bytes written, by endpoint, model and status.")
+	for _, e := range reqs {
+		sample(b, "mock_openai_response_bytes_total", requestLabels(e.key), float64(e.s.bytes.Load()))
+	}
+	m.writeHistograms(b, "mock_openai_request_duration_seconds", "Time to serve a request, by endpoint.", m.durations)
+	m.writeHistograms(b, "mock_openai_time_to_first_token_seconds", "Time from request to first streamed token, by endpoint.", m.ttft)
+
+	st := streamSched.Stats()
+	header(b, "mock_openai_active_streams", "gauge", "Streams currently being paced.")
+	sample(b, "mock_openai_active_streams", "", float64(st.Active))
+	header(b, "mock_openai_streams_total", "counter", "Streams finished, by outcome.")
+	sample(b, "mock_openai_streams_total", labels("outcome", "completed"), float64(st.Completed))
+	sample(b, "mock_openai_streams_total", labels("outcome", "cancelled"), float64(st.Cancelled))
+
+	header(b, "mock_openai_rule_matches_total", "counter", "Rule matches since the config was loaded.")
+	for _, rm := range conf.RuleMatches() {
+		sample(b, "mock_openai_rule_matches_total", labels("rule", rm.Rule), float64(rm.Matches))
+	}
+
+	ss := responseStore.Stats()
+	header(b, "mock_openai_store_entries", "gauge", "Responses held in the store.")
+	sample(b, "mock_openai_store_entries", "", float64(ss.Entries))
+	header(b, "mock_openai_store_bytes", "gauge", "Approximate memory held by the store.")
+	sample(b, "mock_openai_store_bytes", "", float64(ss.Bytes))
+	header(b, "mock_openai_store_evictions_total", "counter", "Responses evicted from the store, by reason.")
+	sample(b, "mock_openai_store_evictions_total", labels("reason", "capacity"), float64(ss.EvictedCapacity))
+	sample(b, "mock_openai_store_evictions_total", labels("reason", "expired"), float64(ss.EvictedExpired))
+}
+
+func (m *metrics) writeHistograms(b *bytes.Buffer, name, help string, hs map[string]*histogram) {
+	m.mu.RLock()
+	endpoints := make([]string, 0, len(hs))
+	for ep := range hs {
+		endpoints = append(endpoints, ep)
+	}
+	m.mu.RUnlock()
+	sort.Strings(endpoints)
+	header(b, name, "histogram", help)
+	for _, ep := range endpoints {
+		h := m.histogram(hs, ep)
+		var cum uint64
+		for i := range h.counts {
+			cum += h.counts[i].Load()
+			le := "+Inf"
+			if i < len(latencyBuckets) {
+				le = strconv.FormatFloat(latencyBuckets[i], 'g', -1, 64)
+			}
+			sample(b, name+"_bucket", labels("endpoint", ep, "le", le), float64(cum))
+		}
+		sample(b, name+"_sum", labels("endpoint", ep), time.Duration(h.sumNs.Load()).Seconds())
+		sample(b, name+"_count", labels("endpoint", ep), float64(cum))
+	}
+}
+
+func header(b *bytes.Buffer, name, typ, help string) {
+	b.WriteString("# HELP " + name + " " + help + "\n# TYPE " + name + " " + typ + "\n")
+}
+
+func sample(b *bytes.Buffer, name, labels string, v float64) {
+	b.WriteString(name)
+	b.WriteString(labels)
+	b.WriteByte(' ')
+	b.WriteString(strconv.FormatFloat(v, 'g', -1, 64))
+	b.WriteByte('\n')
+}
+
+var labelEscaper = strings.NewReplacer(`\`, `\\`, `"`, `\"`, "\n", `\n`)
+
+// labels renders name/value pairs as {name="value",...}.
+func labels(pairs ...string) string {
+	var b strings.Builder
+	b.WriteByte('{')
+	for i := 0; i+1 < len(pairs); i += 2 {
+		if i > 0 {
+			b.WriteByte(',')
+		}
+		b.WriteString(pairs[i] + `="` + labelEscaper.Replace(pairs[i+1]) + `"`)
+	}
+	b.WriteByte('}')
+	return b.String()
+}
@@ -0,0 +1,109 @@
+package server
+
+import (
+	"io"
+	"net/http"
+	"net/http/httptest"
+	"strings"
+	"testing"
+
+	"github.com/gorilla/mux"
+	cfg "mock-openai-server/pkg/server/config"
+)
+
+func TestMetricsEndpoint(t *testing.T) {
+	noDelay := 0
+	conf := &cfg.BotConfig{
+		Streaming: cfg.StreamingConfig{ChunkDelayMs: &noDelay},
+		Rules: []cfg.Rule{{
+			ID:      "greet",
+			Match:   cfg.Match{Contains: []string{"hello"}},
+			Respond: cfg.RespondWrapper{Text: "Hi there, friend."},
+		}},
+	}
+	if err := conf.Compile(); err != nil {
+		t.Fatal(err)
+	}
+	prev := cfg.Get()
+	cfg.Set(conf)
+	defer cfg.Set(prev)
+
+	srv := httptest.NewServer(newRouter())
+	defer srv.Close()
+	get := func(method, path, body string) string {
+		t.Helper()
+		req, _ := http.NewRequest(method, srv.URL+path, strings.NewReader(body))
+		resp, err := http.DefaultClient.Do(req)
+		if err != nil {
+			t.Fatal(err)
+		}
+		defer resp.Body.Close()
+		b, _ := io.ReadAll(resp.Body)
+		return string(b)
+	}
+	get("POST", "/v1/chat/completions", `{"model":"metrics-test","messages":[{"role":"user","content":"hello"}]}`)
+	get("POST", "/v1/chat/completions", `{"model":"metrics-test","stream":true,"messages":[{"role":"user","content":"hello"}]}`)
+	get("POST", "/v1/chat/completions", `not json`)
+	get("GET", "/v1/responses/missing", "")
+
+	out := get("GET", "/metrics", "")
+	for _, want := range []string{
+		`mock_openai_requests_total{endpoint="/v1/chat/completions",model="metrics-test",status="200"} 2`,
+		`mock_openai_requests_total{endpoint="/v1/chat/completions",model="",status="400"} 1`,
+		`mock_openai_requests_total{endpoint="/v1/responses/{response_id}",model="",status="404"} 1`,
+		`mock_openai_request_duration_seconds_bucket{endpoint="/v1/chat/completions",le="+Inf"} 3`,
+		`mock_openai_time_to_first_token_seconds_count{endpoint="/v1/chat/completions"} 1`,
+		`mock_openai_rule_matches_total{rule="greet"} 2`,
+		"# TYPE mock_openai_active_streams gauge",
+		"mock_openai_store_entries ",
+	} {
+		if !strings.Contains(out, want) {
+			t.Errorf("metrics lack %q", want)
+		}
+	}
+	if !strings.Contains(out, `mock_openai_response_bytes_total{endpoint="/v1/chat/completions",model="metrics-test",status="200"}`) {
+		t.Error("no bytes counted")
+	}
+	if got := labels("model", "a\"b\\c\nd"); got != `{model="a\"b\\c\nd"}` {
+		t.Errorf("label escaping: %s", got)
+	}
+}
+
+// discardWriter is a ResponseWriter that does nothing, so the benchmark
+// measures the middleware rather than a recorder.
+type discardWriter struct{ h http.Header }
+
+func (w *discardWriter) Header() http.Header         { return w.h }
+func (w *discardWriter) Write(b []byte) (int, error) { return len(b), nil }
+func (w *discardWriter) WriteHeader(int)             {}
+
+// BenchmarkMetricsMiddleware routes a trivial request with and without the
+// metrics middleware; the difference is its cost per request.
+func BenchmarkMetricsMiddleware(b *testing.B) {
+	body := []byte(`{"ok":true}`)
+	handler := func(w http.ResponseWriter, r *http.Request) {
+		setRequestModel(w, "gpt-4o")
+		_, _ = w.Write(body)
+	}
+	for _, instrumented := range []bool{false, true} {
+		router := mux.NewRouter()
+		if instrumented {
+			router.Use(metricsMiddleware)
+		}
+		router.HandleFunc("/v1/chat/completions", handler).Methods("POST")
+		req := httptest.NewRequest(http.MethodPost, "/v1/chat/completions", nil)
+		name := "bare"
+		if instrumented {
+			name = "instrumented"
+		}
+		b.Run(name, func(b *testing.B) {
+			b.ReportAllocs()
+			b.RunParallel(func(pb *testing.PB) {
+				w := &discardWriter{h: http.Header{}}
+				for pb.Next() {
+					router.ServeHTTP(w, req)
+				}
+			})
+		})
+	}
+}
@@ -0,0 +1,120 @@
+package server
+
+import (
+	"encoding/json"
+	"fmt"
+	"math/rand"
+	"net/http"
+	"strconv"
+	"time"
+
+	cfg "mock-openai-server/pkg/server/config"
+)
+
+// Per-request latency controls, honoured when server.allow_latency_headers
+// is set. They let one server process serve realistic-latency and
+// maximum-throughput test lanes side by side.
+const (
+	headerChunkDelayMs = "X-Mock-Chunk-Delay-Ms"
+	headerTTFTMs       = "X-Mock-TTFT-Ms"
+	headerSeed         = "X-Mock-Seed"
+)
+
+// latencyOverride holds the latency headers of one request.
+type latencyOverride struct {
+	gap, ttft *time.Duration
+	seed      *int64
+	// rng is the request's random source (see requestRand)
+	rng *rand.Rand
+}
+
+// parseLatencyOverride reads the latency headers of r. They are ignored
+// unless the config allows them; malformed values are an error.
+func parseLatencyOverride(conf *cfg.BotConfig, r *http.Request) (latencyOverride, error) {
+	var o latencyOverride
+	if conf == nil || !conf.Server.AllowLatencyHeaders {
+		return o, nil
+	}
+	ms := func(name string) (*time.Duration, error) {
+		v := r.Header.Get(name)
+		if v == "" {
+			return nil, nil
+		}
+		f, err := strconv.ParseFloat(v, 64)
+		if err != nil || f < 0 {
+			return nil, fmt.Errorf("invalid %s header %q: want a non-negative number of milliseconds", name, v)
+		}
+		d := time.Duration(f * float64(time.Millisecond))
+		return &d, nil
+	}
+	var err error
+	if o.gap, err = ms(headerChunkDelayMs); err != nil {
+		return o, err
+	}
+	if o.ttft, err = ms(headerTTFTMs); err != nil {
+		return o, err
+	}
+	if v := r.Header.Get(headerSeed); v != "" {
+		seed, err := strconv.ParseInt(v, 10, 64)
+		if err != nil {
+			return o, fmt.Errorf("invalid %s header %q: want an integer", headerSeed, v)
+		}
+		o.seed = &seed
+	}
+	return o, nil
+}
+
+// timed reports whether the request asked for specific delays, in which
+// case non-streaming responses are held for them too.
+func (o latencyOverride) timed() bool {
+	return o.gap != nil || o.ttft != nil
+}
+
+// apply returns lat adjusted by the headers.
+func (o latencyOverride) apply(lat cfg.Latency) cfg.Latency {
+	if o.gap != nil {
+		lat = lat.WithGap(*o.gap)
+	}
+	if o.ttft != nil {
+		lat = lat.WithTTFT(*o.ttft)
+	}
+	if o.rng != nil {
+		lat = lat.WithRand(o.rng)
+	}
+	return lat
+}
+
+// requestRand creates the request's random source, which drives weighted
+// choices, probability gates, built-in replies and, through apply, latency
+// jitter. The seed is X-Mock-Seed when latency headers are allowed, else the
+// body's seed, else random; it is echoed in the X-Mock-Seed response header
+// so any response can be replayed.
+func (o *latencyOverride) requestRand(w http.ResponseWriter, bodySeed *int64) *rand.Rand {
+	var seed int64
+	switch {
+	case o.seed != nil:
+		seed = *o.seed
+	case bodySeed != nil:
+		seed = *bodySeed
+	default:
+		// the ID counter is unique per request and contention-free
+		seed = int64(nextIDCounter()*0x9e3779b97f4a7c15 ^ uint64(time.Now().UnixNano()))
+	}
+	w.Header().Set(headerSeed, strconv.FormatInt(seed, 10))
+	o.rng = cfg.NewRand(seed)
+	return o.rng
+}
+
+// writeBadRequest reports a client error in the API's error shape.
+func writeBadRequest(w http.ResponseWriter, err error) {
+	w.Header().Set("Content-Type", "application/json")
+	w.WriteHeader(http.StatusBadRequest)
+	if err := json.NewEncoder(w).Encode(map[string]interface{}{
+		"error": map[string]interface{}{
+			"message": err.Error(),
+			"code":    "invalid_request_error",
+		},
+	}); err != nil {
+		http.Error(w, err.Error(), http.StatusInternalServerError)
+	}
+}
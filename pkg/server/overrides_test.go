@@ -0,0 +1,115 @@
+package server
+
+import (
+	"encoding/json"
+	"net/http"
+	"net/http/httptest"
+	"strconv"
+	"strings"
+	"testing"
+	"time"
+
+	cfg "mock-openai-server/pkg/server/config"
+)
+
+func TestLatencyHeaders(t *testing.T) {
+	slow := 10000
+	conf := &cfg.BotConfig{Streaming: cfg.StreamingConfig{ChunkDelayMs: &slow}}
+	if err := conf.Compile(); err != nil {
+		t.Fatal(err)
+	}
+	prev := cfg.Get()
+	cfg.Set(conf)
+	defer cfg.Set(prev)
+
+	post := func(handler http.HandlerFunc, path, body string, headers map[string]string) *httptest.ResponseRecorder {
+		req := httptest.NewRequest(http.MethodPost, path, strings.NewReader(body))
+		for k, v := range headers {
+			req.Header.Set(k, v)
+		}
+		rec := httptest.NewRecorder()
+		handler(rec, req)
+		return rec
+	}
+	chat := `{"model":"gpt-4o","stream":true,"messages":[{"role":"user","content":"tell me about streaming"}]}`
+	responses := `{"model":"gpt-4o","stream":true,"input":"hello there"}`
+	fast := map[string]string{headerChunkDelayMs: "0", headerTTFTMs: "0", headerSeed: "7"}
+
+	// not allowed: a malformed header is not even looked at
+	if rec := post(handleChatCompletions, "/v1/chat/completions", `{"model":"gpt-4o","messages":[]}`, map[string]string{headerSeed: "x"}); rec.Code != http.StatusOK {
+		t.Fatalf("headers not allowed: got status %d", rec.Code)
+	}
+
+	conf.Server.AllowLatencyHeaders = true
+	if rec := post(handleChatCompletions, "/v1/chat/completions", chat, map[string]string{headerChunkDelayMs: "-1"}); rec.Code != http.StatusBadRequest {
+		t.Fatalf("negative delay: got status %d", rec.Code)
+	}
+
+	start := time.Now()
+	chatRec := post(handleChatCompletions, "/v1/chat/completions", chat, fast)
+	respRec := post(handleResponsesCreate, "/v1/responses", responses, fast)
+	if elapsed := time.Since(start); elapsed > 2*time.Second {
+		t.Fatalf("zero-delay streams took %v", elapsed)
+	}
+	if !strings.Contains(chatRec.Body.String(), "[DONE]") || !strings.Contains(respRec.Body.String(), "response.done") {
+		t.Fatalf("streams did not complete:\n%s\n%s", chatRec.Body, respRec.Body)
+	}
+}
+
+func TestRequestSeed(t *testing.T) {
+	var choices []cfg.WeightedText
+	for _, s := range strings.Fields("alpha bravo charlie delta echo foxtrot golf hotel india juliet") {
+		choices = append(choices, cfg.WeightedText{Weight: 1, Text: s})
+	}
+	conf := &cfg.BotConfig{Rules: []cfg.Rule{{ID: "any", Respond: cfg.RespondWrapper{Choose: choices}}}}
+	if err := conf.Compile(); err != nil {
+		t.Fatal(err)
+	}
+	prev := cfg.Get()
+	cfg.Set(conf)
+	defer cfg.Set(prev)
+
+	post := func(body, seedHeader string) (reply, seed string) {
+		req := httptest.NewRequest(http.MethodPost, "/v1/chat/completions", strings.NewReader(body))
+		if seedHeader != "" {
+			req.Header.Set(headerSeed, seedHeader)
+		}
+		rec := httptest.NewRecorder()
+		handleChatCompletions(rec, req)
+		var resp ChatCompletionResponse
+		if err := json.Unmarshal(rec.Body.Bytes(), &resp); err != nil {
+			t.Fatalf("%v: %s", err, rec.Body)
+		}
+		return resp.Choices[0].Message.Content, rec.Header().Get(headerSeed)
+	}
+	// every request with a seed gets the same reply, and seeds differ
+	seen := map[string]bool{}
+	for seed := 0; seed < 8; seed++ {
+		body := `{"model":"gpt-4o","seed":` + strconv.Itoa(seed) + `,"messages":[{"role":"user","content":"hi"}]}`
+		first, echoed := post(body, "")
+		if echoed != strconv.Itoa(seed) {
+			t.Fatalf("seed %d echoed as %q", seed, echoed)
+		}
+		for i := 0; i < 4; i++ {
+			if again, _ := post(body, ""); again != first {
+				t.Fatalf("seed %d: got %q, then %q", seed, first, again)
+			}
+		}
+		seen[first] = true
+	}
+	if len(seen) < 2 {
+		t.Fatalf("8 seeds all chose %v", seen)
+	}
+
+	// an unseeded reply can be replayed from the echoed seed
+	reply, seed := post(`{"model":"gpt-4o","messages":[{"role":"user","content":"hi"}]}`, "")
+	if again, _ := post(`{"model":"gpt-4o","seed":`+seed+`,"messages":[{"role":"user","content":"hi"}]}`, ""); again != reply {
+		t.Fatalf("replaying seed %s gave %q, want %q", seed, again, reply)
+	}
+
+	// the header wins over the body when latency headers are allowed
+	conf.Server.AllowLatencyHeaders = true
+	if _, echoed := post(`{"model":"gpt-4o","seed":7,"messages":[]}`, "99"); echoed != "99" {
+		t.Fatalf("header seed not used: %q", echoed)
+	}
+}
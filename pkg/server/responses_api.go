@@ -2,6 +2,7 @@ package server
 
 import (
 	"encoding/json"
+	"errors"
 	"fmt"
 	"log"
 	"math/rand"
@@ -25,6 +26,8 @@ type ResponsesCreateRequest struct {
 	Stream             *bool                  `json:"stream,omitempty"`
 	PreviousResponseID string                 `json:"previous_response_id,omitempty"`
 	ResponseFormat     map[string]interface{} `json:"response_format,omitempty"`
+	// Seed makes the reply reproducible (see requestRand).
+	Seed *int64 `json:"seed,omitempty"`
 }
 
 type Tool struct {
@@ -73,27 +76,12 @@ type StreamEvent struct {
 	Error interface{} `json:"error,omitempty"`
 }
 
-// In-memory storage for responses
-var responseStore = make(map[string]*ResponsesResponse)
-var conversationHistory = make(map[string][]string)
-
-// Generate unique response ID
-func generateResponseID() string {
-	return fmt.Sprintf("resp_%d_%d", time.Now().Unix(), rand.Intn(10000))
-}
-
-// Generate unique message ID
-func generateMessageID() string {
-	return fmt.Sprintf("msg_%d_%d", time.Now().Unix(), rand.Intn(10000))
-}
-
-// Generate unique tool call ID
-func generateToolCallID() string {
-	return fmt.Sprintf("ws_%d_%d", time.Now().Unix(), rand.Intn(10000))
-}
+// In-memory storage for responses and their conversation history
+// (reconfigured from the storage config section when the server starts)
+var responseStore ResponseStore = newShardedStore(storeOptions{})
 
 // Mock response generation based on input
-func generateMockResponse(req *ResponsesCreateRequest) string {
+func generateMockResponse(req *ResponsesCreateRequest, rng *rand.Rand) string {
 	inputStr := ""
 
 	// Handle different input types
@@ -123,7 +111,7 @@ func generateMockResponse(req *ResponsesCreateRequest) string {
 			"Why don't skeletons fight each other? They don't have the guts!",
 			"What do you call a fake noodle? An impasta!",
 		}
-		return jokes[rand.Intn(len(jokes))]
+		return jokes[rng.Intn(len(jokes))]
 	}
 
 	if strings.Contains(inputLower, "weather") {
@@ -218,46 +206,60 @@ func generateFileSearchResults() []OutputObject {
 
 // Handle responses creation
 func handleResponsesCreate(w http.ResponseWriter, r *http.Request) {
+	// one config snapshot for the whole request, even across a reload
+	conf := cfg.Get()
+	st := newServerTiming(conf, time.Now())
+
 	var req ResponsesCreateRequest
 	if err := json.NewDecoder(r.Body).Decode(&req); err != nil {
 		http.Error(w, "Invalid JSON", http.StatusBadRequest)
 		return
 	}
+	st.mark(phaseDecode)
+	setRequestModel(w, req.Model)
+	// In worker mode a conversation stays with the worker that holds it
+	if p := ownerProxy(r, req.PreviousResponseID); p != nil {
+		forwardCreate(w, r, p, &req)
+		return
+	}
+	override, err := parseLatencyOverride(conf, r)
+	if err != nil {
+		writeBadRequest(w, err)
+		return
+	}
+	rng := override.requestRand(w, req.Seed)
 
 	// Check if streaming is requested
 	if req.Stream != nil && *req.Stream {
-		handleStreamingResponse(w, r, &req)
+		handleStreamingResponse(w, r, conf, &req, override, st)
 		return
 	}
 
 	// Resolve via configuration first
-	resolved, errOut := resolveResponsesContent(&req)
+	resolved, errOut := resolveResponsesContent(conf, &req, st, rng)
 	if errOut != nil {
-		w.Header().Set("Content-Type", "application/json")
-		w.WriteHeader(errOut.Status)
-		if err := json.NewEncoder(w).Encode(map[string]interface{}{
+		st.writeJSON(w, errOut.Status, map[string]interface{}{
 			"error": map[string]interface{}{
 				"message": errOut.Message,
 				"code":    errOut.Code,
 			},
-		}); err != nil {
-			http.Error(w, err.Error(), http.StatusInternalServerError)
-		}
+		})
 		return
 	}
 
 	// Generate response ID
 	responseID := generateResponseID()
 
-	// Build conversation history
-	var fullContext string
+	// Look up the turn this request continues (or forks) from; the full
+	// transcript is never materialised here, only its running token count.
+	var parentTurn *historyNode
 	if req.PreviousResponseID != "" {
-		if history, exists := conversationHistory[req.PreviousResponseID]; exists {
-			fullContext = strings.Join(history, "\n") + "\n"
+		if turn, exists := responseStore.History(req.PreviousResponseID); exists {
+			parentTurn = turn
 		}
 	}
 
-	// Add current input to context
+	// Extract the current input
 	inputStr := ""
 	switch v := req.Input.(type) {
 	case string:
@@ -273,7 +275,7 @@ func handleResponsesCreate(w http.ResponseWriter, r *http.Request) {
 			}
 		}
 	}
-	fullContext += inputStr
+	st.mark(phaseInput)
 
 	// Generate output (config-aware or legacy)
 	var output []OutputObject
@@ -305,7 +307,7 @@ func handleResponsesCreate(w http.ResponseWriter, r *http.Request) {
 		} else if hasFileSearch {
 			output = generateFileSearchResults()
 		} else {
-			responseText := generateMockResponse(&req)
+			responseText := generateMockResponse(&req, rng)
 			messageID := generateMessageID()
 			output = []OutputObject{{
 				ID:      messageID,
@@ -314,39 +316,50 @@ func handleResponsesCreate(w http.ResponseWriter, r *http.Request) {
 			}}
 		}
 	}
+	st.mark(phaseRender)
 
-	// Create response
+	// Create response; the prompt is the whole conversation so far
+	lastText := output[len(output)-1].Content[0].Text
+	tokens := tokenCounterFor(conf, req.Model)
+	inputTokens := tokens.count(inputStr)
+	usage := newUsage(parentTurn.Tokens()+inputTokens, tokens.count(lastText))
+	st.mark(phaseUsage)
 	response := &ResponsesResponse{
 		ID:      responseID,
 		Object:  "response",
 		Created: time.Now().Unix(),
 		Model:   req.Model,
 		Output:  output,
-		Usage: Usage{
-			PromptTokens:     len(strings.Fields(fullContext)),
-			CompletionTokens: 50,
-			TotalTokens:      len(strings.Fields(fullContext)) + 50,
-		},
+		Usage:   usage,
 	}
 
-	// Store response and update conversation history
-	responseStore[responseID] = response
-	conversationHistory[responseID] = append(conversationHistory[req.PreviousResponseID], inputStr, response.Output[len(response.Output)-1].Content[0].Text)
-
-	w.Header().Set("Content-Type", "application/json")
-	if err := json.NewEncoder(w).Encode(response); err != nil {
-		http.Error(w, err.Error(), http.StatusInternalServerError)
+	if conf.HasLatencyProfile(req.Model) || override.timed() {
+		latency := conf.LatencyFor(req.Model, nil)
+		if resolved != nil {
+			latency = resolved.Pacing.Latency
+		}
+		if !waitLatency(r.Context(), override.apply(latency), usage.CompletionTokens) {
+			// the client never sees the ID, so don't store it
+			return
+		}
+		st.mark(phaseWait)
 	}
+
+	// Store response and link its turn onto the conversation tree
+	responseStore.Put(response, newHistoryNode(parentTurn, inputStr, lastText, inputTokens+usage.CompletionTokens))
+	st.mark(phaseStore)
+
+	st.writeJSON(w, http.StatusOK, response)
 }
 
 // Handle streaming responses
-func handleStreamingResponse(w http.ResponseWriter, r *http.Request, req *ResponsesCreateRequest) {
+func handleStreamingResponse(w http.ResponseWriter, r *http.Request, conf *cfg.BotConfig, req *ResponsesCreateRequest, override latencyOverride, st *serverTiming) {
 	w.Header().Set("Content-Type", "text/event-stream")
 	w.Header().Set("Cache-Control", "no-cache")
 	w.Header().Set("Connection", "keep-alive")
 	origin := "*"
-	if cfg.Current != nil && cfg.Current.Server.CORS != "" {
-		origin = cfg.Current.Server.CORS
+	if conf != nil && conf.Server.CORS != "" {
+		origin = conf.Server.CORS
 	}
 	w.Header().Set("Access-Control-Allow-Origin", origin)
 
@@ -357,45 +370,37 @@ func handleStreamingResponse(w http.ResponseWriter, r *http.Request, req *Respon
 	}
 
 	// Resolve via configuration (fallback to legacy)
-	resolved, _ := resolveResponsesContent(req)
+	resolved, _ := resolveResponsesContent(conf, req, st, override.rng)
 	responseText := ""
 	if resolved != nil && resolved.Text != "" {
 		responseText = resolved.Text
 	} else {
-		responseText = generateMockResponse(req)
-	}
-	words := strings.Fields(responseText)
-
-	// Stream response word by word
-	// Determine delay
-	delayMs := 200
-	if cfg.Current != nil && cfg.Current.Streaming.ChunkDelayMs != nil {
-		delayMs = *cfg.Current.Streaming.ChunkDelayMs
-	}
-	for i, word := range words {
-		event := StreamEvent{
-			Type:  "response.output_text.delta",
-			Delta: word,
-		}
-
-		if i < len(words)-1 {
-			event.Delta += " "
-		}
-
-		eventData, _ := json.Marshal(event)
-		fmt.Fprintf(w, "data: %s\n\n", eventData)
-		flusher.Flush()
-
-		// Add delay for demonstration (configurable)
-		time.Sleep(time.Duration(delayMs) * time.Millisecond)
+		responseText = generateMockResponse(req, override.rng)
 	}
+	pacing := conf.PacingFor(req.Model, nil)
+	if resolved != nil {
+		pacing = resolved.Pacing
+	}
+	chunks := splitChunks(responseText, pacing.Chunking, conf, req.Model)
+	st.mark(phaseRender)
+	st.setHeader(w)
+
+	// Stream the response chunk by chunk, paced like the chat stream
+	enc := newResponsesDeltaEncoder()
+	streamSched.run(r.Context(), streamJob{
+		w:       w,
+		flusher: flusher,
+		n:       len(chunks),
+		batch:   pacing.Chunking.Coalesce,
+		delay:   streamDelay(conf, req.Model, override, pacing, responseText, chunks),
+		frame:   func(i int) []byte { return enc.frame(chunks[i]) },
+		first:   func() { observeFirstToken(w) },
+	})
 
 	// Send completion event
-	completionEvent := StreamEvent{
-		Type: "response.done",
-	}
-	eventData, _ := json.Marshal(completionEvent)
-	fmt.Fprintf(w, "data: %s\n\n", eventData)
+	writeSSEJSON(w, StreamEvent{Type: "response.done"})
+	st.mark(phaseStream)
+	st.writeComment(w)
 	flusher.Flush()
 }
 
@@ -403,8 +408,12 @@ func handleStreamingResponse(w http.ResponseWriter, r *http.Request, req *Respon
 func handleResponsesRetrieve(w http.ResponseWriter, r *http.Request) {
 	vars := mux.Vars(r)
 	responseID := vars["response_id"]
+	if p := ownerProxy(r, responseID); p != nil {
+		p.ServeHTTP(w, r)
+		return
+	}
 
-	response, exists := responseStore[responseID]
+	response, exists := responseStore.Get(responseID)
 	if !exists {
 		http.Error(w, "Response not found", http.StatusNotFound)
 		return
@@ -416,31 +425,64 @@ func handleResponsesRetrieve(w http.ResponseWriter, r *http.Request) {
 	}
 }
 
-// Handle responses listing
+// Page sizes for GET /v1/responses.
+const (
+	defaultListLimit = 20
+	maxListLimit     = 100
+)
+
+// Handle responses listing: a page in insertion order, newest first unless
+// order=asc, continued with the after (or before) cursor.
 func handleResponsesList(w http.ResponseWriter, r *http.Request) {
-	// Parse query parameters
-	limitStr := r.URL.Query().Get("limit")
-	limit := 20 // default
-	if limitStr != "" {
-		if l, err := strconv.Atoi(limitStr); err == nil {
-			limit = l
+	q := r.URL.Query()
+	opts := ListOptions{Limit: defaultListLimit, After: q.Get("after"), Before: q.Get("before"), Desc: true}
+	if s := q.Get("limit"); s != "" {
+		l, err := strconv.Atoi(s)
+		if err != nil || l < 1 || l > maxListLimit {
+			writeBadRequest(w, fmt.Errorf("limit must be an integer from 1 to %d", maxListLimit))
+			return
 		}
+		opts.Limit = l
+	}
+	switch q.Get("order") {
+	case "", "desc":
+	case "asc":
+		opts.Desc = false
+	default:
+		writeBadRequest(w, errors.New(`order must be "asc" or "desc"`))
+		return
 	}
 
-	// Get all responses (in a real implementation, you'd paginate properly)
-	var responses []*ResponsesResponse
-	count := 0
-	for _, response := range responseStore {
-		if count >= limit {
-			break
-		}
-		responses = append(responses, response)
-		count++
+	var page ListPage
+	var err error
+	switch {
+	case workerPeers == nil:
+		page, err = responseStore.List(opts)
+	case r.Header.Get(headerForwarded) != "":
+		// another worker merging a listing asks for this worker's part
+		listWorkerPart(w, r, opts)
+		return
+	default:
+		page, err = listWorkers(r.Context(), opts)
+	}
+	if errors.Is(err, errWorkerUnreachable) {
+		http.Error(w, err.Error(), http.StatusBadGateway)
+		return
+	}
+	if err != nil {
+		writeBadRequest(w, err)
+		return
+	}
+	var firstID, lastID interface{}
+	if n := len(page.Data); n > 0 {
+		firstID, lastID = page.Data[0].ID, page.Data[n-1].ID
 	}
-
 	result := map[string]interface{}{
-		"object": "list",
-		"data":   responses,
+		"object":   "list",
+		"data":     page.Data,
+		"first_id": firstID,
+		"last_id":  lastID,
+		"has_more": page.HasMore,
 	}
 
 	w.Header().Set("Content-Type", "application/json")
@@ -467,10 +509,11 @@ type ResolvedResponse struct {
 	Text        string
 	PrefixTools []OutputObject
 	Annotations []Annotation
+	Pacing      cfg.Pacing
 }
 
-func resolveResponsesContent(req *ResponsesCreateRequest) (*ResolvedResponse, *cfg.ErrorOut) {
-	if cfg.Current == nil {
+func resolveResponsesContent(conf *cfg.BotConfig, req *ResponsesCreateRequest, st *serverTiming, rng *rand.Rand) (*ResolvedResponse, *cfg.ErrorOut) {
+	if conf == nil {
 		return nil, nil
 	}
 	// Build context strings
@@ -495,14 +538,20 @@ func resolveResponsesContent(req *ResponsesCreateRequest) (*ResolvedResponse, *c
 	}
 	lastUser := strings.TrimSpace(inputStr)
 	full := lastUser
+	st.mark(phaseInput)
 
-	mr := cfg.EvaluateRules("responses", req.Model, "", lastUser, full)
+	mr := conf.EvaluateRules("responses", req.Model, "", lastUser, full, rng)
+	st.mark(phaseRules)
 	if mr == nil {
 		// Fallback
-		if cfg.Current.Fallback.Text != "" || cfg.Current.Fallback.Message.Text != "" {
-			txt := cfg.PickText(cfg.Current.Fallback)
-			ctx := cfg.BuildTemplateContext(req.Model, lastUser, full)
-			return &ResolvedResponse{Text: cfg.RenderTemplate(txt, ctx)}, nil
+		if conf.Fallback.Text != "" || conf.Fallback.Message.Text != "" {
+			tmpl := cfg.PickTemplate(conf.Fallback, rng)
+			res := &ResolvedResponse{
+				Text:   tmpl.Render(conf.NewTemplateContext(req.Model, lastUser, full)),
+				Pacing: conf.PacingFor(req.Model, nil),
+			}
+			st.mark(phaseRender)
+			return res, nil
 		}
 		return nil, nil
 	}
@@ -511,22 +560,23 @@ func resolveResponsesContent(req *ResponsesCreateRequest) (*ResolvedResponse, *c
 		return nil, mr.Rule.Respond.Error
 	}
 	// Build response
-	res := &ResolvedResponse{}
-	ctx := cfg.BuildTemplateContext(req.Model, lastUser, full)
+	res := &ResolvedResponse{Pacing: conf.PacingFor(req.Model, mr)}
+	ctx := conf.NewTemplateContext(req.Model, lastUser, full)
+	st.mark(phaseRender)
 
 	// Build tools from registry
 	accumulatedText := ""
 	var accumulatedAnn []Annotation
 	for _, name := range mr.Rule.Respond.UseTools {
-		if !cfg.IsToolEnabled(name) {
+		if !conf.IsToolEnabled(name) {
 			continue
 		}
-		if def, ok := cfg.GetToolDef(name); ok {
+		if def, ok := conf.GetToolDef(name); ok {
 			// tool call
 			res.PrefixTools = append(res.PrefixTools, OutputObject{ID: generateToolCallID(), Type: def.CallType, Status: def.Status})
 			// default message from tool
 			if def.Message != nil {
-				txt := cfg.RenderTemplate(def.Message.Text, ctx)
+				txt := def.Message.Template().Render(ctx)
 				if txt != "" {
 					if accumulatedText != "" {
 						accumulatedText += "\n"
@@ -544,13 +594,13 @@ func resolveResponsesContent(req *ResponsesCreateRequest) (*ResolvedResponse, *c
 	for _, t := range mr.Rule.Respond.Tools {
 		res.PrefixTools = append(res.PrefixTools, OutputObject{ID: generateToolCallID(), Type: t.Type, Status: t.Status})
 	}
+	st.mark(phaseTools)
 
 	// Message text precedence: rule.message.text > rule.text/choose > accumulated tool text
-	ruleChosen := cfg.PickText(mr.Rule.Respond)
 	if mr.Rule.Respond.Message.Text != "" {
-		res.Text = cfg.RenderTemplate(mr.Rule.Respond.Message.Text, ctx)
-	} else if ruleChosen != "" {
-		res.Text = cfg.RenderTemplate(ruleChosen, ctx)
+		res.Text = mr.Rule.Respond.Message.Template().Render(ctx)
+	} else if ruleChosen := cfg.PickTemplate(mr.Rule.Respond, rng); !ruleChosen.IsEmpty() {
+		res.Text = ruleChosen.Render(ctx)
 	} else {
 		res.Text = accumulatedText
 	}
@@ -562,5 +612,6 @@ func resolveResponsesContent(req *ResponsesCreateRequest) (*ResolvedResponse, *c
 			res.Annotations = append(res.Annotations, Annotation{Index: nil, Title: a.Title, Type: a.Type, URL: a.URL})
 		}
 	}
+	st.mark(phaseRender)
 	return res, nil
 }
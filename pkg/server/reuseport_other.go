@@ -0,0 +1,14 @@
+//go:build !(linux || darwin || dragonfly || freebsd || netbsd || openbsd)
+
+package server
+
+import (
+	"errors"
+	"syscall"
+)
+
+const reusePortSupported = false
+
+func reusePortControl(_, _ string, _ syscall.RawConn) error {
+	return errors.New("SO_REUSEPORT is not supported on this platform")
+}
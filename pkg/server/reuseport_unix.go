@@ -0,0 +1,23 @@
+//go:build linux || darwin || dragonfly || freebsd || netbsd || openbsd
+
+package server
+
+import (
+	"syscall"
+
+	"golang.org/x/sys/unix"
+)
+
+const reusePortSupported = true
+
+// reusePortControl sets SO_REUSEPORT, so every worker can bind the same
+// address and the kernel spreads incoming connections across them.
+func reusePortControl(_, _ string, c syscall.RawConn) error {
+	var serr error
+	if err := c.Control(func(fd uintptr) {
+		serr = unix.SetsockoptInt(int(fd), unix.SOL_SOCKET, unix.SO_REUSEPORT, 1)
+	}); err != nil {
+		return err
+	}
+	return serr
+}
@@ -0,0 +1,557 @@
+package server
+
+import (
+	"context"
+	"io"
+	"net/http"
+	"runtime"
+	"sync"
+	"sync/atomic"
+	"time"
+)
+
+// streamJob is one SSE stream handed to the scheduler. The scheduler owns w
+// between run being called and returning, and emits frame(0) .. frame(n-1)
+// in groups of batch frames per flush, waiting delay(i) before the group
+// starting at frame i (measured from the previous group, or from the start
+// for frame 0). delay is called on the scheduler goroutine; frame and first
+// on whichever goroutine writes the stream, never two at once.
+type streamJob struct {
+	w       io.Writer
+	flusher http.Flusher
+	n       int
+	batch   int // frames per flush; 0 means 1
+	frame   func(i int) []byte
+	delay   func(i int) time.Duration
+	// first, if set, is called once the first frame has been written
+	first func()
+}
+
+// activeStream is a streamJob in flight. It is linked intrusively into the
+// timer wheel.
+type activeStream struct {
+	job  streamJob
+	i    int           // frames released so far (loop-owned)
+	due  time.Duration // exact deadline of frame i, relative to the shard epoch
+	done chan struct{} // closed once the loop has let go of the stream
+
+	// released publishes i to whoever writes the stream; ready wakes the
+	// handler and coalesces
+	released atomic.Int64
+	ready    chan struct{}
+	// written is owned by whoever writes the stream: the shard's writer,
+	// or the handler once own is set
+	written int
+
+	// guarded by the shard's wmu
+	queued    bool // waiting in the writer's queue
+	busy      bool // being written by a shard writer
+	detached  bool // blocked the writer: later frames go to the handler
+	own       bool // the handler writes the stream from now on
+	ended     bool // every frame has been written
+	failed    bool // a write failed; the client is gone
+	abandoned bool // the handler has given up on the stream
+	quiet     chan struct{}
+
+	expires    uint64 // wheel tick frame i fires on
+	prev, next *activeStream
+	slot       **activeStream // wheel slot holding the stream, nil if none
+	retired    bool
+}
+
+// writeReleased writes every released frame not yet written and flushes
+// once.
+func (st *activeStream) writeReleased() error {
+	due := int(st.released.Load())
+	start := st.written
+	for ; st.written < due; st.written++ {
+		if _, err := st.job.w.Write(st.job.frame(st.written)); err != nil {
+			return err
+		}
+	}
+	if start == 0 && st.written > 0 && st.job.first != nil {
+		st.job.first()
+	}
+	if st.job.flusher != nil {
+		st.job.flusher.Flush()
+	}
+	return nil
+}
+
+// wakeHandler wakes st's handler. It never blocks: a wakeup already pending
+// covers the new state too.
+func (st *activeStream) wakeHandler() {
+	select {
+	case st.ready <- struct{}{}:
+	default:
+	}
+}
+
+// StreamStats counts streams handled by the scheduler. Cancelled streams
+// ended early because the client went away; FramesSkipped is the work that
+// saved.
+type StreamStats struct {
+	Active        int64  `json:"active"`
+	Started       uint64 `json:"started"`
+	Completed     uint64 `json:"completed"`
+	Cancelled     uint64 `json:"cancelled"`
+	FramesSkipped uint64 `json:"frames_skipped"`
+}
+
+// stallBudget is how long a shard's writer may spend on one stream before
+// the stream is taken off it: the longest a client that stops reading can
+// hold up the others on its shard.
+const stallBudget = 2 * time.Millisecond
+
+// streamScheduler drives token emission for every active stream from a few
+// timer wheels instead of one sleeping goroutine (and runtime timer) per
+// stream. Handlers block while their stream is in flight. Deadlines are
+// accumulated from the stream start, so late ticks do not push later tokens
+// back, and each stream is flushed at most once per tick however many of
+// its frames became due.
+//
+// Streams are spread round-robin over one shard per CPU. Each shard's loop
+// releases due frames and a writer goroutine writes them, a tick's worth
+// at a time. A stream whose write keeps the writer for stallBudget (a
+// client that stopped reading) is handed to its own handler goroutine and a
+// fresh writer carries on with the rest, so it delays the others only once.
+type streamScheduler struct {
+	shards []*schedulerShard
+	next   atomic.Uint32
+
+	started, completed, cancelled, skipped atomic.Uint64
+}
+
+func newStreamScheduler(shards int, tick time.Duration) *streamScheduler {
+	if shards < 1 {
+		shards = 1
+	}
+	s := &streamScheduler{shards: make([]*schedulerShard, shards)}
+	for i := range s.shards {
+		s.shards[i] = &schedulerShard{sched: s, tick: tick, wake: make(chan struct{}, 1), writerWake: make(chan struct{}, 1)}
+	}
+	return s
+}
+
+var streamSched = newStreamScheduler(runtime.GOMAXPROCS(0), time.Millisecond)
+
+// run emits job's frames and returns once the last one has been written, a
+// write fails, or ctx is done. Cancellation is prompt: the stream is taken
+// off the wheel rather than waiting for its next frame to fall due, though
+// a write already under way is waited for. Once run returns the scheduler
+// no longer touches job.
+func (s *streamScheduler) run(ctx context.Context, job streamJob) {
+	if job.n <= 0 {
+		return
+	}
+	s.started.Add(1)
+	sh := s.shards[s.next.Add(1)%uint32(len(s.shards))]
+	st := &activeStream{job: job, done: make(chan struct{}), ready: make(chan struct{}, 1)}
+	sh.submit(st)
+	for {
+		select {
+		case <-st.ready:
+		case <-ctx.Done():
+			s.abandon(sh, st)
+			return
+		}
+		sh.wmu.Lock()
+		own, ended, failed := st.own, st.ended, st.failed
+		sh.wmu.Unlock()
+		if failed {
+			s.abandon(sh, st)
+			return
+		}
+		if own {
+			if err := st.writeReleased(); err != nil {
+				// the client is gone
+				s.abandon(sh, st)
+				return
+			}
+			ended = st.written == job.n
+		}
+		if ended {
+			break
+		}
+	}
+	// the loop retired the stream when it released the last frame
+	<-st.done
+	s.completed.Add(1)
+}
+
+// abandon takes a stream that will not finish off its shard, waiting for a
+// write to it that is under way.
+func (s *streamScheduler) abandon(sh *schedulerShard, st *activeStream) {
+	sh.cancel(st)
+	<-st.done
+	sh.wmu.Lock()
+	st.abandoned = true
+	if st.busy {
+		st.quiet = make(chan struct{})
+	}
+	quiet := st.quiet
+	sh.wmu.Unlock()
+	if quiet != nil {
+		<-quiet
+	}
+	s.cancelled.Add(1)
+	s.skipped.Add(uint64(st.job.n - st.written))
+}
+
+// Stats returns the scheduler's stream counters.
+func (s *streamScheduler) Stats() StreamStats {
+	st := StreamStats{
+		Started:       s.started.Load(),
+		Completed:     s.completed.Load(),
+		Cancelled:     s.cancelled.Load(),
+		FramesSkipped: s.skipped.Load(),
+	}
+	st.Active = int64(st.Started - st.Completed - st.Cancelled)
+	return st
+}
+
+type schedulerShard struct {
+	sched *streamScheduler
+	tick  time.Duration
+	once  sync.Once
+	epoch time.Time
+
+	mu        sync.Mutex
+	pending   []*activeStream
+	cancelled []*activeStream
+	wake      chan struct{}
+
+	// the writer's queue, guarded by wmu. writing is the stream a writer is
+	// in and wrote counts the streams written, so the loop can tell a writer
+	// that is stuck; gen is bumped when one is replaced.
+	wmu        sync.Mutex
+	queue      []*activeStream
+	head       int
+	writing    *activeStream
+	wrote      uint64
+	gen        int
+	writerWake chan struct{}
+
+	// owned by the loop goroutine
+	now      time.Duration // time of the current wakeup, relative to epoch
+	wheel    timerWheel
+	released []*activeStream // streams with frames released this wakeup
+	// the writer as last seen: on stuckOn, having written stuckAt streams,
+	// since stuckSince
+	stuckOn    *activeStream
+	stuckAt    uint64
+	stuckSince time.Duration
+}
+
+func (s *schedulerShard) submit(st *activeStream) {
+	s.once.Do(func() {
+		s.epoch = time.Now()
+		go s.loop()
+		go s.write(0)
+	})
+	s.mu.Lock()
+	s.pending = append(s.pending, st)
+	s.mu.Unlock()
+	s.signal()
+}
+
+// cancel asks the loop to drop st; st.done is closed once it has.
+func (s *schedulerShard) cancel(st *activeStream) {
+	s.mu.Lock()
+	s.cancelled = append(s.cancelled, st)
+	s.mu.Unlock()
+	s.signal()
+}
+
+func (s *schedulerShard) signal() {
+	select {
+	case s.wake <- struct{}{}:
+	default:
+	}
+}
+
+// loop ticks while any stream is active or being written and sleeps on
+// wake otherwise.
+func (s *schedulerShard) loop() {
+	ticker := time.NewTicker(s.tick)
+	ticker.Stop()
+	var tickC <-chan time.Time
+	var admit, drop []*activeStream
+	for {
+		select {
+		case <-s.wake:
+		case <-tickC:
+		}
+		now := time.Since(s.epoch)
+		s.now = now
+		target := uint64(now / s.tick)
+		if s.wheel.n == 0 {
+			s.wheel.base = target
+		}
+
+		s.mu.Lock()
+		admit, s.pending = s.pending, admit[:0]
+		drop, s.cancelled = s.cancelled, drop[:0]
+		s.mu.Unlock()
+		for _, st := range admit {
+			st.due = now + st.job.delay(0)
+			st.expires = uint64((st.due + s.tick - 1) / s.tick)
+			if st.due <= now {
+				st.expires = target
+			}
+			s.wheel.add(st)
+		}
+		for i := range admit {
+			admit[i] = nil
+		}
+		// streams whose handler gave up; some may have just finished
+		for i, st := range drop {
+			if !st.retired {
+				s.wheel.remove(st)
+				s.retire(st)
+			}
+			drop[i] = nil
+		}
+
+		for s.wheel.base <= target {
+			s.wheel.advance(s.fire)
+		}
+		writing := s.dispatch()
+
+		switch {
+		case s.wheel.n == 0 && !writing && tickC != nil:
+			ticker.Stop()
+			tickC = nil
+		case (s.wheel.n > 0 || writing) && tickC == nil:
+			ticker.Reset(s.tick)
+			tickC = ticker.C
+		}
+	}
+}
+
+// fire releases every frame of st that is due by now, then re-arms st for
+// its next frame or retires it.
+func (s *schedulerShard) fire(st *activeStream, _ uint64) {
+	for {
+		st.i = min(st.i+max(st.job.batch, 1), st.job.n)
+		if st.i >= st.job.n {
+			s.release(st)
+			s.retire(st)
+			return
+		}
+		st.due += st.job.delay(st.i)
+		if st.due <= s.now {
+			// already due: coalesce into this tick's flush
+			continue
+		}
+		// round up: a frame is never sent before its deadline, and since
+		// due > now this is always a later tick
+		st.expires = uint64((st.due + s.tick - 1) / s.tick)
+		s.wheel.add(st)
+		s.release(st)
+		return
+	}
+}
+
+// release publishes that frames up to st.i may be written; dispatch hands
+// them on at the end of the wakeup.
+func (s *schedulerShard) release(st *activeStream) {
+	st.released.Store(int64(st.i))
+	s.released = append(s.released, st)
+}
+
+// retire lets go of st; the loop does not touch it again.
+func (s *schedulerShard) retire(st *activeStream) {
+	st.retired = true
+	close(st.done)
+}
+
+// dispatch queues the streams released this wakeup for the writer, or
+// wakes the handlers of detached ones, and replaces a writer that has been
+// stuck on one stream for stallBudget. It reports whether the writer has
+// work left.
+func (s *schedulerShard) dispatch() bool {
+	s.wmu.Lock()
+	for i, st := range s.released {
+		switch {
+		case st.detached:
+			st.wakeHandler()
+		case !st.queued && !st.abandoned:
+			st.queued = true
+			s.queue = append(s.queue, st)
+		}
+		s.released[i] = nil
+	}
+	s.released = s.released[:0]
+	if s.writing == nil || s.writing != s.stuckOn || s.wrote != s.stuckAt {
+		s.stuckOn, s.stuckAt, s.stuckSince = s.writing, s.wrote, s.now
+	} else if s.now-s.stuckSince >= stallBudget {
+		// the stuck writer hands the stream to its handler once its write
+		// returns; a new one takes the queue
+		s.writing.detached = true
+		s.writing = nil
+		s.stuckOn = nil
+		s.gen++
+		go s.write(s.gen)
+	}
+	writing := s.writing != nil || s.head < len(s.queue)
+	s.wmu.Unlock()
+	if writing {
+		select {
+		case s.writerWake <- struct{}{}:
+		default:
+		}
+	}
+	return writing
+}
+
+// write is a shard's writer: it writes and flushes queued streams in turn,
+// until dispatch replaces it (gen is no longer current) while it is stuck.
+func (s *schedulerShard) write(gen int) {
+	s.wmu.Lock()
+	for {
+		if s.head == len(s.queue) {
+			s.queue, s.head = s.queue[:0], 0
+			s.wmu.Unlock()
+			<-s.writerWake
+			s.wmu.Lock()
+			continue
+		}
+		st := s.queue[s.head]
+		s.queue[s.head] = nil
+		s.head++
+		st.queued = false
+		if st.abandoned || st.detached {
+			continue
+		}
+		st.busy = true
+		s.writing = st
+		s.wmu.Unlock()
+
+		err := st.writeReleased()
+
+		s.wmu.Lock()
+		st.busy = false
+		s.wrote++
+		replaced := gen != s.gen
+		if !replaced {
+			s.writing = nil
+		}
+		switch {
+		case st.abandoned:
+			if st.quiet != nil {
+				close(st.quiet)
+			}
+		case err != nil:
+			st.failed = true
+			st.wakeHandler()
+		case replaced:
+			st.own = true
+			st.wakeHandler()
+		case st.written == st.job.n:
+			st.ended = true
+			st.wakeHandler()
+		}
+		if replaced {
+			s.wmu.Unlock()
+			return
+		}
+	}
+}
+
+const (
+	wheelBits   = 6
+	wheelSize   = 1 << wheelBits
+	wheelMask   = wheelSize - 1
+	wheelLevels = 4
+	// furthest a timer can be scheduled ahead, in ticks (~4.6h at 1ms)
+	wheelSpan = 1<<(wheelBits*wheelLevels) - 1
+)
+
+// timerWheel is a hierarchical timing wheel in the style of the classic
+// Linux kernel timer wheel: level 0 has one slot per tick and each higher
+// level one slot per full turn of the level below. Adding a timer and
+// firing it are O(1); timers are cascaded down a level when the wheel
+// below wraps.
+type timerWheel struct {
+	base  uint64 // next tick to process
+	slots [wheelLevels][wheelSize]*activeStream
+	n     int
+}
+
+func (tw *timerWheel) add(st *activeStream) {
+	if st.expires < tw.base {
+		st.expires = tw.base
+	}
+	delta := st.expires - tw.base
+	if delta > wheelSpan {
+		st.expires = tw.base + wheelSpan
+		delta = wheelSpan
+	}
+	lvl := 0
+	for lvl < wheelLevels-1 && delta >= 1<<(wheelBits*(lvl+1)) {
+		lvl++
+	}
+	slot := &tw.slots[lvl][(st.expires>>(wheelBits*lvl))&wheelMask]
+	st.prev, st.next, st.slot = nil, *slot, slot
+	if st.next != nil {
+		st.next.prev = st
+	}
+	*slot = st
+	tw.n++
+}
+
+// remove unlinks st if it is on the wheel.
+func (tw *timerWheel) remove(st *activeStream) {
+	if st.slot == nil {
+		return
+	}
+	if st.prev != nil {
+		st.prev.next = st.next
+	} else {
+		*st.slot = st.next
+	}
+	if st.next != nil {
+		st.next.prev = st.prev
+	}
+	st.prev, st.next, st.slot = nil, nil, nil
+	tw.n--
+}
+
+// advance processes tick base, calling fire for every timer that expires on
+// it. fire may add timers.
+func (tw *timerWheel) advance(fire func(st *activeStream, tick uint64)) {
+	tick := tw.base
+	idx := tick & wheelMask
+	if idx == 0 {
+		for lvl := 1; lvl < wheelLevels; lvl++ {
+			i := (tick >> (wheelBits * lvl)) & wheelMask
+			tw.cascade(lvl, i)
+			if i != 0 {
+				break
+			}
+		}
+	}
+	list := tw.slots[0][idx]
+	tw.slots[0][idx] = nil
+	tw.base++
+	for st := list; st != nil; {
+		next := st.next
+		st.prev, st.next, st.slot = nil, nil, nil
+		tw.n--
+		fire(st, tick)
+		st = next
+	}
+}
+
+func (tw *timerWheel) cascade(lvl int, idx uint64) {
+	list := tw.slots[lvl][idx]
+	tw.slots[lvl][idx] = nil
+	for st := list; st != nil; {
+		next := st.next
+		st.slot = nil
+		tw.n--
+		tw.add(st)
+		st = next
+	}
+}
@@ -0,0 +1,329 @@
+package server
+
+import (
+	"context"
+	"fmt"
+	"math/rand"
+	"net/http"
+	"net/http/httptest"
+	"runtime"
+	"sort"
+	"strings"
+	"sync"
+	"syscall"
+	"testing"
+	"time"
+
+	cfg "mock-openai-server/pkg/server/config"
+)
+
+func TestTimerWheelFiresOnExpiry(t *testing.T) {
+	rng := rand.New(rand.NewSource(1))
+	tw := &timerWheel{base: 12345}
+	want := map[*activeStream]uint64{}
+	for i := 0; i < 2000; i++ {
+		// spread over every level of the wheel
+		span := []uint64{wheelSize, wheelSize * wheelSize, 1 << 18, 300000}[i%4]
+		st := &activeStream{expires: tw.base + uint64(rng.Int63n(int64(span)))}
+		want[st] = st.expires
+		tw.add(st)
+	}
+	end := tw.base + 300001
+	for tw.base < end {
+		tw.advance(func(st *activeStream, tick uint64) {
+			if want[st] != tick {
+				t.Fatalf("timer for tick %d fired on tick %d", want[st], tick)
+			}
+			delete(want, st)
+		})
+	}
+	if len(want) != 0 || tw.n != 0 {
+		t.Fatalf("%d timers never fired (n=%d)", len(want), tw.n)
+	}
+}
+
+// constantGap sends the first frame immediately and the rest delay apart.
+func constantGap(delay time.Duration) func(int) time.Duration {
+	return func(i int) time.Duration {
+		if i == 0 {
+			return 0
+		}
+		return delay
+	}
+}
+
+// recordingStream records when each frame was written and counts flushes.
+type recordingStream struct {
+	frames  []string
+	times   []time.Time
+	flushes int
+}
+
+func (r *recordingStream) Write(p []byte) (int, error) {
+	r.frames = append(r.frames, string(p))
+	r.times = append(r.times, time.Now())
+	return len(p), nil
+}
+
+func (r *recordingStream) Flush() { r.flushes++ }
+
+func testJob(rec *recordingStream, n int, delay time.Duration) streamJob {
+	return streamJob{
+		w: rec, flusher: rec, n: n, delay: constantGap(delay),
+		frame: func(i int) []byte { return []byte(fmt.Sprint(i)) },
+	}
+}
+
+func TestStreamSchedulerPacesFrames(t *testing.T) {
+	s := newStreamScheduler(2, time.Millisecond)
+	const delay = 20 * time.Millisecond
+	var wg sync.WaitGroup
+	recs := make([]*recordingStream, 8)
+	starts := make([]time.Time, len(recs))
+	for i := range recs {
+		recs[i] = &recordingStream{}
+		wg.Add(1)
+		go func(i int) {
+			defer wg.Done()
+			starts[i] = time.Now()
+			s.run(context.Background(), testJob(recs[i], 5, delay))
+		}(i)
+	}
+	wg.Wait()
+	for n, rec := range recs {
+		if fmt.Sprint(rec.frames) != "[0 1 2 3 4]" {
+			t.Fatalf("frames %v", rec.frames)
+		}
+		for i := 1; i < len(rec.times); i++ {
+			// deadlines are measured from the stream start, never early
+			if got := rec.times[i].Sub(starts[n]); got < time.Duration(i)*delay {
+				t.Errorf("frame %d sent %v after the start, want >= %v", i, got, time.Duration(i)*delay)
+			}
+		}
+	}
+}
+
+func TestStreamSchedulerCoalescesFlushes(t *testing.T) {
+	s := newStreamScheduler(1, 50*time.Millisecond)
+	rec := &recordingStream{}
+	s.run(context.Background(), testJob(rec, 100, 0))
+	if len(rec.frames) != 100 || rec.flushes != 1 {
+		t.Fatalf("got %d frames and %d flushes, want 100 frames in 1 flush", len(rec.frames), rec.flushes)
+	}
+}
+
+func TestStreamSchedulerStopsOnCancel(t *testing.T) {
+	s := newStreamScheduler(1, time.Millisecond)
+	ctx, cancel := context.WithCancel(context.Background())
+	rec := &recordingStream{}
+	go func() {
+		time.Sleep(30 * time.Millisecond)
+		cancel()
+	}()
+	s.run(ctx, testJob(rec, 1000, 10*time.Millisecond))
+	if len(rec.frames) == 0 || len(rec.frames) > 10 {
+		t.Fatalf("wrote %d frames before cancellation", len(rec.frames))
+	}
+}
+
+// blockingStream blocks every write until unblock is closed, like a client
+// that has stopped reading.
+type blockingStream struct {
+	unblock chan struct{}
+	writes  int
+}
+
+func (b *blockingStream) Write(p []byte) (int, error) { <-b.unblock; b.writes++; return len(p), nil }
+
+// TestStalledClientDoesNotDelayShard runs a stream whose writes block next
+// to a normal one on the same shard: the normal stream keeps its pace, and
+// the stalled one is handed to its handler and finishes once unblocked.
+func TestStalledClientDoesNotDelayShard(t *testing.T) {
+	s := newStreamScheduler(1, time.Millisecond)
+	stalled := &blockingStream{unblock: make(chan struct{})}
+	done := make(chan struct{})
+	go func() {
+		s.run(context.Background(), streamJob{w: stalled, n: 5, delay: constantGap(time.Millisecond),
+			frame: func(int) []byte { return []byte("x") }})
+		close(done)
+	}()
+
+	rec := &recordingStream{}
+	start := time.Now()
+	s.run(context.Background(), testJob(rec, 5, 5*time.Millisecond))
+	if elapsed := time.Since(start); len(rec.frames) != 5 || elapsed > time.Second {
+		t.Fatalf("healthy stream wrote %d frames in %v next to a stalled one", len(rec.frames), elapsed)
+	}
+	close(stalled.unblock)
+	<-done
+	if stalled.writes != 5 {
+		t.Fatalf("stalled stream wrote %d of 5 frames", stalled.writes)
+	}
+}
+
+// TestCancelStalledStream cancels a stream while a write to it is blocked:
+// run waits for that write, then counts the stream as cancelled.
+func TestCancelStalledStream(t *testing.T) {
+	s := newStreamScheduler(1, time.Millisecond)
+	stalled := &blockingStream{unblock: make(chan struct{})}
+	ctx, cancel := context.WithCancel(context.Background())
+	time.AfterFunc(20*time.Millisecond, cancel)
+	time.AfterFunc(50*time.Millisecond, func() { close(stalled.unblock) })
+	s.run(ctx, streamJob{w: stalled, n: 100, delay: constantGap(time.Millisecond),
+		frame: func(int) []byte { return []byte("x") }})
+	if st := s.Stats(); st.Cancelled != 1 || st.Active != 0 || st.FramesSkipped != uint64(100-stalled.writes) {
+		t.Fatalf("stats %+v after %d writes", st, stalled.writes)
+	}
+}
+
+// cpuTime is the user+system CPU time consumed by the process so far.
+func cpuTime() time.Duration {
+	var ru syscall.Rusage
+	if err := syscall.Getrusage(syscall.RUSAGE_SELF, &ru); err != nil {
+		return 0
+	}
+	return time.Duration(ru.Utime.Nano() + ru.Stime.Nano())
+}
+
+// sleepStream is the previous pacing: one goroutine sleeping between frames.
+func sleepStream(job streamJob) {
+	for i := 0; i < job.n; i++ {
+		time.Sleep(job.delay(i))
+		_, _ = job.w.Write(job.frame(i))
+		job.flusher.Flush()
+	}
+}
+
+// BenchmarkStreamJitter runs N concurrent streams of 20 tokens 10ms apart and
+// reports how far inter-token gaps deviate from 10ms (p50/p99) and the CPU
+// time spent per stream, for the timer wheel and for a sleeping goroutine
+// per stream.
+func BenchmarkStreamJitter(b *testing.B) {
+	const (
+		tokens = 20
+		delay  = 10 * time.Millisecond
+	)
+	frame := []byte("data: {}\n\n")
+	pacers := []struct {
+		name string
+		run  func(streamJob)
+	}{
+		{"wheel", func(job streamJob) { streamSched.run(context.Background(), job) }},
+		{"sleep", sleepStream},
+	}
+	for _, p := range pacers {
+		for _, n := range []int{100, 1000, 10000, 20000} {
+			b.Run(fmt.Sprintf("%s/streams=%d", p.name, n), func(b *testing.B) {
+				var errs []time.Duration
+				var cpu time.Duration
+				for iter := 0; iter < b.N; iter++ {
+					recs := make([]*recordingStream, n)
+					for i := range recs {
+						recs[i] = &recordingStream{times: make([]time.Time, 0, tokens), frames: make([]string, 0, tokens)}
+					}
+					var wg sync.WaitGroup
+					wg.Add(n)
+					cpu0 := cpuTime()
+					for i := range recs {
+						rec := recs[i]
+						go func() {
+							defer wg.Done()
+							p.run(streamJob{w: rec, flusher: rec, n: tokens, delay: constantGap(delay),
+								frame: func(int) []byte { return frame }})
+						}()
+					}
+					wg.Wait()
+					cpu += cpuTime() - cpu0
+					for _, rec := range recs {
+						for i := 1; i < len(rec.times); i++ {
+							e := rec.times[i].Sub(rec.times[i-1]) - delay
+							if e < 0 {
+								e = -e
+							}
+							errs = append(errs, e)
+						}
+					}
+				}
+				sort.Slice(errs, func(i, j int) bool { return errs[i] < errs[j] })
+				b.ReportMetric(float64(errs[len(errs)/2].Microseconds()), "p50-jitter-us")
+				b.ReportMetric(float64(errs[len(errs)*99/100].Microseconds()), "p99-jitter-us")
+				b.ReportMetric(float64(cpu.Microseconds())/float64(b.N*n), "cpu-us/stream")
+			})
+		}
+	}
+}
+
+// TestStreamsReleaseOnClientDisconnect opens many slow streams, drops every
+// client after the first frame and checks that the handlers return promptly
+// and the goroutine count falls back to where it started.
+func TestStreamsReleaseOnClientDisconnect(t *testing.T) {
+	delay := 10000
+	conf := &cfg.BotConfig{Streaming: cfg.StreamingConfig{ChunkDelayMs: &delay}}
+	if err := conf.Compile(); err != nil {
+		t.Fatal(err)
+	}
+	prev := cfg.Get()
+	cfg.Set(conf)
+	defer cfg.Set(prev)
+
+	srv := httptest.NewServer(http.HandlerFunc(handleChatCompletions))
+	defer srv.Close()
+	tr := &http.Transport{}
+	defer tr.CloseIdleConnections()
+	client := &http.Client{Transport: tr}
+
+	// warm up the scheduler shards (a loop and a writer each) and
+	// connection machinery
+	runtime.GC()
+	baseline := runtime.NumGoroutine() + 2*len(streamSched.shards)
+	before := streamSched.Stats()
+
+	const streams = 200
+	body := `{"model":"gpt-4o","stream":true,"messages":[{"role":"user","content":"tell me about streaming"}]}`
+	var wg sync.WaitGroup
+	for i := 0; i < streams; i++ {
+		wg.Add(1)
+		go func() {
+			defer wg.Done()
+			ctx, cancel := context.WithCancel(context.Background())
+			defer cancel()
+			req, _ := http.NewRequestWithContext(ctx, http.MethodPost, srv.URL, strings.NewReader(body))
+			resp, err := client.Do(req)
+			if err != nil {
+				t.Error(err)
+				return
+			}
+			// role chunk plus the first delta, then hang up
+			buf := make([]byte, 1)
+			for n := 0; n < 2; {
+				if _, err := resp.Body.Read(buf); err != nil {
+					t.Error(err)
+					break
+				}
+				if buf[0] == '\n' {
+					n++
+				}
+			}
+			cancel()
+			resp.Body.Close()
+		}()
+	}
+	wg.Wait()
+	tr.CloseIdleConnections()
+
+	deadline := time.Now().Add(5 * time.Second)
+	for {
+		after := streamSched.Stats()
+		if after.Cancelled-before.Cancelled == streams && runtime.NumGoroutine() <= baseline {
+			if after.FramesSkipped == before.FramesSkipped {
+				t.Error("no skipped frames were counted")
+			}
+			return
+		}
+		if time.Now().After(deadline) {
+			t.Fatalf("after disconnects: %d/%d streams cancelled, %d goroutines (baseline %d)",
+				after.Cancelled-before.Cancelled, streams, runtime.NumGoroutine(), baseline)
+		}
+		time.Sleep(10 * time.Millisecond)
+	}
+}
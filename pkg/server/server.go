@@ -1,12 +1,15 @@
 package server
 
 import (
+	"context"
 	"encoding/json"
 	"fmt"
-	"log"
+	"io"
 	"math/rand"
 	"net/http"
+	"os"
 	"strings"
+	"sync/atomic"
 	"time"
 
 	"github.com/gorilla/mux"
@@ -21,6 +24,8 @@ type ChatCompletionRequest struct {
 	Temperature *float64  `json:"temperature,omitempty"`
 	MaxTokens   *int      `json:"max_tokens,omitempty"`
 	Stream      *bool     `json:"stream,omitempty"`
+	// Seed makes the reply reproducible (see requestRand).
+	Seed *int64 `json:"seed,omitempty"`
 }
 
 type Message struct {
@@ -74,12 +79,13 @@ type ModelsResponse struct {
 func corsMiddleware(next http.Handler) http.Handler {
 	return http.HandlerFunc(func(w http.ResponseWriter, r *http.Request) {
 		origin := "*"
-		if cfg.Current != nil && cfg.Current.Server.CORS != "" {
-			origin = cfg.Current.Server.CORS
+		if conf := cfg.Get(); conf != nil && conf.Server.CORS != "" {
+			origin = conf.Server.CORS
 		}
 		w.Header().Set("Access-Control-Allow-Origin", origin)
 		w.Header().Set("Access-Control-Allow-Methods", "GET, POST, PUT, DELETE, OPTIONS")
-		w.Header().Set("Access-Control-Allow-Headers", "Content-Type, Authorization")
+		w.Header().Set("Access-Control-Allow-Headers", "Content-Type, Authorization, "+headerChunkDelayMs+", "+headerTTFTMs+", "+headerSeed)
+		w.Header().Set("Access-Control-Expose-Headers", headerSeed)
 
 		if r.Method == "OPTIONS" {
 			w.WriteHeader(http.StatusOK)
@@ -91,7 +97,7 @@ func corsMiddleware(next http.Handler) http.Handler {
 }
 
 // Generate mock response based on conversation context
-func generateChatResponse(messages []Message) string {
+func generateChatResponse(messages []Message, rng *rand.Rand) string {
 	if len(messages) == 0 {
 		return "Hello! How can I help you today?"
 	}
@@ -107,7 +113,7 @@ func generateChatResponse(messages []Message) string {
 			"What do you call a fake noodle? An impasta!",
 			"Why don't skeletons fight each other? They don't have the guts!",
 		}
-		return jokes[rand.Intn(len(jokes))]
+		return jokes[rng.Intn(len(jokes))]
 	}
 
 	if strings.Contains(lastMessageLower, "weather") {
@@ -128,36 +134,54 @@ func generateChatResponse(messages []Message) string {
 
 // Handle chat completions
 func handleChatCompletions(w http.ResponseWriter, r *http.Request) {
+	// one config snapshot for the whole request, even across a reload
+	conf := cfg.Get()
+	st := newServerTiming(conf, time.Now())
+
 	var req ChatCompletionRequest
 	if err := json.NewDecoder(r.Body).Decode(&req); err != nil {
 		http.Error(w, "Invalid JSON", http.StatusBadRequest)
 		return
 	}
+	st.mark(phaseDecode)
+	setRequestModel(w, req.Model)
+	override, err := parseLatencyOverride(conf, r)
+	if err != nil {
+		writeBadRequest(w, err)
+		return
+	}
+	rng := override.requestRand(w, req.Seed)
 
 	// Handle streaming
 	if req.Stream != nil && *req.Stream {
-		handleStreamingChat(w, r, &req)
+		handleStreamingChat(w, r, conf, &req, override, st)
 		return
 	}
 
 	// Generate response (config-aware)
-	responseText, errOut, _ := resolveChatResponse(&req)
+	responseText, errOut, pacing := resolveChatResponse(conf, &req, st, rng)
 	if errOut != nil {
-		w.Header().Set("Content-Type", "application/json")
-		w.WriteHeader(errOut.Status)
-		if err := json.NewEncoder(w).Encode(map[string]interface{}{
+		st.writeJSON(w, errOut.Status, map[string]interface{}{
 			"error": map[string]interface{}{
 				"message": errOut.Message,
 				"code":    errOut.Code,
 			},
-		}); err != nil {
-			http.Error(w, err.Error(), http.StatusInternalServerError)
-		}
+		})
 		return
 	}
+	// usage is counted once; the completion count also sizes the wait
+	tokens := tokenCounterFor(conf, req.Model)
+	usage := newUsage(tokens.chatPrompt(req.Messages), tokens.count(responseText))
+	st.mark(phaseUsage)
+	if conf.HasLatencyProfile(req.Model) || override.timed() {
+		if !waitLatency(r.Context(), override.apply(pacing.Latency), usage.CompletionTokens) {
+			return
+		}
+		st.mark(phaseWait)
+	}
 
 	response := ChatCompletionResponse{
-		ID:      fmt.Sprintf("chatcmpl-%d", time.Now().Unix()),
+		ID:      generateChatID(),
 		Object:  "chat.completion",
 		Created: time.Now().Unix(),
 		Model:   req.Model,
@@ -171,27 +195,19 @@ func handleChatCompletions(w http.ResponseWriter, r *http.Request) {
 				FinishReason: "stop",
 			},
 		},
-		Usage: Usage{
-			PromptTokens:     countTokens(req.Messages),
-			CompletionTokens: len(strings.Fields(responseText)),
-			TotalTokens:      countTokens(req.Messages) + len(strings.Fields(responseText)),
-		},
-	}
-
-	w.Header().Set("Content-Type", "application/json")
-	if err := json.NewEncoder(w).Encode(response); err != nil {
-		http.Error(w, err.Error(), http.StatusInternalServerError)
+		Usage: usage,
 	}
+	st.writeJSON(w, http.StatusOK, response)
 }
 
 // Handle streaming chat completions
-func handleStreamingChat(w http.ResponseWriter, r *http.Request, req *ChatCompletionRequest) {
+func handleStreamingChat(w http.ResponseWriter, r *http.Request, conf *cfg.BotConfig, req *ChatCompletionRequest, override latencyOverride, st *serverTiming) {
 	w.Header().Set("Content-Type", "text/event-stream")
 	w.Header().Set("Cache-Control", "no-cache")
 	w.Header().Set("Connection", "keep-alive")
 	origin := "*"
-	if cfg.Current != nil && cfg.Current.Server.CORS != "" {
-		origin = cfg.Current.Server.CORS
+	if conf != nil && conf.Server.CORS != "" {
+		origin = conf.Server.CORS
 	}
 	w.Header().Set("Access-Control-Allow-Origin", origin)
 
@@ -201,15 +217,20 @@ func handleStreamingChat(w http.ResponseWriter, r *http.Request, req *ChatComple
 		return
 	}
 
-	responseText, _, delay := resolveChatResponse(req)
-	words := strings.Fields(responseText)
-	chatID := fmt.Sprintf("chatcmpl-%d", time.Now().Unix())
+	responseText, _, pacing := resolveChatResponse(conf, req, st, override.rng)
+	chunks := splitChunks(responseText, pacing.Chunking, conf, req.Model)
+	st.mark(phaseRender)
+	// the header carries the phases up to the stream; the trailing comment
+	// has them all
+	st.setHeader(w)
+	chatID := generateChatID()
+	created := time.Now().Unix()
 
 	// Send initial chunk with role
-	initialChunk := StreamChunk{
+	writeSSEJSON(w, StreamChunk{
 		ID:      chatID,
 		Object:  "chat.completion.chunk",
-		Created: time.Now().Unix(),
+		Created: created,
 		Model:   req.Model,
 		Choices: []Choice{
 			{
@@ -217,44 +238,27 @@ func handleStreamingChat(w http.ResponseWriter, r *http.Request, req *ChatComple
 				Delta: &Delta{Role: "assistant"},
 			},
 		},
-	}
-
-	chunkData, _ := json.Marshal(initialChunk)
-	fmt.Fprintf(w, "data: %s\n\n", chunkData)
+	})
 	flusher.Flush()
 
-	// Stream each word
-	for i, word := range words {
-		chunk := StreamChunk{
-			ID:      chatID,
-			Object:  "chat.completion.chunk",
-			Created: time.Now().Unix(),
-			Model:   req.Model,
-			Choices: []Choice{
-				{
-					Index: 0,
-					Delta: &Delta{Content: word},
-				},
-			},
-		}
-
-		if i < len(words)-1 {
-			chunk.Choices[0].Delta.Content += " "
-		}
-
-		chunkData, _ = json.Marshal(chunk)
-		fmt.Fprintf(w, "data: %s\n\n", chunkData)
-		flusher.Flush()
-
-		// Add delay for realistic streaming (configurable)
-		time.Sleep(delay)
-	}
+	// Stream each chunk; only the delta is encoded per frame and the
+	// scheduler paces the flushes (model latency profile or chunk delay)
+	enc := newChatChunkEncoder(chatID, req.Model, created)
+	streamSched.run(r.Context(), streamJob{
+		w:       w,
+		flusher: flusher,
+		n:       len(chunks),
+		batch:   pacing.Chunking.Coalesce,
+		delay:   streamDelay(conf, req.Model, override, pacing, responseText, chunks),
+		frame:   func(i int) []byte { return enc.frame(chunks[i]) },
+		first:   func() { observeFirstToken(w) },
+	})
 
 	// Send final chunk
-	finalChunk := StreamChunk{
+	writeSSEJSON(w, StreamChunk{
 		ID:      chatID,
 		Object:  "chat.completion.chunk",
-		Created: time.Now().Unix(),
+		Created: created,
 		Model:   req.Model,
 		Choices: []Choice{
 			{
@@ -263,28 +267,18 @@ func handleStreamingChat(w http.ResponseWriter, r *http.Request, req *ChatComple
 				FinishReason: "stop",
 			},
 		},
-	}
-
-	chunkData, _ = json.Marshal(finalChunk)
-	fmt.Fprintf(w, "data: %s\n\n", chunkData)
-	fmt.Fprintf(w, "data: [DONE]\n\n")
+	})
+	_, _ = io.WriteString(w, "data: [DONE]\n\n")
+	st.mark(phaseStream)
+	st.writeComment(w)
 	flusher.Flush()
 }
 
-// Count tokens (simple word count approximation)
-func countTokens(messages []Message) int {
-	total := 0
-	for _, msg := range messages {
-		total += len(strings.Fields(msg.Content))
-	}
-	return total
-}
-
 // Handle models endpoint
 func handleModels(w http.ResponseWriter, r *http.Request) {
 	var data []Model
-	if cfg.Current != nil && len(cfg.Current.Models) > 0 {
-		for _, m := range cfg.Current.Models {
+	if conf := cfg.Get(); conf != nil && len(conf.Models) > 0 {
+		for _, m := range conf.Models {
 			data = append(data, Model{ID: m.ID, Object: "model", Created: 1677610602, OwnedBy: m.OwnedBy})
 		}
 	} else {
@@ -312,6 +306,9 @@ func handleHealth(w http.ResponseWriter, r *http.Request) {
 			"responses":        "available",
 			"models":           "available",
 		},
+		"storage":   responseStore.Stats(),
+		"config":    cfg.GetReloadStats(),
+		"streaming": streamHealth(),
 	}
 
 	w.Header().Set("Content-Type", "application/json")
@@ -320,39 +317,46 @@ func handleHealth(w http.ResponseWriter, r *http.Request) {
 	}
 }
 
-func StartHTTPServer() error {
+// newRouter registers every endpoint with the middleware chain.
+func newRouter() *mux.Router {
 	router := mux.NewRouter()
+	router.Use(compressionMiddleware)
+	router.Use(metricsMiddleware)
 	router.Use(corsMiddleware)
 
 	// Chat Completions API
 	router.HandleFunc("/v1/chat/completions", handleChatCompletions).Methods("POST")
 	router.HandleFunc("/v1/models", handleModels).Methods("GET")
 	router.HandleFunc("/health", handleHealth).Methods("GET")
+	router.HandleFunc("/metrics", handleMetrics).Methods("GET")
 
 	// Help endpoints
 	docpkg.RegisterHelpRoutes(router)
 
 	// Responses API
 	setupResponsesRoutes(router)
+	return router
+}
 
-	port := "3117"
-	if cfg.Current != nil && cfg.Current.Server.Port != "" {
-		port = cfg.Current.Server.Port
+func StartHTTPServer() error {
+	return Serve(ServeOptions{})
+}
+
+// Serve is StartHTTPServer with the listen addresses, ready file and
+// worker count overridden by opts.
+func Serve(opts ServeOptions) error {
+	ctx := context.Background()
+	if spec := os.Getenv(envWorker); spec != "" {
+		return serveWorker(ctx, spec)
+	}
+	if n := workerCount(cfg.Get(), opts); n > 1 {
+		return superviseWorkers(ctx, n, opts)
 	}
-	log.Printf("🚀 Mock OpenAI Server with Responses API starting on :%s", port)
-	log.Println("")
-	log.Println("Available APIs:")
-	log.Println("📝 Chat Completions API:\n  POST /v1/chat/completions")
-	log.Println("🔄 Responses API:\n  POST /v1/responses\n  GET /v1/responses\n  GET /v1/responses/{response_id}")
-	log.Println("🔧 Utility endpoints:\n  GET /v1/models\n  GET /health\n  GET /help, /help/{slug}")
-	log.Println("")
-	log.Println("Features:\n✅ Streaming support for both APIs\n✅ Built-in tools (web_search, file_search)\n✅ Stateful conversations\n✅ Conversation forking\n✅ CORS enabled")
-
-	return http.ListenAndServe(":"+port, router)
+	return serve(ctx, opts)
 }
 
 // Resolve chat response using configuration rules; falls back to built-in generator.
-func resolveChatResponse(req *ChatCompletionRequest) (string, *cfg.ErrorOut, time.Duration) {
+func resolveChatResponse(conf *cfg.BotConfig, req *ChatCompletionRequest, st *serverTiming, rng *rand.Rand) (string, *cfg.ErrorOut, cfg.Pacing) {
 	// Build input context
 	lastUser := ""
 	full := ""
@@ -366,30 +370,27 @@ func resolveChatResponse(req *ChatCompletionRequest) (string, *cfg.ErrorOut, tim
 			full += m.Content + "\n"
 		}
 	}
-	delayMs := 150
-	if cfg.Current != nil && cfg.Current.Streaming.ChunkDelayMs != nil {
-		delayMs = *cfg.Current.Streaming.ChunkDelayMs
-	}
-	delay := time.Duration(delayMs) * time.Millisecond
-
-	mr := cfg.EvaluateRules("chat", req.Model, lastRole, lastUser, full)
+	st.mark(phaseInput)
+	mr := conf.EvaluateRules("chat", req.Model, lastRole, lastUser, full, rng)
+	pacing := conf.PacingFor(req.Model, mr)
+	st.mark(phaseRules)
 	if mr != nil {
-		delay = mr.Delay
 		// error path
 		if mr.Rule.Respond.Error != nil {
-			return "", mr.Rule.Respond.Error, delay
+			return "", mr.Rule.Respond.Error, pacing
 		}
 		// text path with optional tools aggregation
-		ctx := cfg.BuildTemplateContext(req.Model, lastUser, full)
+		ctx := conf.NewTemplateContext(req.Model, lastUser, full)
+		st.mark(phaseRender)
 
 		// Aggregate tool output texts if any are requested via use_tools
 		agg := ""
 		for _, name := range mr.Rule.Respond.UseTools {
-			if !cfg.IsToolEnabled(name) {
+			if !conf.IsToolEnabled(name) {
 				continue
 			}
-			if def, ok := cfg.GetToolDef(name); ok && def.Message != nil {
-				t := cfg.RenderTemplate(def.Message.Text, ctx)
+			if def, ok := conf.GetToolDef(name); ok && def.Message != nil {
+				t := def.Message.Template().Render(ctx)
 				if t != "" {
 					if agg != "" {
 						agg += "\n"
@@ -398,29 +399,93 @@ func resolveChatResponse(req *ChatCompletionRequest) (string, *cfg.ErrorOut, tim
 				}
 			}
 		}
+		st.mark(phaseTools)
 
-		txt := cfg.PickText(mr.Rule.Respond)
-		if txt != "" {
-			rendered := cfg.RenderTemplate(txt, ctx)
+		if tmpl := cfg.PickTemplate(mr.Rule.Respond, rng); !tmpl.IsEmpty() {
+			rendered := tmpl.Render(ctx)
 			if agg != "" {
 				rendered = agg + "\n" + rendered
 			}
-			return rendered, nil, delay
+			st.mark(phaseRender)
+			return rendered, nil, pacing
 		}
 		if agg != "" {
-			return agg, nil, delay
+			return agg, nil, pacing
 		}
 	}
 
 	// fallback to configured fallback text
-	if cfg.Current != nil && (cfg.Current.Fallback.Text != "" || cfg.Current.Fallback.Message.Text != "") {
-		ctx := cfg.BuildTemplateContext(req.Model, lastUser, full)
-		txt := cfg.PickText(cfg.Current.Fallback)
-		if txt != "" {
-			return cfg.RenderTemplate(txt, ctx), nil, delay
+	if conf != nil && (conf.Fallback.Text != "" || conf.Fallback.Message.Text != "") {
+		if tmpl := cfg.PickTemplate(conf.Fallback, rng); !tmpl.IsEmpty() {
+			text := tmpl.Render(conf.NewTemplateContext(req.Model, lastUser, full))
+			st.mark(phaseRender)
+			return text, nil, pacing
 		}
 	}
 
 	// built-in logic
-	return generateChatResponse(req.Messages), nil, delay
+	text := generateChatResponse(req.Messages, rng)
+	st.mark(phaseRender)
+	return text, nil, pacing
+}
+
+// waitLatency holds a non-streaming response for as long as streaming its
+// tokens would have taken under lat. It returns false, and the response
+// should be dropped, if the client goes away first.
+func waitLatency(ctx context.Context, lat cfg.Latency, tokens int) bool {
+	d := lat.Total(tokens)
+	if d <= 0 {
+		return ctx.Err() == nil
+	}
+	t := time.NewTimer(d)
+	defer t.Stop()
+	select {
+	case <-t.C:
+		return true
+	case <-ctx.Done():
+		cancelledWaits.Add(1)
+		return false
+	}
+}
+
+// streamDelay paces a stream of chunks flushed batch at a time. With a
+// latency profile (or a timed override) the wait before each flush covers
+// the tokens that end in its chunks, so the stream finishes when waitLatency
+// would have answered the same text; otherwise every flush waits one
+// chunk_delay_ms gap.
+func streamDelay(conf *cfg.BotConfig, model string, override latencyOverride, pacing cfg.Pacing, text string, chunks []string) func(i int) time.Duration {
+	lat := override.apply(pacing.Latency)
+	if !conf.HasLatencyProfile(model) && !override.timed() {
+		return lat.Delay
+	}
+	// done[k] counts the tokens that end within chunks[:k]; the first flush
+	// carries the first token (and the time to first token) even when it
+	// is only the whitespace before it
+	ends := tokenCounterFor(conf, model).ends(text)
+	done := make([]int, len(chunks)+1)
+	pos, t := 0, 0
+	for k, c := range chunks {
+		pos += len(c)
+		for t < len(ends) && ends[t] <= pos {
+			t++
+		}
+		done[k+1] = max(t, 1)
+	}
+	batch := max(pacing.Chunking.Coalesce, 1)
+	return func(i int) time.Duration {
+		j := min(i+batch, len(chunks))
+		return lat.Span(i == 0, done[j]-done[i])
+	}
+}
+
+// cancelledWaits counts non-streaming responses abandoned by their client
+// while held for their latency profile.
+var cancelledWaits atomic.Uint64
+
+// streamHealth reports streaming activity and cancellations.
+func streamHealth() map[string]interface{} {
+	return map[string]interface{}{
+		"streams":         streamSched.Stats(),
+		"cancelled_waits": cancelledWaits.Load(),
+	}
 }
@@ -0,0 +1,140 @@
+package server
+
+import (
+	"bytes"
+	"encoding/json"
+	"io"
+	"unicode/utf8"
+)
+
+// sseFrameEncoder writes the per-token SSE frames of one stream. Everything
+// in a frame except the delta text (id, object, created, model, ...) is
+// invariant for the stream, so it is serialised once into a prefix and
+// suffix; each token then only needs its delta escaped and spliced into a
+// reusable buffer.
+type sseFrameEncoder struct {
+	prefix []byte
+	suffix []byte
+	buf    []byte
+}
+
+// spliceMarker is a placeholder delta used to find where the delta goes in a
+// once-marshalled frame. Its angle brackets are HTML-escaped by
+// encoding/json, so it cannot collide with ordinary id or model text.
+const spliceMarker = "<delta-splice>"
+
+// newSSEFrameEncoder marshals frame, whose delta field must hold
+// spliceMarker, and splits it around the delta.
+func newSSEFrameEncoder(frame interface{}) *sseFrameEncoder {
+	data, err := json.Marshal(frame)
+	if err != nil {
+		panic(err)
+	}
+	marker := appendJSONString(nil, spliceMarker)
+	// the delta is the last field written in every frame we build
+	i := bytes.LastIndex(data, marker)
+	if i < 0 {
+		panic("sse: splice marker not found in frame")
+	}
+	e := &sseFrameEncoder{buf: make([]byte, 0, 256)}
+	e.prefix = append([]byte("data: "), data[:i]...)
+	e.suffix = append(append([]byte{}, data[i+len(marker):]...), "\n\n"...)
+	return e
+}
+
+// newChatChunkEncoder encodes chat.completion.chunk content deltas.
+func newChatChunkEncoder(id, model string, created int64) *sseFrameEncoder {
+	return newSSEFrameEncoder(StreamChunk{
+		ID:      id,
+		Object:  "chat.completion.chunk",
+		Created: created,
+		Model:   model,
+		Choices: []Choice{{Index: 0, Delta: &Delta{Content: spliceMarker}}},
+	})
+}
+
+// newResponsesDeltaEncoder encodes response.output_text.delta events.
+func newResponsesDeltaEncoder() *sseFrameEncoder {
+	return newSSEFrameEncoder(StreamEvent{Type: "response.output_text.delta", Delta: spliceMarker})
+}
+
+// frame returns the complete SSE frame for delta. The result is only valid
+// until the next call. delta must not be empty (empty deltas are omitted by
+// the JSON encoding, which the splice cannot reproduce).
+func (e *sseFrameEncoder) frame(delta string) []byte {
+	b := append(e.buf[:0], e.prefix...)
+	b = appendJSONString(b, delta)
+	b = append(b, e.suffix...)
+	e.buf = b
+	return b
+}
+
+// writeSSEJSON writes v as a single SSE data frame; used for the one-off
+// frames at the start and end of a stream.
+func writeSSEJSON(w io.Writer, v interface{}) {
+	data, err := json.Marshal(v)
+	if err != nil {
+		return
+	}
+	frame := make([]byte, 0, len(data)+8)
+	frame = append(frame, "data: "...)
+	frame = append(frame, data...)
+	frame = append(frame, "\n\n"...)
+	_, _ = w.Write(frame)
+}
+
+const hexDigits = "0123456789abcdef"
+
+// appendJSONString appends s as a quoted JSON string, escaped the same way
+// encoding/json does by default (including HTML-safe escaping of <, > and &,
+// U+2028/U+2029, and replacement of invalid UTF-8).
+func appendJSONString(dst []byte, s string) []byte {
+	dst = append(dst, '"')
+	start := 0
+	for i := 0; i < len(s); {
+		if b := s[i]; b < utf8.RuneSelf {
+			if b >= 0x20 && b != '"' && b != '\\' && b != '<' && b != '>' && b != '&' {
+				i++
+				continue
+			}
+			dst = append(dst, s[start:i]...)
+			switch b {
+			case '\\', '"':
+				dst = append(dst, '\\', b)
+			case '\b':
+				dst = append(dst, '\\', 'b')
+			case '\f':
+				dst = append(dst, '\\', 'f')
+			case '\n':
+				dst = append(dst, '\\', 'n')
+			case '\r':
+				dst = append(dst, '\\', 'r')
+			case '\t':
+				dst = append(dst, '\\', 't')
+			default:
+				dst = append(dst, '\\', 'u', '0', '0', hexDigits[b>>4], hexDigits[b&0xF])
+			}
+			i++
+			start = i
+			continue
+		}
+		r, size := utf8.DecodeRuneInString(s[i:])
+		if r == utf8.RuneError && size == 1 {
+			dst = append(dst, s[start:i]...)
+			dst = append(dst, `\ufffd`...)
+			i += size
+			start = i
+			continue
+		}
+		if r == '\u2028' || r == '\u2029' {
+			dst = append(dst, s[start:i]...)
+			dst = append(dst, '\\', 'u', '2', '0', '2', hexDigits[r&0xF])
+			i += size
+			start = i
+			continue
+		}
+		i += size
+	}
+	dst = append(dst, s[start:]...)
+	return append(dst, '"')
+}
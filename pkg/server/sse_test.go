@@ -0,0 +1,93 @@
+package server
+
+import (
+	"encoding/json"
+	"fmt"
+	"io"
+	"strings"
+	"testing"
+	"time"
+)
+
+var sseDeltas = []string{
+	"hello ", "world", "quotes \" and \\ backslash", "html <b>&amp;</b>", "tabs\tand\nnewlines\r",
+	"ctrl \x00\x01\x1f", "ünïcödé ✓ 🚀", "line sep \u2028 para sep \u2029", "bad utf8 \xff\xfe", " ",
+}
+
+func TestSSEFrameEncoderMatchesEncodingJSON(t *testing.T) {
+	chat := newChatChunkEncoder("chatcmpl-<1>", "gpt-4o & co", 1700000000)
+	resp := newResponsesDeltaEncoder()
+	for _, d := range sseDeltas {
+		want, _ := json.Marshal(StreamChunk{
+			ID: "chatcmpl-<1>", Object: "chat.completion.chunk", Created: 1700000000, Model: "gpt-4o & co",
+			Choices: []Choice{{Index: 0, Delta: &Delta{Content: d}}},
+		})
+		if got := string(chat.frame(d)); got != "data: "+string(want)+"\n\n" {
+			t.Errorf("chat %q:\n got %s\nwant data: %s", d, got, want)
+		}
+		want, _ = json.Marshal(StreamEvent{Type: "response.output_text.delta", Delta: d})
+		if got := string(resp.frame(d)); got != "data: "+string(want)+"\n\n" {
+			t.Errorf("responses %q:\n got %s\nwant data: %s", d, got, want)
+		}
+	}
+}
+
+func TestAppendJSONStringRoundTrips(t *testing.T) {
+	var all strings.Builder
+	for b := 0; b < 256; b++ {
+		all.WriteByte(byte(b))
+	}
+	for _, s := range append(sseDeltas, "\b\f", all.String()) {
+		var back string
+		if err := json.Unmarshal(appendJSONString(nil, s), &back); err != nil {
+			t.Fatalf("%q: %v", s, err)
+		}
+		// invalid bytes come back as one U+FFFD each, like encoding/json
+		if want := strings.Map(func(r rune) rune { return r }, s); back != want {
+			t.Errorf("%q round-tripped to %q", s, back)
+		}
+	}
+}
+
+var benchTokens = strings.Fields(strings.Repeat("The quick brown fox jumps over the lazy dog and says \"hi\" <again>. ", 16))
+
+// BenchmarkSSEChatMarshal is the previous per-token encoding: a full
+// StreamChunk, json.Marshal and fmt.Fprintf. One op is one token.
+func BenchmarkSSEChatMarshal(b *testing.B) {
+	b.ReportAllocs()
+	for i := 0; i < b.N; i++ {
+		chunk := StreamChunk{
+			ID:      "chatcmpl-1700000000",
+			Object:  "chat.completion.chunk",
+			Created: time.Now().Unix(),
+			Model:   "gpt-4o-mini",
+			Choices: []Choice{{Index: 0, Delta: &Delta{Content: benchTokens[i%len(benchTokens)]}}},
+		}
+		data, _ := json.Marshal(chunk)
+		fmt.Fprintf(io.Discard, "data: %s\n\n", data)
+	}
+}
+
+func BenchmarkSSEChatEncoder(b *testing.B) {
+	enc := newChatChunkEncoder("chatcmpl-1700000000", "gpt-4o-mini", time.Now().Unix())
+	b.ReportAllocs()
+	for i := 0; i < b.N; i++ {
+		_, _ = io.Discard.Write(enc.frame(benchTokens[i%len(benchTokens)]))
+	}
+}
+
+func BenchmarkSSEResponsesMarshal(b *testing.B) {
+	b.ReportAllocs()
+	for i := 0; i < b.N; i++ {
+		data, _ := json.Marshal(StreamEvent{Type: "response.output_text.delta", Delta: benchTokens[i%len(benchTokens)]})
+		fmt.Fprintf(io.Discard, "data: %s\n\n", data)
+	}
+}
+
+func BenchmarkSSEResponsesEncoder(b *testing.B) {
+	enc := newResponsesDeltaEncoder()
+	b.ReportAllocs()
+	for i := 0; i < b.N; i++ {
+		_, _ = io.Discard.Write(enc.frame(benchTokens[i%len(benchTokens)]))
+	}
+}
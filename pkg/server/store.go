@@ -0,0 +1,596 @@
+package server
+
+import (
+	"errors"
+	"fmt"
+	"runtime"
+	"sort"
+	"sync"
+	"sync/atomic"
+	"time"
+
+	cfg "mock-openai-server/pkg/server/config"
+)
+
+// ResponseStore keeps created responses and their conversation history so
+// that follow-up requests can reference them via previous_response_id.
+// Implementations must be safe for concurrent use by request handlers.
+type ResponseStore interface {
+	// Put stores a response together with the conversation turn it
+	// produced, which links back to the rest of the conversation.
+	Put(resp *ResponsesResponse, turn *historyNode)
+	// Get returns a stored response by ID.
+	Get(id string) (*ResponsesResponse, bool)
+	// List returns a page of stored responses in insertion order.
+	List(opts ListOptions) (ListPage, error)
+	// History returns the conversation turn recorded for a response ID.
+	History(id string) (*historyNode, bool)
+	// Stats reports occupancy and eviction counters.
+	Stats() StoreStats
+}
+
+// ListOptions selects a page of responses: up to Limit of them, oldest
+// first or newest first when Desc, starting after the response After. With
+// only Before set, the page is the Limit responses just ahead of Before;
+// with both, it stops short of Before.
+type ListOptions struct {
+	Limit  int
+	After  string
+	Before string
+	Desc   bool
+	// AfterStamp and BeforeStamp stand in for After and Before with the
+	// stamp of a response the store need not hold: in worker mode, a
+	// cursor another worker stored. 0 means none.
+	AfterStamp  int64
+	BeforeStamp int64
+}
+
+// ListPage is one page of List. HasMore reports responses beyond the page
+// in the direction it was read: past its end, or ahead of its start for a
+// page read back from Before alone. Stamps are the stamps of Data, and
+// AfterStamp and BeforeStamp those of the cursors, so pages from several
+// workers can be merged (see listWorkers).
+type ListPage struct {
+	Data        []*ResponsesResponse `json:"data"`
+	HasMore     bool                 `json:"has_more"`
+	Stamps      []int64              `json:"stamps"`
+	AfterStamp  int64                `json:"after_stamp,omitempty"`
+	BeforeStamp int64                `json:"before_stamp,omitempty"`
+}
+
+// StoreStats is a point-in-time view of the response store, used to size the
+// storage limits.
+type StoreStats struct {
+	Entries         int64  `json:"entries"`
+	Bytes           int64  `json:"bytes"`
+	MaxEntries      int    `json:"max_entries"`
+	MaxBytes        int64  `json:"max_bytes"`
+	EvictedCapacity uint64 `json:"evicted_capacity"`
+	EvictedExpired  uint64 `json:"evicted_expired"`
+}
+
+// storeOptions bounds the memory used by a shardedStore. Zero values mean
+// unlimited.
+type storeOptions struct {
+	Shards        int
+	MaxEntries    int
+	MaxBytes      int64
+	TTL           time.Duration
+	SweepInterval time.Duration
+}
+
+func storeOptionsFromConfig(c cfg.StorageConfig) storeOptions {
+	return storeOptions{
+		MaxEntries:    c.MaxEntries,
+		MaxBytes:      c.MaxBytes,
+		TTL:           time.Duration(c.TTLSeconds) * time.Second,
+		SweepInterval: time.Duration(c.SweepIntervalSeconds) * time.Second,
+	}
+}
+
+type storedResponse struct {
+	resp       *ResponsesResponse
+	turn       *historyNode
+	size       int64
+	lastAccess atomic.Int64 // unix nanos
+
+	// intrusive LRU list, most recently used at the shard's head
+	prev, next *storedResponse
+	// intrusive insertion-order list across the store, for List; guarded
+	// by the store's orderMu
+	older, newer *storedResponse
+	listed       bool
+	// stamp is when the entry joined that list in unix nanos, made
+	// strictly increasing so it orders the list
+	stamp int64
+}
+
+type storeShard struct {
+	mu      sync.Mutex
+	entries map[string]*storedResponse
+	head    *storedResponse
+	tail    *storedResponse
+	// pad shards apart so neighbouring locks don't share a cache line
+	_ [32]byte
+}
+
+// shardedStore is a lock-striped ResponseStore: IDs are hashed onto a fixed
+// number of shards, each guarded by its own mutex, so concurrent writers
+// only contend when they land on the same shard.
+//
+// Each shard keeps its entries in LRU order. Entry and byte limits are
+// enforced globally, but the eviction order is only approximately LRU: see
+// evict. Entries idle for longer than the TTL are dropped lazily on access
+// and by a background sweeper.
+//
+// Every entry is also linked into one insertion-ordered list, so List
+// walks only the page it returns, from either end or from a cursor found
+// through its shard. A cursor given as a stamp is found by binary search in
+// index, which holds the entries in stamp order. The list and index have a
+// lock of their own, taken after a shard's and held only to link, unlink,
+// seek or walk a page.
+type shardedStore struct {
+	shards []storeShard
+	mask   uint32
+	opts   storeOptions
+
+	orderMu        sync.Mutex
+	oldest, newest *storedResponse
+	lastStamp      int64
+	// index is append-only in stamp order; removed entries stay in it,
+	// unlisted, until they are trimmed from the front or compacted away
+	// once they are half of it
+	index []*storedResponse
+	dead  int
+
+	entries         atomic.Int64
+	bytes           atomic.Int64
+	evictedCapacity atomic.Uint64
+	evictedExpired  atomic.Uint64
+
+	stop     chan struct{}
+	stopOnce sync.Once
+}
+
+// defaultShardCount returns a power of two comfortably above the number of
+// cores so that contention stays low as GOMAXPROCS grows.
+func defaultShardCount() int {
+	n := 1
+	for n < runtime.GOMAXPROCS(0)*4 {
+		n <<= 1
+	}
+	if n < 16 {
+		n = 16
+	}
+	return n
+}
+
+func newShardedStore(opts storeOptions) *shardedStore {
+	shardCount := opts.Shards
+	if shardCount <= 0 {
+		shardCount = defaultShardCount()
+	}
+	// round up to a power of two so the shard index is a simple mask
+	n := 1
+	for n < shardCount {
+		n <<= 1
+	}
+	s := &shardedStore{shards: make([]storeShard, n), mask: uint32(n - 1), opts: opts, stop: make(chan struct{})}
+	for i := range s.shards {
+		s.shards[i].entries = make(map[string]*storedResponse)
+	}
+	if opts.TTL > 0 {
+		interval := opts.SweepInterval
+		if interval <= 0 {
+			interval = opts.TTL / 2
+		}
+		if interval < time.Second {
+			interval = time.Second
+		}
+		go s.sweepLoop(interval)
+	}
+	return s
+}
+
+func (s *shardedStore) shardFor(id string) (int, *storeShard) {
+	i := int(fnv32a(id) & s.mask)
+	return i, &s.shards[i]
+}
+
+// fnv32a hashes a string without the allocation of hash/fnv.
+func fnv32a(s string) uint32 {
+	h := uint32(2166136261)
+	for i := 0; i < len(s); i++ {
+		h ^= uint32(s[i])
+		h *= 16777619
+	}
+	return h
+}
+
+// entrySize estimates the heap footprint of a stored response, excluding its
+// history: turns are shared between forks, so they are charged by retain.
+func entrySize(resp *ResponsesResponse) int64 {
+	const fixedOverhead = 256
+	n := int64(fixedOverhead + len(resp.ID) + len(resp.Model))
+	for _, o := range resp.Output {
+		n += int64(64 + len(o.ID) + len(o.Type) + len(o.Status))
+		for _, c := range o.Content {
+			n += int64(48 + len(c.Type) + len(c.Text))
+			for _, a := range c.Annotations {
+				n += int64(48 + len(a.Title) + len(a.Type) + len(a.URL))
+			}
+		}
+	}
+	return n
+}
+
+// retain charges turn to the store when it gains its first reference, along
+// with the ancestors that reference makes reachable. A turn whose entry was
+// evicted is charged again if it is continued from afterwards.
+func (s *shardedStore) retain(turn *historyNode) {
+	for n := turn; n != nil && n.refs.Add(1) == 1; n = n.parent {
+		s.bytes.Add(n.size())
+	}
+}
+
+// release drops a reference to turn. Once nothing retains a turn its bytes
+// are returned and its parent loses a reference in turn, so evicting the last
+// response of a conversation frees the whole chain.
+func (s *shardedStore) release(turn *historyNode) {
+	for n := turn; n != nil && n.refs.Add(-1) == 0; n = n.parent {
+		s.bytes.Add(-n.size())
+	}
+}
+
+// Shard list helpers; callers hold sh.mu.
+
+func (sh *storeShard) unlink(e *storedResponse) {
+	if e.prev != nil {
+		e.prev.next = e.next
+	} else {
+		sh.head = e.next
+	}
+	if e.next != nil {
+		e.next.prev = e.prev
+	} else {
+		sh.tail = e.prev
+	}
+	e.prev, e.next = nil, nil
+}
+
+func (sh *storeShard) pushFront(e *storedResponse) {
+	e.next = sh.head
+	if sh.head != nil {
+		sh.head.prev = e
+	}
+	sh.head = e
+	if sh.tail == nil {
+		sh.tail = e
+	}
+}
+
+// Insertion-order list helpers; callers hold the entry's shard lock.
+
+func (s *shardedStore) appendOrder(e *storedResponse) {
+	s.orderMu.Lock()
+	e.older = s.newest
+	if s.newest != nil {
+		s.newest.newer = e
+	} else {
+		s.oldest = e
+	}
+	s.newest = e
+	e.listed = true
+	e.stamp = max(time.Now().UnixNano(), s.lastStamp+1)
+	s.lastStamp = e.stamp
+	s.index = append(s.index, e)
+	s.orderMu.Unlock()
+}
+
+func (s *shardedStore) unlinkOrder(e *storedResponse) {
+	s.orderMu.Lock()
+	if e.older != nil {
+		e.older.newer = e.newer
+	} else {
+		s.oldest = e.newer
+	}
+	if e.newer != nil {
+		e.newer.older = e.older
+	} else {
+		s.newest = e.older
+	}
+	e.older, e.newer = nil, nil
+	e.listed = false
+	s.dead++
+	// eviction and expiry mostly take the oldest entries: trim them now,
+	// and compact whatever else has built up
+	for len(s.index) > 0 && !s.index[0].listed {
+		s.index[0] = nil
+		s.index = s.index[1:]
+		s.dead--
+	}
+	if s.dead > len(s.index)/2 {
+		live := make([]*storedResponse, 0, 2*(len(s.index)-s.dead))
+		for _, x := range s.index {
+			if x.listed {
+				live = append(live, x)
+			}
+		}
+		s.index, s.dead = live, 0
+	}
+	s.orderMu.Unlock()
+}
+
+// seek returns the first listed entry newer than stamp, or older than it
+// with older; callers hold orderMu. The binary search lands next to the
+// bound and only steps over entries removed since the last compaction.
+func (s *shardedStore) seek(stamp int64, older bool) *storedResponse {
+	if older {
+		for i := sort.Search(len(s.index), func(i int) bool { return s.index[i].stamp >= stamp }) - 1; i >= 0; i-- {
+			if s.index[i].listed {
+				return s.index[i]
+			}
+		}
+		return nil
+	}
+	for i := sort.Search(len(s.index), func(i int) bool { return s.index[i].stamp > stamp }); i < len(s.index); i++ {
+		if s.index[i].listed {
+			return s.index[i]
+		}
+	}
+	return nil
+}
+
+func (s *shardedStore) removeLocked(sh *storeShard, e *storedResponse) {
+	sh.unlink(e)
+	s.unlinkOrder(e)
+	delete(sh.entries, e.resp.ID)
+	s.entries.Add(-1)
+	s.bytes.Add(-e.size)
+	s.release(e.turn)
+}
+
+func (s *shardedStore) expired(e *storedResponse, now int64) bool {
+	return s.opts.TTL > 0 && now-e.lastAccess.Load() > int64(s.opts.TTL)
+}
+
+func (s *shardedStore) overLimit() bool {
+	if s.opts.MaxEntries > 0 && s.entries.Load() > int64(s.opts.MaxEntries) {
+		return true
+	}
+	return s.opts.MaxBytes > 0 && s.bytes.Load() > s.opts.MaxBytes
+}
+
+func (s *shardedStore) Put(resp *ResponsesResponse, turn *historyNode) {
+	e := &storedResponse{resp: resp, turn: turn, size: entrySize(resp)}
+	e.lastAccess.Store(time.Now().UnixNano())
+	idx, sh := s.shardFor(resp.ID)
+	sh.mu.Lock()
+	if old, ok := sh.entries[resp.ID]; ok {
+		s.removeLocked(sh, old)
+	}
+	sh.entries[resp.ID] = e
+	sh.pushFront(e)
+	s.appendOrder(e)
+	s.entries.Add(1)
+	s.bytes.Add(e.size)
+	s.retain(turn)
+	sh.mu.Unlock()
+
+	if s.overLimit() {
+		s.evict(idx, e)
+	}
+}
+
+// evict drops entries until the store is back under its limits. There is no
+// global LRU order, only one per shard: shards are visited in turn from the
+// one just written, each giving up its least recently used entries, so the
+// shard that was written loses its oldest entries first. The entry that
+// triggered the eviction goes last, only if the store is still over its
+// limits without any other entry in its shard.
+func (s *shardedStore) evict(start int, keep *storedResponse) {
+	for i := 0; i < len(s.shards) && s.overLimit(); i++ {
+		sh := &s.shards[(start+i)&int(s.mask)]
+		sh.mu.Lock()
+		for sh.tail != nil && sh.tail != keep && s.overLimit() {
+			s.removeLocked(sh, sh.tail)
+			s.evictedCapacity.Add(1)
+		}
+		sh.mu.Unlock()
+	}
+	sh := &s.shards[start]
+	sh.mu.Lock()
+	if s.overLimit() && sh.entries[keep.resp.ID] == keep {
+		s.removeLocked(sh, keep)
+		s.evictedCapacity.Add(1)
+	}
+	sh.mu.Unlock()
+}
+
+// lookup returns a live entry and marks it as most recently used.
+func (s *shardedStore) lookup(id string) (*storedResponse, bool) {
+	_, sh := s.shardFor(id)
+	now := time.Now().UnixNano()
+	sh.mu.Lock()
+	defer sh.mu.Unlock()
+	e, ok := sh.entries[id]
+	if !ok {
+		return nil, false
+	}
+	if s.expired(e, now) {
+		s.removeLocked(sh, e)
+		s.evictedExpired.Add(1)
+		return nil, false
+	}
+	e.lastAccess.Store(now)
+	if sh.head != e {
+		sh.unlink(e)
+		sh.pushFront(e)
+	}
+	return e, true
+}
+
+func (s *shardedStore) Get(id string) (*ResponsesResponse, bool) {
+	e, ok := s.lookup(id)
+	if !ok {
+		return nil, false
+	}
+	return e.resp, true
+}
+
+func (s *shardedStore) History(id string) (*historyNode, bool) {
+	e, ok := s.lookup(id)
+	if !ok {
+		return nil, false
+	}
+	return e.turn, true
+}
+
+// List walks the insertion-order list from an end or a cursor, found next to
+// its entry or by seek for a stamp, so a page costs its own length (plus
+// any expired entries not yet swept and a binary search) whatever the size
+// of the store.
+func (s *shardedStore) List(opts ListOptions) (ListPage, error) {
+	after, err := s.cursor(opts.After)
+	if err != nil {
+		return ListPage{}, fmt.Errorf("after: %w", err)
+	}
+	before, err := s.cursor(opts.Before)
+	if err != nil {
+		return ListPage{}, fmt.Errorf("before: %w", err)
+	}
+	page := ListPage{Data: make([]*ResponsesResponse, 0, opts.Limit), Stamps: make([]int64, 0, opts.Limit)}
+	now := time.Now().UnixNano()
+
+	s.orderMu.Lock()
+	defer s.orderMu.Unlock()
+	if after != nil && !after.listed || before != nil && !before.listed {
+		return ListPage{}, errors.New("cursor response was just evicted")
+	}
+	if after != nil {
+		opts.AfterStamp = after.stamp
+	}
+	if before != nil {
+		opts.BeforeStamp = before.stamp
+	}
+	page.AfterStamp, page.BeforeStamp = opts.AfterStamp, opts.BeforeStamp
+	// step moves one response on in the listing order, or back with back
+	step := func(e *storedResponse, back bool) *storedResponse {
+		if opts.Desc != back {
+			return e.older
+		}
+		return e.newer
+	}
+	// ahead reports whether stamp a lists before stamp b
+	ahead := func(a, b int64) bool {
+		if opts.Desc {
+			return a > b
+		}
+		return a < b
+	}
+	// from returns the first response past a cursor (ahead of it with
+	// back): next to its entry when the store holds it, or sought by stamp
+	from := func(cur *storedResponse, stamp int64, back bool) *storedResponse {
+		if cur != nil {
+			return step(cur, back)
+		}
+		return s.seek(stamp, opts.Desc != back)
+	}
+	// collect reads responses from e up to, not including, stop (0: the
+	// end of the list)
+	collect := func(e *storedResponse, stop int64, back bool) {
+		for ; e != nil && (stop == 0 || ahead(e.stamp, stop)); e = step(e, back) {
+			if s.expired(e, now) {
+				continue
+			}
+			if len(page.Data) == opts.Limit {
+				page.HasMore = true
+				return
+			}
+			page.Data = append(page.Data, e.resp)
+			page.Stamps = append(page.Stamps, e.stamp)
+		}
+	}
+
+	switch {
+	case opts.AfterStamp != 0:
+		collect(from(after, opts.AfterStamp, false), opts.BeforeStamp, false)
+	case opts.BeforeStamp != 0:
+		// the page just ahead of before: read it backwards, then flip it
+		collect(from(before, opts.BeforeStamp, true), 0, true)
+		for i, j := 0, len(page.Data)-1; i < j; i, j = i+1, j-1 {
+			page.Data[i], page.Data[j] = page.Data[j], page.Data[i]
+			page.Stamps[i], page.Stamps[j] = page.Stamps[j], page.Stamps[i]
+		}
+	case opts.Desc:
+		collect(s.newest, 0, false)
+	default:
+		collect(s.oldest, 0, false)
+	}
+	return page, nil
+}
+
+// cursor finds the entry for a List cursor without touching its LRU
+// position; an empty id is no cursor.
+func (s *shardedStore) cursor(id string) (*storedResponse, error) {
+	if id == "" {
+		return nil, nil
+	}
+	_, sh := s.shardFor(id)
+	sh.mu.Lock()
+	e, ok := sh.entries[id]
+	sh.mu.Unlock()
+	if !ok {
+		return nil, fmt.Errorf("no stored response %q", id)
+	}
+	return e, nil
+}
+
+// Len returns the number of stored responses.
+func (s *shardedStore) Len() int {
+	return int(s.entries.Load())
+}
+
+func (s *shardedStore) Stats() StoreStats {
+	return StoreStats{
+		Entries:         s.entries.Load(),
+		Bytes:           s.bytes.Load(),
+		MaxEntries:      s.opts.MaxEntries,
+		MaxBytes:        s.opts.MaxBytes,
+		EvictedCapacity: s.evictedCapacity.Load(),
+		EvictedExpired:  s.evictedExpired.Load(),
+	}
+}
+
+// sweepExpired drops idle entries. Shards are in LRU order, so each shard is
+// walked from its tail and the walk stops at the first live entry.
+func (s *shardedStore) sweepExpired() {
+	now := time.Now().UnixNano()
+	for i := range s.shards {
+		sh := &s.shards[i]
+		sh.mu.Lock()
+		for sh.tail != nil && s.expired(sh.tail, now) {
+			s.removeLocked(sh, sh.tail)
+			s.evictedExpired.Add(1)
+		}
+		sh.mu.Unlock()
+	}
+}
+
+func (s *shardedStore) sweepLoop(interval time.Duration) {
+	t := time.NewTicker(interval)
+	defer t.Stop()
+	for {
+		select {
+		case <-t.C:
+			s.sweepExpired()
+		case <-s.stop:
+			return
+		}
+	}
+}
+
+// Close stops the background sweeper.
+func (s *shardedStore) Close() {
+	s.stopOnce.Do(func() { close(s.stop) })
+}
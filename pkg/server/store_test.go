@@ -0,0 +1,431 @@
+package server
+
+import (
+	"bytes"
+	"encoding/json"
+	"fmt"
+	"net/http"
+	"net/http/httptest"
+	"runtime"
+	"strconv"
+	"strings"
+	"sync"
+	"sync/atomic"
+	"testing"
+	"time"
+)
+
+func TestShardedStoreConcurrentAccess(t *testing.T) {
+	s := newShardedStore(storeOptions{})
+	const workers = 32
+	const perWorker = 500
+
+	var wg sync.WaitGroup
+	for w := 0; w < workers; w++ {
+		wg.Add(1)
+		go func(w int) {
+			defer wg.Done()
+			for i := 0; i < perWorker; i++ {
+				id := fmt.Sprintf("resp_%d_%d", w, i)
+				s.Put(&ResponsesResponse{ID: id}, newHistoryNode(nil, "in", "out", 2))
+				if _, ok := s.Get(id); !ok {
+					t.Errorf("missing %s right after Put", id)
+					return
+				}
+				if h, ok := s.History(id); !ok || len(texts(h)) != 2 {
+					t.Errorf("bad history for %s: %v", id, texts(h))
+					return
+				}
+				_, _ = s.List(ListOptions{Limit: 10})
+			}
+		}(w)
+	}
+	wg.Wait()
+
+	if got := s.Len(); got != workers*perWorker {
+		t.Fatalf("expected %d entries, got %d", workers*perWorker, got)
+	}
+	if page, _ := s.List(ListOptions{Limit: 25}); len(page.Data) != 25 {
+		t.Fatalf("expected List to honour limit 25, got %d", len(page.Data))
+	}
+}
+
+func TestShardedStoreEvictsLeastRecentlyUsed(t *testing.T) {
+	// a single shard makes the LRU order global and easy to assert on
+	s := newShardedStore(storeOptions{Shards: 1, MaxEntries: 3})
+	for _, id := range []string{"a", "b", "c"} {
+		s.Put(&ResponsesResponse{ID: id}, nil)
+	}
+	s.Get("a") // a is now the most recently used
+	s.Put(&ResponsesResponse{ID: "d"}, nil)
+
+	if _, ok := s.Get("b"); ok {
+		t.Fatal("expected b to be evicted")
+	}
+	for _, id := range []string{"a", "c", "d"} {
+		if _, ok := s.Get(id); !ok {
+			t.Fatalf("expected %s to survive", id)
+		}
+	}
+	if st := s.Stats(); st.Entries != 3 || st.EvictedCapacity != 1 {
+		t.Fatalf("unexpected stats %+v", st)
+	}
+}
+
+func TestShardedStoreBoundsMemory(t *testing.T) {
+	s := newShardedStore(storeOptions{MaxEntries: 1000, MaxBytes: 256 << 10})
+	text := string(bytes.Repeat([]byte("x"), 512))
+	for i := 0; i < 50000; i++ {
+		resp := &ResponsesResponse{ID: "resp_" + strconv.Itoa(i), Output: []OutputObject{{Content: []ContentObject{{Text: text}}}}}
+		s.Put(resp, newHistoryNode(nil, "input", text, 1+countWords(text)))
+	}
+	st := s.Stats()
+	if st.Entries > 1000 || st.Bytes > 256<<10 {
+		t.Fatalf("store exceeded its limits: %+v", st)
+	}
+	if st.EvictedCapacity == 0 {
+		t.Fatal("expected capacity evictions")
+	}
+}
+
+func TestShardedStoreEvictsOversizedEntry(t *testing.T) {
+	s := newShardedStore(storeOptions{MaxBytes: 4 << 10})
+	s.Put(&ResponsesResponse{ID: "small"}, nil)
+	big := &ResponsesResponse{ID: "big", Output: []OutputObject{{Content: []ContentObject{{Text: strings.Repeat("x", 8<<10)}}}}}
+	s.Put(big, nil)
+	if _, ok := s.Get("big"); ok {
+		t.Fatal("a response larger than max_bytes was kept")
+	}
+	if st := s.Stats(); st.Entries != 0 || st.Bytes != 0 || st.EvictedCapacity != 2 {
+		t.Fatalf("unexpected stats %+v", st)
+	}
+}
+
+// TestShardedStoreChargesRetainedHistory evicts the parents of a long
+// conversation and checks the store still accounts for the turns the newest
+// responses keep reachable, and releases them with the last one.
+func TestShardedStoreChargesRetainedHistory(t *testing.T) {
+	s := newShardedStore(storeOptions{Shards: 1, MaxEntries: 2})
+	text := strings.Repeat("x", 4096)
+
+	var before runtime.MemStats
+	runtime.GC()
+	runtime.ReadMemStats(&before)
+	var turn *historyNode
+	for i := 0; i < 200; i++ {
+		// fresh strings, so each turn really owns its text
+		turn = newHistoryNode(turn, "input "+strconv.Itoa(i), text+strconv.Itoa(i), 2)
+		s.Put(&ResponsesResponse{ID: "resp_" + strconv.Itoa(i)}, turn)
+	}
+	var after runtime.MemStats
+	runtime.GC()
+	runtime.ReadMemStats(&after)
+
+	// what the stored entries keep alive: themselves and every ancestor
+	want := int64(0)
+	seen := map[*historyNode]bool{}
+	for _, id := range []string{"resp_198", "resp_199"} {
+		h, ok := s.History(id)
+		if !ok {
+			t.Fatalf("%s was evicted", id)
+		}
+		want += entrySize(&ResponsesResponse{ID: id})
+		for n := h; n != nil && !seen[n]; n = n.parent {
+			seen[n] = true
+			want += n.size()
+		}
+	}
+	if got := s.Stats().Bytes; got != want {
+		t.Fatalf("accounted %d bytes, the live entries retain %d", got, want)
+	}
+	if heap := int64(after.HeapAlloc) - int64(before.HeapAlloc); want < heap/2 {
+		t.Fatalf("accounted %d bytes, but the chain grew the heap by %d", want, heap)
+	}
+	runtime.KeepAlive(turn)
+
+	s.Put(&ResponsesResponse{ID: "a"}, nil)
+	s.Put(&ResponsesResponse{ID: "b"}, nil)
+	if got, want := s.Stats().Bytes, entrySize(&ResponsesResponse{ID: "a"})+entrySize(&ResponsesResponse{ID: "b"}); got != want {
+		t.Fatalf("after evicting the conversation: %d bytes, want %d", got, want)
+	}
+}
+
+func TestShardedStoreExpiresIdleEntries(t *testing.T) {
+	s := newShardedStore(storeOptions{TTL: time.Hour})
+	defer s.Close()
+	s.Put(&ResponsesResponse{ID: "old"}, nil)
+	s.Put(&ResponsesResponse{ID: "fresh"}, nil)
+
+	// age "old" past the TTL without sleeping
+	_, sh := s.shardFor("old")
+	sh.mu.Lock()
+	sh.entries["old"].lastAccess.Add(-int64(2 * time.Hour))
+	sh.mu.Unlock()
+
+	s.sweepExpired()
+	if _, ok := s.Get("old"); ok {
+		t.Fatal("expected idle entry to be swept")
+	}
+	if _, ok := s.Get("fresh"); !ok {
+		t.Fatal("expected fresh entry to survive the sweep")
+	}
+	if st := s.Stats(); st.EvictedExpired != 1 || st.Entries != 1 {
+		t.Fatalf("unexpected stats %+v", st)
+	}
+}
+
+func TestResponsesCreateConcurrent(t *testing.T) {
+	prev := responseStore
+	responseStore = newShardedStore(storeOptions{})
+	defer func() { responseStore = prev }()
+
+	var wg sync.WaitGroup
+	var failures int32
+	for i := 0; i < 200; i++ {
+		wg.Add(1)
+		go func(i int) {
+			defer wg.Done()
+			body := []byte(`{"model":"gpt-4o","input":"hello ` + strconv.Itoa(i) + `"}`)
+			rec := httptest.NewRecorder()
+			handleResponsesCreate(rec, httptest.NewRequest(http.MethodPost, "/v1/responses", bytes.NewReader(body)))
+			if rec.Code != http.StatusOK {
+				atomic.AddInt32(&failures, 1)
+			}
+			rec = httptest.NewRecorder()
+			handleResponsesList(rec, httptest.NewRequest(http.MethodGet, "/v1/responses?limit=5", nil))
+		}(i)
+	}
+	wg.Wait()
+	if failures > 0 {
+		t.Fatalf("%d concurrent creates failed", failures)
+	}
+}
+
+func TestShardedStoreListPages(t *testing.T) {
+	// one shard makes capacity evictions take the oldest entries
+	s := newShardedStore(storeOptions{Shards: 1, MaxEntries: 10})
+	for i := 0; i < 12; i++ {
+		s.Put(&ResponsesResponse{ID: fmt.Sprintf("r%02d", i)}, nil)
+	}
+	s.Get("r02") // reads do not reorder the listing
+	// cursor stamps, which another worker would list by
+	all, _ := s.List(ListOptions{Limit: 10})
+	stamps := map[string]int64{}
+	for i, r := range all.Data {
+		stamps[r.ID] = all.Stamps[i]
+	}
+
+	for _, tc := range []struct {
+		opts    ListOptions
+		want    string
+		hasMore bool
+	}{
+		{ListOptions{Limit: 4}, "r02 r03 r04 r05", true},
+		{ListOptions{Limit: 4, After: "r05"}, "r06 r07 r08 r09", true},
+		{ListOptions{Limit: 4, After: "r09"}, "r10 r11", false},
+		{ListOptions{Limit: 3, Desc: true}, "r11 r10 r09", true},
+		{ListOptions{Limit: 3, Desc: true, After: "r04"}, "r03 r02", false},
+		{ListOptions{Limit: 2, Before: "r05"}, "r03 r04", true},
+		{ListOptions{Limit: 2, Desc: true, Before: "r05"}, "r07 r06", true},
+		{ListOptions{Limit: 9, After: "r03", Before: "r07"}, "r04 r05 r06", false},
+	} {
+		byStamp := tc.opts
+		byStamp.After, byStamp.Before = "", ""
+		byStamp.AfterStamp, byStamp.BeforeStamp = stamps[tc.opts.After], stamps[tc.opts.Before]
+		for _, opts := range []ListOptions{tc.opts, byStamp} {
+			page, err := s.List(opts)
+			if err != nil {
+				t.Fatalf("%+v: %v", opts, err)
+			}
+			var ids []string
+			for _, r := range page.Data {
+				ids = append(ids, r.ID)
+			}
+			if got := strings.Join(ids, " "); got != tc.want || page.HasMore != tc.hasMore {
+				t.Errorf("%+v: got %q has_more=%v, want %q has_more=%v", opts, got, page.HasMore, tc.want, tc.hasMore)
+			}
+		}
+	}
+	if _, err := s.List(ListOptions{Limit: 4, After: "r00"}); err == nil {
+		t.Fatal("an evicted cursor should be an error")
+	}
+}
+
+// TestShardedStoreSeek lists from stamps the store no longer holds, with
+// removed entries both at the front of the index and inside it.
+func TestShardedStoreSeek(t *testing.T) {
+	s := newShardedStore(storeOptions{MaxEntries: 50})
+	for i := 0; i < 1000; i++ {
+		s.Put(&ResponsesResponse{ID: fmt.Sprintf("r%03d", i)}, nil)
+	}
+	all, _ := s.List(ListOptions{Limit: 100})
+	if len(all.Data) != 50 || len(s.index) > 100 {
+		t.Fatalf("%d listed, index holds %d", len(all.Data), len(s.index))
+	}
+	// re-storing responses leaves their old entries dead inside the index
+	for _, r := range all.Data[10:20] {
+		s.Put(&ResponsesResponse{ID: r.ID}, nil)
+	}
+	ids := func(page ListPage) string {
+		var ids []string
+		for _, r := range page.Data {
+			ids = append(ids, r.ID)
+		}
+		return strings.Join(ids, " ")
+	}
+	for _, tc := range []struct {
+		opts ListOptions
+		want string
+	}{
+		{ListOptions{Limit: 2, AfterStamp: all.Stamps[12]}, all.Data[20].ID + " " + all.Data[21].ID},
+		{ListOptions{Limit: 2, BeforeStamp: all.Stamps[15]}, all.Data[8].ID + " " + all.Data[9].ID},
+		{ListOptions{Limit: 2, Desc: true, AfterStamp: all.Stamps[15]}, all.Data[9].ID + " " + all.Data[8].ID},
+		{ListOptions{Limit: 1, AfterStamp: 1}, all.Data[0].ID},
+		{ListOptions{Limit: 1, Desc: true, AfterStamp: 1}, ""},
+	} {
+		page, err := s.List(tc.opts)
+		if err != nil {
+			t.Fatal(err)
+		}
+		if got := ids(page); got != tc.want {
+			t.Errorf("%+v: got %q, want %q", tc.opts, got, tc.want)
+		}
+	}
+}
+
+func TestResponsesListEnvelope(t *testing.T) {
+	prev := responseStore
+	responseStore = newShardedStore(storeOptions{})
+	defer func() { responseStore = prev }()
+	var created []string
+	for i := 0; i < 3; i++ {
+		rec := httptest.NewRecorder()
+		handleResponsesCreate(rec, httptest.NewRequest(http.MethodPost, "/v1/responses", strings.NewReader(`{"model":"gpt-4o","input":"hi"}`)))
+		var resp ResponsesResponse
+		if err := json.NewDecoder(rec.Body).Decode(&resp); err != nil {
+			t.Fatal(err)
+		}
+		created = append(created, resp.ID)
+	}
+
+	list := func(query string) (int, map[string]interface{}) {
+		rec := httptest.NewRecorder()
+		handleResponsesList(rec, httptest.NewRequest(http.MethodGet, "/v1/responses?"+query, nil))
+		var out map[string]interface{}
+		_ = json.NewDecoder(rec.Body).Decode(&out)
+		return rec.Code, out
+	}
+	_, out := list("limit=2&order=asc")
+	if out["first_id"] != created[0] || out["last_id"] != created[1] || out["has_more"] != true {
+		t.Fatalf("first page: %v", out)
+	}
+	_, out = list("limit=2&order=asc&after=" + created[1])
+	if out["first_id"] != created[2] || out["has_more"] != false {
+		t.Fatalf("second page: %v", out)
+	}
+	_, out = list("")
+	if data := out["data"].([]interface{}); len(data) != 3 || out["first_id"] != created[2] {
+		t.Fatalf("default page is not newest first: %v", out)
+	}
+	for _, bad := range []string{"limit=101", "limit=0", "order=sideways", "after=resp_missing"} {
+		if code, _ := list(bad); code != http.StatusBadRequest {
+			t.Errorf("%s: status %d", bad, code)
+		}
+	}
+}
+
+// mutexStore is the single-lock baseline the sharded store is compared against.
+type mutexStore struct {
+	mu      sync.RWMutex
+	entries map[string]*storedResponse
+}
+
+func (s *mutexStore) Put(resp *ResponsesResponse, turn *historyNode) {
+	s.mu.Lock()
+	s.entries[resp.ID] = &storedResponse{resp: resp, turn: turn}
+	s.mu.Unlock()
+}
+
+func (s *mutexStore) Get(id string) (*ResponsesResponse, bool) {
+	s.mu.RLock()
+	e, ok := s.entries[id]
+	s.mu.RUnlock()
+	if !ok {
+		return nil, false
+	}
+	return e.resp, true
+}
+
+// benchStore is the subset of ResponseStore exercised by the benchmarks.
+type benchStore interface {
+	Put(*ResponsesResponse, *historyNode)
+	Get(string) (*ResponsesResponse, bool)
+}
+
+func benchmarkStore(b *testing.B, newStore func() benchStore) {
+	for _, procs := range []int{1, 2, 4, 8, 16} {
+		b.Run(fmt.Sprintf("procs=%d", procs), func(b *testing.B) {
+			defer runtime.GOMAXPROCS(runtime.GOMAXPROCS(procs))
+			s := newStore()
+			var seq uint64
+			b.ReportAllocs()
+			b.ResetTimer()
+			b.RunParallel(func(pb *testing.PB) {
+				for pb.Next() {
+					n := atomic.AddUint64(&seq, 1)
+					id := "resp_" + strconv.FormatUint(n, 10)
+					s.Put(&ResponsesResponse{ID: id}, nil)
+					// one write, three reads: follow-ups and retrieves dominate
+					for j := uint64(0); j < 3; j++ {
+						s.Get("resp_" + strconv.FormatUint(n-j, 10))
+					}
+				}
+			})
+		})
+	}
+}
+
+// Run with e.g. `go test -run x -bench Store ./pkg/server` to see throughput
+// as GOMAXPROCS grows.
+func BenchmarkShardedStore(b *testing.B) {
+	benchmarkStore(b, func() benchStore {
+		return newShardedStore(storeOptions{})
+	})
+}
+
+func BenchmarkSingleMutexStore(b *testing.B) {
+	benchmarkStore(b, func() benchStore {
+		return &mutexStore{entries: map[string]*storedResponse{}}
+	})
+}
+
+// BenchmarkStoreList pages through stores of growing size from a cursor in
+// the middle, given by ID or (as in worker mode) by stamp; the cost per page
+// should not grow with the store.
+func BenchmarkStoreList(b *testing.B) {
+	for _, size := range []int{1000, 100000} {
+		s := newShardedStore(storeOptions{})
+		for i := 0; i < size; i++ {
+			s.Put(&ResponsesResponse{ID: "resp_" + strconv.Itoa(i)}, nil)
+		}
+		mid, _ := s.List(ListOptions{Limit: 1, Before: "resp_" + strconv.Itoa(size/2+1)})
+		for _, opts := range []ListOptions{
+			{Limit: 20, After: "resp_" + strconv.Itoa(size/2)},
+			{Limit: 20, AfterStamp: mid.Stamps[0]},
+		} {
+			cursor := "id"
+			if opts.AfterStamp != 0 {
+				cursor = "stamp"
+			}
+			b.Run(fmt.Sprintf("entries=%d/%s", size, cursor), func(b *testing.B) {
+				b.ReportAllocs()
+				b.ResetTimer()
+				for i := 0; i < b.N; i++ {
+					if _, err := s.List(opts); err != nil {
+						b.Fatal(err)
+					}
+				}
+			})
+		}
+	}
+}
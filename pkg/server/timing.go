@@ -0,0 +1,121 @@
+package server
+
+import (
+	"bytes"
+	"encoding/json"
+	"io"
+	"net/http"
+	"strconv"
+	"time"
+
+	cfg "mock-openai-server/pkg/server/config"
+)
+
+// phase is a step of request handling reported in the Server-Timing header.
+type phase uint8
+
+const (
+	phaseDecode phase = iota // request JSON decode
+	phaseInput               // extracting the text rules match on
+	phaseRules               // EvaluateRules and pacing lookup
+	phaseTools               // tool output aggregation
+	phaseRender              // template rendering and built-in replies
+	phaseUsage               // token counting
+	phaseWait                // latency profile hold (non-streaming)
+	phaseStore               // Responses API store write
+	phaseEncode              // response JSON encode
+	phaseStream              // paced SSE frames (streaming)
+	numPhases
+)
+
+var phaseNames = [numPhases]string{"decode", "input", "rules", "tools", "render", "usage", "wait", "store", "encode", "stream"}
+
+// serverTiming accumulates the time spent in each phase of a request. A
+// nil *serverTiming, which is what requests get unless
+// server.server_timing is on, ignores every call.
+type serverTiming struct {
+	last time.Time
+	dur  [numPhases]time.Duration
+	seen uint16 // phases marked at least once
+}
+
+func newServerTiming(conf *cfg.BotConfig, start time.Time) *serverTiming {
+	if conf == nil || !conf.Server.ServerTiming {
+		return nil
+	}
+	return &serverTiming{last: start}
+}
+
+// mark ends phase p: the time since the previous mark is charged to it.
+func (t *serverTiming) mark(p phase) {
+	if t == nil {
+		return
+	}
+	now := time.Now()
+	t.dur[p] += now.Sub(t.last)
+	t.last = now
+	t.seen |= 1 << p
+}
+
+// String renders the phases as a Server-Timing value, durations in
+// milliseconds: "decode;dur=0.012, rules;dur=0.004, total;dur=0.016".
+func (t *serverTiming) String() string {
+	b := make([]byte, 0, 160)
+	var total time.Duration
+	for p := phase(0); p < numPhases; p++ {
+		if t.seen&(1<<p) == 0 {
+			continue
+		}
+		b = appendTiming(b, phaseNames[p], t.dur[p])
+		b = append(b, ", "...)
+		total += t.dur[p]
+	}
+	return string(appendTiming(b, "total", total))
+}
+
+func appendTiming(b []byte, name string, d time.Duration) []byte {
+	b = append(b, name...)
+	b = append(b, ";dur="...)
+	return strconv.AppendFloat(b, float64(d)/float64(time.Millisecond), 'f', 3, 64)
+}
+
+// setHeader adds the Server-Timing header; call it before the response
+// header is written.
+func (t *serverTiming) setHeader(w http.ResponseWriter) {
+	if t == nil {
+		return
+	}
+	w.Header().Set("Server-Timing", t.String())
+}
+
+// writeComment ends a stream with the full breakdown as an SSE comment,
+// since its header went out before the stream started.
+func (t *serverTiming) writeComment(w io.Writer) {
+	if t == nil {
+		return
+	}
+	_, _ = io.WriteString(w, ": server-timing "+t.String()+"\n\n")
+}
+
+// writeJSON writes v as the JSON response with the given status. With
+// timing on the body is encoded first, so the encode phase can make it into
+// the header.
+func (t *serverTiming) writeJSON(w http.ResponseWriter, status int, v interface{}) {
+	w.Header().Set("Content-Type", "application/json")
+	if t == nil {
+		w.WriteHeader(status)
+		if err := json.NewEncoder(w).Encode(v); err != nil {
+			http.Error(w, err.Error(), http.StatusInternalServerError)
+		}
+		return
+	}
+	var buf bytes.Buffer
+	if err := json.NewEncoder(&buf).Encode(v); err != nil {
+		http.Error(w, err.Error(), http.StatusInternalServerError)
+		return
+	}
+	t.mark(phaseEncode)
+	t.setHeader(w)
+	w.WriteHeader(status)
+	_, _ = w.Write(buf.Bytes())
+}
@@ -0,0 +1,66 @@
+package server
+
+import (
+	"net/http"
+	"net/http/httptest"
+	"strings"
+	"testing"
+
+	cfg "mock-openai-server/pkg/server/config"
+)
+
+func TestServerTiming(t *testing.T) {
+	noDelay := 0
+	conf := &cfg.BotConfig{
+		Streaming: cfg.StreamingConfig{ChunkDelayMs: &noDelay},
+		Rules: []cfg.Rule{{
+			Match:   cfg.Match{Contains: []string{"hello"}},
+			Respond: cfg.RespondWrapper{Text: "Hi {{model}}."},
+		}},
+	}
+	if err := conf.Compile(); err != nil {
+		t.Fatal(err)
+	}
+	prev := cfg.Get()
+	cfg.Set(conf)
+	defer cfg.Set(prev)
+
+	post := func(handler http.HandlerFunc, body string) *httptest.ResponseRecorder {
+		rec := httptest.NewRecorder()
+		handler(rec, httptest.NewRequest(http.MethodPost, "/", strings.NewReader(body)))
+		return rec
+	}
+	chat := `{"model":"gpt-4o","messages":[{"role":"user","content":"hello"}]}`
+
+	if rec := post(handleChatCompletions, chat); rec.Header().Get("Server-Timing") != "" {
+		t.Fatal("Server-Timing sent while disabled")
+	}
+
+	conf.Server.ServerTiming = true
+	rec := post(handleChatCompletions, chat)
+	got := rec.Header().Get("Server-Timing")
+	for _, want := range []string{"decode;dur=", "input;dur=", "rules;dur=", "tools;dur=", "render;dur=", "usage;dur=", "encode;dur=", "total;dur="} {
+		if !strings.Contains(got, want) {
+			t.Errorf("chat Server-Timing %q lacks %q", got, want)
+		}
+	}
+	if !strings.Contains(rec.Body.String(), "Hi gpt-4o.") {
+		t.Fatalf("chat body %s", rec.Body)
+	}
+
+	rec = post(handleResponsesCreate, `{"model":"gpt-4o","input":"hello"}`)
+	if got := rec.Header().Get("Server-Timing"); !strings.Contains(got, "store;dur=") || !strings.Contains(got, "encode;dur=") {
+		t.Errorf("responses Server-Timing %q", got)
+	}
+
+	// streams send what they know up front and the rest in a trailing comment
+	rec = post(handleChatCompletions, `{"model":"gpt-4o","stream":true,"messages":[{"role":"user","content":"hello"}]}`)
+	if got := rec.Header().Get("Server-Timing"); !strings.Contains(got, "rules;dur=") || strings.Contains(got, "stream;dur=") {
+		t.Errorf("stream Server-Timing %q", got)
+	}
+	body := rec.Body.String()
+	last := body[strings.LastIndex(strings.TrimSuffix(body, "\n\n"), "\n\n")+2:]
+	if !strings.HasPrefix(last, ": server-timing decode;dur=") || !strings.Contains(last, "stream;dur=") {
+		t.Errorf("stream does not end with the timing comment: %q", last)
+	}
+}
@@ -0,0 +1,243 @@
+package tokenizer
+
+import (
+	"hash/maphash"
+	"math"
+	"strings"
+	"sync"
+)
+
+const noRank = math.MaxInt
+
+// largePiece is the length from which bytePairMerge switches from
+// rescanning every pair for each merge (quadratic, but fast for the short
+// pieces almost all text is made of) to a heap.
+const largePiece = 64
+
+// bytePairMerge splits piece into tokens the way tiktoken does: starting
+// from single bytes, repeatedly merge the adjacent pair whose concatenation
+// has the lowest rank (leftmost on ties) until no pair is in the
+// vocabulary. It returns the token boundaries, starting with 0 and ending
+// with len(piece).
+func (e *Encoding) bytePairMerge(piece string) []int {
+	if len(piece) >= largePiece {
+		return e.heapPairMerge(piece)
+	}
+	return e.scanPairMerge(piece)
+}
+
+// scanPairMerge is bytePairMerge finding each merge by scanning every pair.
+func (e *Encoding) scanPairMerge(piece string) []int {
+	// parts[i] is a boundary and ranks[i] the rank of the token that merging
+	// the two parts starting at parts[i] would make
+	parts := make([]int, len(piece)+1)
+	ranks := make([]int, len(piece)+1)
+	for i := range parts {
+		parts[i] = i
+		ranks[i] = noRank
+	}
+	for i := 0; i+2 <= len(piece); i++ {
+		ranks[i] = e.rank(piece[i : i+2])
+	}
+	// the rank of parts i and i+1 once they are one part, i.e. of the span
+	// up to parts[i+3] after removing parts[i+1]
+	rankAfter := func(i int) int {
+		if i+3 < len(parts) {
+			return e.rank(piece[parts[i]:parts[i+3]])
+		}
+		return noRank
+	}
+	for {
+		best, at := noRank, -1
+		for i, r := range ranks[:len(ranks)-1] {
+			if r < best {
+				best, at = r, i
+			}
+		}
+		if at < 0 {
+			return parts
+		}
+		if at > 0 {
+			ranks[at-1] = rankAfter(at - 1)
+		}
+		ranks[at] = rankAfter(at)
+		parts = append(parts[:at+1], parts[at+2:]...)
+		ranks = append(ranks[:at+1], ranks[at+2:]...)
+	}
+}
+
+// heapPairMerge is bytePairMerge in O(n log n) for long pieces (a run of
+// letters or punctuation with no spaces is a single piece, however long).
+// Parts are a linked list keyed by their start offset, and candidate merges
+// sit in a min-heap by rank and then offset; entries left stale by a merge
+// are skipped when they surface.
+func (e *Encoding) heapPairMerge(piece string) []int {
+	n := len(piece)
+	// next[i] and prev[i] are the neighbouring part starts of the part at i
+	// (n past the last, -1 before the first); rank[i] is the rank of
+	// merging it with the next part, and dead marks merged-away starts
+	next := make([]int, n)
+	prev := make([]int, n)
+	rank := make([]int, n)
+	dead := make([]bool, n)
+	h := make(mergeHeap, 0, n)
+	for i := 0; i < n; i++ {
+		next[i], prev[i], rank[i] = i+1, i-1, noRank
+		if i+2 <= n {
+			if rank[i] = e.rank(piece[i : i+2]); rank[i] != noRank {
+				h.push(mergeCandidate{rank[i], i})
+			}
+		}
+	}
+	// rankFrom recomputes the rank of merging the part at i with its next
+	rankFrom := func(i int) {
+		rank[i] = noRank
+		if j := next[i]; j < n {
+			if rank[i] = e.rank(piece[i:next[j]]); rank[i] != noRank {
+				h.push(mergeCandidate{rank[i], i})
+			}
+		}
+	}
+	for len(h) > 0 {
+		c := h.pop()
+		i := c.start
+		if dead[i] || rank[i] != c.rank {
+			continue
+		}
+		j := next[i]
+		dead[j] = true
+		next[i] = next[j]
+		if next[i] < n {
+			prev[next[i]] = i
+		}
+		rankFrom(i)
+		if prev[i] >= 0 {
+			rankFrom(prev[i])
+		}
+	}
+	parts := make([]int, 0, n/2+1)
+	for i := 0; i < n; i = next[i] {
+		parts = append(parts, i)
+	}
+	return append(parts, n)
+}
+
+type mergeCandidate struct{ rank, start int }
+
+// mergeHeap is a binary min-heap of merge candidates, lowest rank first and
+// leftmost on ties.
+type mergeHeap []mergeCandidate
+
+func (h mergeHeap) less(a, b int) bool {
+	return h[a].rank < h[b].rank || h[a].rank == h[b].rank && h[a].start < h[b].start
+}
+
+func (h *mergeHeap) push(c mergeCandidate) {
+	*h = append(*h, c)
+	q := *h
+	for i := len(q) - 1; i > 0; {
+		p := (i - 1) / 2
+		if !q.less(i, p) {
+			break
+		}
+		q[i], q[p] = q[p], q[i]
+		i = p
+	}
+}
+
+func (h *mergeHeap) pop() mergeCandidate {
+	q := *h
+	top := q[0]
+	last := len(q) - 1
+	q[0] = q[last]
+	q = q[:last]
+	for i := 0; ; {
+		m, l, r := i, 2*i+1, 2*i+2
+		if l < len(q) && q.less(l, m) {
+			m = l
+		}
+		if r < len(q) && q.less(r, m) {
+			m = r
+		}
+		if m == i {
+			break
+		}
+		q[i], q[m] = q[m], q[i]
+		i = m
+	}
+	*h = q
+	return top
+}
+
+func (e *Encoding) rank(b string) int {
+	if r, ok := e.ranks[b]; ok {
+		return r
+	}
+	return noRank
+}
+
+// mergeCacheShards stripes the merge cache so concurrent requests rarely
+// contend on a lock.
+const mergeCacheShards = 32
+
+// maxCachedPiece is the longest piece the merge cache keeps: longer ones
+// are rarely seen twice, and would let a single prompt fill the cache.
+const maxCachedPiece = 64
+
+// mergeCache remembers the tokens of pieces that needed merging. Each shard
+// holds up to limit pieces and maxBytes of them, and starts over when full,
+// which keeps memory bounded without the bookkeeping of an LRU; the pieces
+// that matter (common words) are back within a few requests.
+type mergeCache struct {
+	seed     maphash.Seed
+	limit    int
+	maxBytes int
+	shards   [mergeCacheShards]struct {
+		mu    sync.RWMutex
+		m     map[string][]uint32
+		bytes int
+	}
+}
+
+func newMergeCache(entries, bytes int) *mergeCache {
+	c := &mergeCache{seed: maphash.MakeSeed(), limit: entries / mergeCacheShards, maxBytes: bytes / mergeCacheShards}
+	if c.limit < 1 {
+		c.limit = 1
+	}
+	return c
+}
+
+// cacheEntrySize estimates the memory a cached piece takes: the key, the
+// ids and the map slot with both headers.
+func cacheEntrySize(piece string, ids []uint32) int {
+	return len(piece) + 4*len(ids) + 64
+}
+
+func (c *mergeCache) shard(piece string) int {
+	return int(maphash.String(c.seed, piece) % mergeCacheShards)
+}
+
+func (c *mergeCache) get(piece string) ([]uint32, bool) {
+	sh := &c.shards[c.shard(piece)]
+	sh.mu.RLock()
+	ids, ok := sh.m[piece]
+	sh.mu.RUnlock()
+	return ids, ok
+}
+
+func (c *mergeCache) put(piece string, ids []uint32) {
+	if len(piece) > maxCachedPiece {
+		return
+	}
+	size := cacheEntrySize(piece, ids)
+	sh := &c.shards[c.shard(piece)]
+	sh.mu.Lock()
+	if sh.m == nil || len(sh.m) >= c.limit || sh.bytes+size > c.maxBytes {
+		sh.m = make(map[string][]uint32, min(c.limit, 1024))
+		sh.bytes = 0
+	}
+	// piece usually points into a request body; don't keep that alive
+	sh.m[strings.Clone(piece)] = ids
+	sh.bytes += size
+	sh.mu.Unlock()
+}
@@ -0,0 +1,7 @@
+// Code generated by logcopter-gen; DO NOT EDIT.
+
+package tokenizer
+
+import logcopter "github.com/go-go-golems/logcopter/pkg/logcopter"
+
+var zlog = logcopter.Package("go-go-golems.openai-mock-server.pkg.server.tokenizer")
@@ -0,0 +1,14 @@
+//go:build !unix
+
+package tokenizer
+
+import "os"
+
+// mapFile reads path for f where memory mapping is not available.
+func mapFile(path string, f func(data []byte) error) error {
+	data, err := os.ReadFile(path)
+	if err != nil {
+		return err
+	}
+	return f(data)
+}
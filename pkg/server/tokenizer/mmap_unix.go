@@ -0,0 +1,32 @@
+//go:build unix
+
+package tokenizer
+
+import (
+	"os"
+	"syscall"
+)
+
+// mapFile memory-maps path read-only for the duration of f, so parsing a
+// vocabulary of several megabytes does not first copy it onto the heap.
+// data must not be retained after f returns.
+func mapFile(path string, f func(data []byte) error) error {
+	file, err := os.Open(path)
+	if err != nil {
+		return err
+	}
+	defer file.Close()
+	fi, err := file.Stat()
+	if err != nil {
+		return err
+	}
+	if fi.Size() == 0 {
+		return f(nil)
+	}
+	data, err := syscall.Mmap(int(file.Fd()), 0, int(fi.Size()), syscall.PROT_READ, syscall.MAP_SHARED)
+	if err != nil {
+		return err
+	}
+	defer func() { _ = syscall.Munmap(data) }()
+	return f(data)
+}
@@ -0,0 +1,298 @@
+package tokenizer
+
+import (
+	"unicode"
+	"unicode/utf8"
+)
+
+// The pre-tokenizers cut text into the pieces BPE runs on. They are
+// hand-written scanners equivalent to tiktoken's split regexes, so that no
+// regexp engine with lookahead and possessive quantifiers is needed. Each
+// returns the byte length of the piece at the start of s (len(s) > 0).
+
+// Pretokenizer returns the pre-tokenizer of encoding name (CL100K or
+// O200K), or nil if name is not supported. It needs no vocabulary: given a
+// non-empty s, it returns the byte length of the piece at the start of s,
+// which BPE then merges into one or more tokens.
+func Pretokenizer(name string) func(s string) int {
+	switch name {
+	case CL100K:
+		return nextCL100K
+	case O200K:
+		return nextO200K
+	}
+	return nil
+}
+
+// nextCL100K follows the cl100k_base pattern
+//
+//	'(?i:[sdmt]|ll|ve|re)|[^\r\n\p{L}\p{N}]?+\p{L}++|\p{N}{1,3}+|
+//	 ?[^\s\p{L}\p{N}]++[\r\n]*+|\s++$|\s*[\r\n]|\s+(?!\S)|\s
+func nextCL100K(s string) int {
+	r, n := decode(s, 0)
+	if r == '\'' {
+		if m := contractionCL100K(s[1:]); m > 0 {
+			return 1 + m
+		}
+	}
+	// [^\r\n\p{L}\p{N}]?+\p{L}++
+	if isLetter(r) {
+		return spanLetters(s, 0)
+	}
+	if !isNumber(r) && !isNewline(r) && n < len(s) {
+		if r2, _ := decode(s, n); isLetter(r2) {
+			return spanLetters(s, n)
+		}
+	}
+	if isNumber(r) {
+		return spanNumbers(s)
+	}
+	if p := punctuation(s, r, n); p > 0 {
+		return spanOf(s, p, isNewline)
+	}
+	j := spanOf(s, 0, isSpace)
+	switch {
+	case j == len(s):
+		return j
+	case lastNewline(s[:j]) >= 0:
+		return lastNewline(s[:j]) + 1
+	}
+	if last := lastRuneStart(s[:j]); last > 0 {
+		return last
+	}
+	return n
+}
+
+// nextO200K follows the o200k_base pattern
+//
+//	[^\r\n\p{L}\p{N}]?[\p{Lu}\p{Lt}\p{Lm}\p{Lo}\p{M}]*[\p{Ll}\p{Lm}\p{Lo}\p{M}]+(?i:'s|'t|'re|'ve|'m|'ll|'d)?|
+//	[^\r\n\p{L}\p{N}]?[\p{Lu}\p{Lt}\p{Lm}\p{Lo}\p{M}]+[\p{Ll}\p{Lm}\p{Lo}\p{M}]*(?i:'s|'t|'re|'ve|'m|'ll|'d)?|
+//	\p{N}{1,3}| ?[^\s\p{L}\p{N}]+[\r\n/]*|\s*[\r\n]+|\s+(?!\S)|\s+
+func nextO200K(s string) int {
+	r, n := decode(s, 0)
+	prefix := !isLetter(r) && !isNumber(r) && !isNewline(r)
+	for _, word := range [...]func(string, int) int{lowerWord, upperWord} {
+		if prefix {
+			if e := word(s, n); e > 0 {
+				return e + contractionO200K(s[e:])
+			}
+		}
+		if e := word(s, 0); e > 0 {
+			return e + contractionO200K(s[e:])
+		}
+	}
+	if isNumber(r) {
+		return spanNumbers(s)
+	}
+	if p := punctuation(s, r, n); p > 0 {
+		return spanOf(s, p, func(r rune) bool { return isNewline(r) || r == '/' })
+	}
+	j := spanOf(s, 0, isSpace)
+	if k := lastNewline(s[:j]); k >= 0 {
+		return k + 1
+	}
+	if last := lastRuneStart(s[:j]); j < len(s) && last > 0 {
+		return last
+	}
+	return j
+}
+
+// lowerWord matches [upper]*[lower]+ at s[i:] and returns its end, or -1.
+// The classes overlap (Lm, Lo and M are in both), so when the run of upper
+// runes is not followed by a lower one the match backs off to the last rune
+// of the run that is also lower, as the regex would.
+func lowerWord(s string, i int) int {
+	last := -1
+	for i < len(s) {
+		r, n := decode(s, i)
+		if !isUpper(r) {
+			break
+		}
+		if isLower(r) {
+			last = i
+		}
+		i += n
+	}
+	if i < len(s) {
+		if r, _ := decode(s, i); isLower(r) {
+			return spanOf(s, i, isLower)
+		}
+	}
+	if last < 0 {
+		return -1
+	}
+	_, n := decode(s, last)
+	return last + n
+}
+
+// upperWord matches [upper]+[lower]* at s[i:] and returns its end, or -1.
+func upperWord(s string, i int) int {
+	j := spanOf(s, i, isUpper)
+	if j == i {
+		return -1
+	}
+	return spanOf(s, j, isLower)
+}
+
+// punctuation matches ` ?[^\s\p{L}\p{N}]+` given the first rune r of
+// width n, returning its end or 0.
+func punctuation(s string, r rune, n int) int {
+	if isPunct(r) {
+		return spanOf(s, n, isPunct)
+	}
+	if r == ' ' && n < len(s) {
+		if r2, _ := decode(s, n); isPunct(r2) {
+			return spanOf(s, n, isPunct)
+		}
+	}
+	return 0
+}
+
+// contractionCL100K matches (?i:[sdmt]|ll|ve|re) after an apostrophe.
+func contractionCL100K(s string) int {
+	if s == "" {
+		return 0
+	}
+	r, n := decode(s, 0)
+	switch foldASCII(r) {
+	case 's', 'd', 'm', 't':
+		return n
+	}
+	if len(s) > n {
+		r2, n2 := decode(s, n)
+		if pairIn(foldASCII(r), foldASCII(r2), "llvere") {
+			return n + n2
+		}
+	}
+	return 0
+}
+
+// contractionO200K matches (?i:'s|'t|'re|'ve|'m|'ll|'d)?.
+func contractionO200K(s string) int {
+	if len(s) < 2 || s[0] != '\'' {
+		return 0
+	}
+	r, n := decode(s, 1)
+	switch foldASCII(r) {
+	case 's', 't', 'm', 'd':
+		return 1 + n
+	}
+	if len(s) > 1+n {
+		r2, n2 := decode(s, 1+n)
+		if pairIn(foldASCII(r), foldASCII(r2), "llvere") {
+			return 1 + n + n2
+		}
+	}
+	return 0
+}
+
+// pairIn reports whether a, b is one of the two-letter pairs in pairs.
+func pairIn(a, b rune, pairs string) bool {
+	for i := 0; i+1 < len(pairs); i += 2 {
+		if a == rune(pairs[i]) && b == rune(pairs[i+1]) {
+			return true
+		}
+	}
+	return false
+}
+
+// foldASCII lower-cases r the way a case-insensitive match of an ASCII
+// letter sees it; ſ (U+017F) folds to s.
+func foldASCII(r rune) rune {
+	switch {
+	case 'A' <= r && r <= 'Z':
+		return r + 'a' - 'A'
+	case r == 'ſ':
+		return 's'
+	}
+	return r
+}
+
+func spanLetters(s string, i int) int { return spanOf(s, i, isLetter) }
+
+// spanNumbers matches \p{N}{1,3}.
+func spanNumbers(s string) int {
+	i := 0
+	for d := 0; d < 3 && i < len(s); d++ {
+		r, n := decode(s, i)
+		if !isNumber(r) {
+			break
+		}
+		i += n
+	}
+	return i
+}
+
+// spanOf returns the end of the run of runes satisfying f from s[i:].
+func spanOf(s string, i int, f func(rune) bool) int {
+	for i < len(s) {
+		r, n := decode(s, i)
+		if !f(r) {
+			break
+		}
+		i += n
+	}
+	return i
+}
+
+func lastNewline(s string) int {
+	for i := len(s) - 1; i >= 0; i-- {
+		if s[i] == '\n' || s[i] == '\r' {
+			return i
+		}
+	}
+	return -1
+}
+
+func lastRuneStart(s string) int {
+	_, n := utf8.DecodeLastRuneInString(s)
+	return len(s) - n
+}
+
+func decode(s string, i int) (rune, int) {
+	if c := s[i]; c < utf8.RuneSelf {
+		return rune(c), 1
+	}
+	return utf8.DecodeRuneInString(s[i:])
+}
+
+func isNewline(r rune) bool { return r == '\n' || r == '\r' }
+
+func isLetter(r rune) bool {
+	if r < utf8.RuneSelf {
+		return 'a' <= r && r <= 'z' || 'A' <= r && r <= 'Z'
+	}
+	return unicode.IsLetter(r)
+}
+
+func isNumber(r rune) bool {
+	if r < utf8.RuneSelf {
+		return '0' <= r && r <= '9'
+	}
+	return unicode.IsNumber(r)
+}
+
+func isSpace(r rune) bool {
+	if r < utf8.RuneSelf {
+		return r == ' ' || '\t' <= r && r <= '\r'
+	}
+	return unicode.IsSpace(r)
+}
+
+func isPunct(r rune) bool { return !isSpace(r) && !isLetter(r) && !isNumber(r) }
+
+// isUpper is [\p{Lu}\p{Lt}\p{Lm}\p{Lo}\p{M}].
+func isUpper(r rune) bool {
+	if r < utf8.RuneSelf {
+		return 'A' <= r && r <= 'Z'
+	}
+	return unicode.In(r, unicode.Lu, unicode.Lt, unicode.Lm, unicode.Lo, unicode.M)
+}
+
+// isLower is [\p{Ll}\p{Lm}\p{Lo}\p{M}].
+func isLower(r rune) bool {
+	if r < utf8.RuneSelf {
+		return 'a' <= r && r <= 'z'
+	}
+	return unicode.In(r, unicode.Ll, unicode.Lm, unicode.Lo, unicode.M)
+}
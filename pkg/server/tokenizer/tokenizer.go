@@ -0,0 +1,318 @@
+// Package tokenizer counts tokens the way OpenAI models do. It implements
+// tiktoken's byte-level BPE for the cl100k_base and o200k_base encodings,
+// with the vocabulary read from a local .tiktoken file.
+package tokenizer
+
+import (
+	"bytes"
+	"encoding/base64"
+	"fmt"
+	"log"
+	"os"
+	"strings"
+	"sync"
+	"time"
+	"unicode/utf8"
+)
+
+// Encoding names.
+const (
+	CL100K = "cl100k_base"
+	O200K  = "o200k_base"
+)
+
+// DefaultMergeCacheEntries and DefaultMergeCacheBytes bound how many merged
+// pieces an Encoding remembers, and the memory they take.
+const (
+	DefaultMergeCacheEntries = 1 << 16
+	DefaultMergeCacheBytes   = 8 << 20
+)
+
+// Encoding is a loaded BPE vocabulary. It is safe for concurrent use.
+type Encoding struct {
+	name  string
+	next  func(string) int
+	ranks map[string]int
+	// decoder maps a token back to its bytes
+	decoder []string
+	cache   *mergeCache
+}
+
+// New builds an encoding from a token-to-rank table. name selects the
+// pre-tokenizer and must be CL100K or O200K. Every single byte must be a
+// token, as in all tiktoken vocabularies.
+func New(name string, ranks map[string]int) (*Encoding, error) {
+	e := &Encoding{name: name, next: Pretokenizer(name), ranks: ranks, cache: newMergeCache(DefaultMergeCacheEntries, DefaultMergeCacheBytes)}
+	if e.next == nil {
+		return nil, fmt.Errorf("unsupported encoding %q (want %s or %s)", name, CL100K, O200K)
+	}
+	maxRank := -1
+	for tok, r := range ranks {
+		if r < 0 || tok == "" {
+			return nil, fmt.Errorf("%s: invalid token %q with rank %d", name, tok, r)
+		}
+		maxRank = max(maxRank, r)
+	}
+	for b := 0; b < 256; b++ {
+		if _, ok := ranks[string([]byte{byte(b)})]; !ok {
+			return nil, fmt.Errorf("%s: vocabulary has no token for byte 0x%02x", name, b)
+		}
+	}
+	e.decoder = make([]string, maxRank+1)
+	for tok, r := range ranks {
+		e.decoder[r] = tok
+	}
+	return e, nil
+}
+
+// Name returns the encoding name.
+func (e *Encoding) Name() string { return e.name }
+
+// Encode returns the tokens of text. Special tokens such as <|endoftext|>
+// are encoded as ordinary text.
+func (e *Encoding) Encode(text string) []int {
+	out := make([]int, 0, len(text)/4+1)
+	e.pieces(text, func(_ string, single int, ids []uint32) {
+		if ids == nil {
+			out = append(out, single)
+			return
+		}
+		for _, id := range ids {
+			out = append(out, int(id))
+		}
+	})
+	return out
+}
+
+// Count returns the number of tokens in text without building them.
+func (e *Encoding) Count(text string) int {
+	n := 0
+	e.pieces(text, func(_ string, _ int, ids []uint32) {
+		if ids == nil {
+			n++
+		} else {
+			n += len(ids)
+		}
+	})
+	return n
+}
+
+// Decode returns the text of tokens.
+func (e *Encoding) Decode(tokens []int) string {
+	var b strings.Builder
+	for _, t := range tokens {
+		if t >= 0 && t < len(e.decoder) {
+			b.WriteString(e.decoder[t])
+		}
+	}
+	return b.String()
+}
+
+// Split cuts text into the substrings of its tokens. A token that ends
+// inside a UTF-8 sequence is joined with the tokens after it up to the next
+// rune boundary, so every element is valid text; the elements concatenate
+// back to text.
+func (e *Encoding) Split(text string) []string {
+	out := make([]string, 0, len(text)/4+1)
+	start, end := 0, 0
+	cut := func() {
+		if end == len(text) || utf8.RuneStart(text[end]) {
+			out = append(out, text[start:end])
+			start = end
+		}
+	}
+	e.pieces(text, func(piece string, _ int, ids []uint32) {
+		if ids == nil {
+			end += len(piece)
+			cut()
+			return
+		}
+		for _, id := range ids {
+			end += len(e.decoder[id])
+			cut()
+		}
+	})
+	return out
+}
+
+// Ends returns the byte offset in text at which each of its tokens ends,
+// one per token counted by Count. Unlike Split it does not join tokens that
+// end inside a UTF-8 sequence.
+func (e *Encoding) Ends(text string) []int {
+	out := make([]int, 0, len(text)/4+1)
+	end := 0
+	e.pieces(text, func(piece string, _ int, ids []uint32) {
+		if ids == nil {
+			end += len(piece)
+			out = append(out, end)
+			return
+		}
+		for _, id := range ids {
+			end += len(e.decoder[id])
+			out = append(out, end)
+		}
+	})
+	return out
+}
+
+// pieces pre-tokenizes text and hands each piece to f with its tokens:
+// single when the piece is one token (ids is nil then), ids otherwise.
+func (e *Encoding) pieces(text string, f func(piece string, single int, ids []uint32)) {
+	for text != "" {
+		n := e.next(text)
+		piece := text[:n]
+		text = text[n:]
+		if r, ok := e.ranks[piece]; ok {
+			f(piece, r, nil)
+			continue
+		}
+		ids, ok := e.cache.get(piece)
+		if !ok {
+			parts := e.bytePairMerge(piece)
+			ids = make([]uint32, len(parts)-1)
+			for i := range ids {
+				ids[i] = uint32(e.ranks[piece[parts[i]:parts[i+1]]])
+			}
+			e.cache.put(piece, ids)
+		}
+		f(piece, 0, ids)
+	}
+}
+
+// loaded caches encodings by file, so config reloads don't parse the
+// vocabulary again unless the file changed.
+var loaded = struct {
+	sync.Mutex
+	m map[string]loadedEncoding
+}{m: map[string]loadedEncoding{}}
+
+type loadedEncoding struct {
+	enc     *Encoding
+	size    int64
+	modTime time.Time
+}
+
+// Load returns the encoding name with its vocabulary read from path, a
+// tiktoken file of "<base64 token> <rank>" lines. The file is memory-mapped
+// only while it is parsed: the tokens are base64 there, so lookups could not
+// be served from the mapping anyway, and the encoding outlives the file (it
+// may be replaced while in use). The result is cached per path until the
+// file changes.
+func Load(name, path string) (*Encoding, error) {
+	fi, err := os.Stat(path)
+	if err != nil {
+		return nil, err
+	}
+	key := name + "\x00" + path
+	loaded.Lock()
+	defer loaded.Unlock()
+	if l, ok := loaded.m[key]; ok && l.size == fi.Size() && l.modTime.Equal(fi.ModTime()) {
+		return l.enc, nil
+	}
+	start := time.Now()
+	var enc *Encoding
+	err = mapFile(path, func(data []byte) error {
+		ranks, err := parseVocabulary(data)
+		if err != nil {
+			return err
+		}
+		enc, err = New(name, ranks)
+		return err
+	})
+	if err != nil {
+		return nil, fmt.Errorf("%s: %w", path, err)
+	}
+	loaded.m[key] = loadedEncoding{enc: enc, size: fi.Size(), modTime: fi.ModTime()}
+	log.Printf("[tokenizer] Loaded %s from %s (%d tokens) in %s", name, path, len(enc.ranks), time.Since(start))
+	return enc, nil
+}
+
+// parseVocabulary decodes a tiktoken file. All tokens are decoded into one
+// arena and the map keys are substrings of it, so the table costs one
+// allocation for its bytes rather than one per token.
+func parseVocabulary(data []byte) (map[string]int, error) {
+	type span struct{ start, end, rank int }
+	lines := bytes.Count(data, []byte{'\n'}) + 1
+	spans := make([]span, 0, lines)
+	arena := make([]byte, 0, len(data)*3/4)
+	for n := 1; len(data) > 0; n++ {
+		line := data
+		if i := bytes.IndexByte(data, '\n'); i >= 0 {
+			line, data = data[:i], data[i+1:]
+		} else {
+			data = nil
+		}
+		line = bytes.TrimRight(line, "\r")
+		if len(line) == 0 {
+			continue
+		}
+		sp := bytes.IndexByte(line, ' ')
+		if sp <= 0 {
+			return nil, fmt.Errorf("line %d: want \"<base64 token> <rank>\"", n)
+		}
+		rank, ok := parseRank(line[sp+1:])
+		if !ok {
+			return nil, fmt.Errorf("line %d: invalid rank %q", n, line[sp+1:])
+		}
+		start := len(arena)
+		arena = append(arena, make([]byte, base64.StdEncoding.DecodedLen(sp))...)
+		m, err := base64.StdEncoding.Decode(arena[start:], line[:sp])
+		if err != nil {
+			return nil, fmt.Errorf("line %d: %w", n, err)
+		}
+		arena = arena[:start+m]
+		spans = append(spans, span{start, start + m, rank})
+	}
+	all := string(arena)
+	ranks := make(map[string]int, len(spans))
+	for _, s := range spans {
+		ranks[all[s.start:s.end]] = s.rank
+	}
+	return ranks, nil
+}
+
+func parseRank(b []byte) (int, bool) {
+	if len(b) == 0 || len(b) > 9 {
+		return 0, false
+	}
+	r := 0
+	for _, c := range b {
+		if c < '0' || c > '9' {
+			return 0, false
+		}
+		r = r*10 + int(c-'0')
+	}
+	return r, true
+}
+
+// modelEncodings and modelPrefixes follow tiktoken's model table for the
+// encodings supported here.
+var modelEncodings = map[string]string{
+	"o1": O200K, "o3": O200K, "o4-mini": O200K,
+	"gpt-5": O200K, "gpt-4.1": O200K, "gpt-4o": O200K,
+	"gpt-4": CL100K, "gpt-3.5-turbo": CL100K, "gpt-3.5": CL100K, "gpt-35-turbo": CL100K,
+	"davinci-002": CL100K, "babbage-002": CL100K,
+	"text-embedding-ada-002": CL100K, "text-embedding-3-small": CL100K, "text-embedding-3-large": CL100K,
+}
+
+var modelPrefixes = []struct{ prefix, encoding string }{
+	{"o1-", O200K}, {"o3-", O200K}, {"o4-mini-", O200K},
+	{"gpt-5", O200K}, {"gpt-4.5-", O200K}, {"gpt-4.1-", O200K},
+	{"chatgpt-4o-", O200K}, {"gpt-4o-", O200K}, {"gpt-oss-", O200K},
+	{"gpt-4-", CL100K}, {"gpt-3.5-turbo-", CL100K}, {"gpt-35-turbo-", CL100K},
+	{"ft:gpt-4o", O200K}, {"ft:gpt-4", CL100K}, {"ft:gpt-3.5-turbo", CL100K},
+	{"ft:davinci-002", CL100K}, {"ft:babbage-002", CL100K},
+}
+
+// ForModel returns the encoding OpenAI uses for model, or "" if unknown.
+func ForModel(model string) string {
+	if enc, ok := modelEncodings[model]; ok {
+		return enc
+	}
+	for _, p := range modelPrefixes {
+		if strings.HasPrefix(model, p.prefix) {
+			return p.encoding
+		}
+	}
+	return ""
+}
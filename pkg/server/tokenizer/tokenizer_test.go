@@ -0,0 +1,202 @@
+package tokenizer
+
+import (
+	"fmt"
+	"math/rand"
+	"os"
+	"path/filepath"
+	"strings"
+	"testing"
+	"unicode/utf8"
+)
+
+// testdata/tiny.tiktoken is a 700-token vocabulary trained on this repo's
+// docs with tiktoken's educational trainer. The expectations below come from
+// tiktoken itself (encode_ordinary and the encodings' split regexes) run
+// against the same file.
+func loadTiny(t testing.TB, name string) *Encoding {
+	t.Helper()
+	e, err := Load(name, filepath.Join("testdata", "tiny.tiktoken"))
+	if err != nil {
+		t.Fatal(err)
+	}
+	return e
+}
+
+func pretokens(e *Encoding, s string) []string {
+	var out []string
+	for s != "" {
+		n := e.next(s)
+		out = append(out, s[:n])
+		s = s[n:]
+	}
+	return out
+}
+
+func TestPretokenizersMatchTiktoken(t *testing.T) {
+	cases := []struct {
+		enc, text string
+		want      []string
+	}{
+		{CL100K, "  Hello, world!\n\n\tdef f(x):\n        return x*2  # dbl\n",
+			[]string{" ", " Hello", ",", " world", "!\n\n", "\tdef", " f", "(x", "):\n", "       ", " return", " x", "*", "2", " ", " #", " dbl", "\n"}},
+		{CL100K, "I'LL don't WE'VE", []string{"I", "'LL", " don", "'t", " WE", "'VE"}},
+		{CL100K, "naïve café 🚀 12345", []string{"naïve", " café", " 🚀", " ", "123", "45"}},
+		{CL100K, "CamelCaseHTTPServer ǅungla", []string{"CamelCaseHTTPServer", " ǅungla"}},
+		{CL100K, "a\r\n\r\n  b  ", []string{"a", "\r\n\r\n", " ", " b", "  "}},
+		{O200K, "I'LL don't WE'VE", []string{"I'LL", " don't", " WE'VE"}},
+		{O200K, "CamelCaseHTTPServer ǅungla", []string{"Camel", "Case", "HTTPServer", " ǅungla"}},
+		{O200K, "a\r\n\r\n  b  ", []string{"a", "\r\n\r\n", " ", " b", "  "}},
+		{O200K, "path/to\n/x", []string{"path", "/to", "\n", "/x"}},
+	}
+	for _, tc := range cases {
+		if got := pretokens(loadTiny(t, tc.enc), tc.text); fmt.Sprintf("%q", got) != fmt.Sprintf("%q", tc.want) {
+			t.Errorf("%s %q:\n got %q\nwant %q", tc.enc, tc.text, got, tc.want)
+		}
+	}
+}
+
+func TestEncodeMatchesTiktoken(t *testing.T) {
+	text := "  Hello, world!\n\n\tdef f(x):\n        return x*2  # dbl\n"
+	want := []int{32, 664, 364, 324, 44, 293, 271, 108, 100, 33, 10, 10, 9, 610, 283, 40, 120, 41, 578, 259, 400, 281, 384, 32, 120, 42, 50, 32, 32, 35, 358, 98, 108, 10}
+	for _, name := range []string{CL100K, O200K} {
+		e := loadTiny(t, name)
+		// twice: the second pass is served from the merge cache
+		for pass := 0; pass < 2; pass++ {
+			if got := e.Encode(text); fmt.Sprint(got) != fmt.Sprint(want) {
+				t.Fatalf("%s pass %d:\n got %v\nwant %v", name, pass, got, want)
+			}
+		}
+		if n := e.Count(text); n != len(want) {
+			t.Fatalf("%s: Count = %d, want %d", name, n, len(want))
+		}
+		if got := e.Decode(e.Encode(text)); got != text {
+			t.Fatalf("%s: round trip %q", name, got)
+		}
+	}
+}
+
+func TestSplitKeepsRunesWhole(t *testing.T) {
+	e := loadTiny(t, O200K)
+	text := "naïve café 🚀🚀 日本語 done"
+	parts := e.Split(text)
+	if strings.Join(parts, "") != text {
+		t.Fatalf("split rebuilds %q", strings.Join(parts, ""))
+	}
+	for _, p := range parts {
+		if p == "" || !utf8.ValidString(p) {
+			t.Fatalf("bad part %q in %q", p, parts)
+		}
+	}
+	if len(parts) > e.Count(text) {
+		t.Fatalf("%d parts for %d tokens", len(parts), e.Count(text))
+	}
+}
+
+// TestHeapPairMergeMatchesScan checks the heap merge used for long pieces
+// against the pair scan on text with many ties and unmergeable bytes.
+func TestHeapPairMergeMatchesScan(t *testing.T) {
+	e := loadTiny(t, O200K)
+	rng := rand.New(rand.NewSource(1))
+	alphabet := "eeettaaonsr  ihl\n.,-_xyzé"
+	for i := 0; i < 500; i++ {
+		b := make([]byte, 1+rng.Intn(300))
+		for j := range b {
+			b[j] = alphabet[rng.Intn(len(alphabet))]
+		}
+		piece := string(b)
+		if got, want := e.heapPairMerge(piece), e.scanPairMerge(piece); fmt.Sprint(got) != fmt.Sprint(want) {
+			t.Fatalf("%q:\n heap %v\n scan %v", piece, got, want)
+		}
+	}
+}
+
+func TestLoad(t *testing.T) {
+	if a, b := loadTiny(t, CL100K), loadTiny(t, CL100K); a != b {
+		t.Fatal("second Load of an unchanged file parsed it again")
+	}
+	dir := t.TempDir()
+	for name, content := range map[string]string{
+		"norank.tiktoken":  "YQ==\n",
+		"badrank.tiktoken": "YQ== x\n",
+		"bytes.tiktoken":   "YQ== 0\nYg== 1\n",
+	} {
+		path := filepath.Join(dir, name)
+		if err := os.WriteFile(path, []byte(content), 0o644); err != nil {
+			t.Fatal(err)
+		}
+		if _, err := Load(O200K, path); err == nil {
+			t.Errorf("%s: expected an error", name)
+		}
+	}
+	if _, err := Load("p50k_base", filepath.Join("testdata", "tiny.tiktoken")); err == nil {
+		t.Error("unsupported encodings should be rejected")
+	}
+}
+
+func TestForModel(t *testing.T) {
+	for model, want := range map[string]string{
+		"gpt-4o":                 O200K,
+		"gpt-4o-mini":            O200K,
+		"o3-mini":                O200K,
+		"gpt-4":                  CL100K,
+		"gpt-4-turbo":            CL100K,
+		"gpt-3.5-turbo-0125":     CL100K,
+		"text-embedding-3-small": CL100K,
+		"my-custom-model":        "",
+	} {
+		if got := ForModel(model); got != want {
+			t.Errorf("ForModel(%q) = %q, want %q", model, got, want)
+		}
+	}
+}
+
+// BenchmarkCount measures tokens/sec on a long prompt. It uses the real
+// vocabularies when MOCK_TIKTOKEN_DIR points at a directory holding
+// cl100k_base.tiktoken and o200k_base.tiktoken, and the tiny test
+// vocabulary (more, shorter tokens per piece) otherwise.
+func BenchmarkCount(b *testing.B) {
+	doc, err := os.ReadFile(filepath.Join("..", "..", "..", "docs", "CONFIGURATION.md"))
+	if err != nil {
+		b.Fatal(err)
+	}
+	prompt := strings.Repeat(string(doc), 256<<10/len(doc)+1)[:256<<10]
+	for _, name := range []string{CL100K, O200K} {
+		path := filepath.Join("testdata", "tiny.tiktoken")
+		if dir := os.Getenv("MOCK_TIKTOKEN_DIR"); dir != "" {
+			path = filepath.Join(dir, name+".tiktoken")
+		}
+		e, err := Load(name, path)
+		if err != nil {
+			b.Fatal(err)
+		}
+		uncached := *e
+		uncached.cache = newMergeCache(0, 0)
+		for _, bc := range []struct {
+			label string
+			e     *Encoding
+		}{{"cached", e}, {"uncached", &uncached}} {
+			b.Run(name+"/"+bc.label, func(b *testing.B) {
+				b.SetBytes(int64(len(prompt)))
+				tokens := 0
+				for i := 0; i < b.N; i++ {
+					tokens += bc.e.Count(prompt)
+				}
+				b.ReportMetric(float64(tokens)/b.Elapsed().Seconds(), "tokens/s")
+			})
+		}
+	}
+}
+
+// BenchmarkLongPiece counts a 100KB run of letters with no spaces, which the
+// pre-tokenizer hands to BPE as one piece.
+func BenchmarkLongPiece(b *testing.B) {
+	e := loadTiny(b, O200K)
+	word := "configurationstreamingtokenizer"
+	piece := strings.Repeat(word, 100<<10/len(word)+1)[:100<<10]
+	b.SetBytes(int64(len(piece)))
+	b.ReportAllocs()
+	for i := 0; i < b.N; i++ {
+		_ = e.Count(piece)
+	}
+}
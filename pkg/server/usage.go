@@ -0,0 +1,71 @@
+package server
+
+import (
+	"unicode"
+
+	cfg "mock-openai-server/pkg/server/config"
+	"mock-openai-server/pkg/server/tokenizer"
+)
+
+// tokenCounter counts tokens with a model's tokenizer, or words when no
+// vocabulary is configured (tokenizer.vocab_dir).
+type tokenCounter struct {
+	enc *tokenizer.Encoding
+}
+
+func tokenCounterFor(conf *cfg.BotConfig, model string) tokenCounter {
+	return tokenCounter{enc: conf.TokenizerFor(model)}
+}
+
+func (t tokenCounter) count(s string) int {
+	if t.enc == nil {
+		return countWords(s)
+	}
+	return t.enc.Count(s)
+}
+
+// ends returns the byte offset in s at which each token counted by count
+// ends: the vocabulary's tokens, or the words of s.
+func (t tokenCounter) ends(s string) []int {
+	if t.enc != nil {
+		return t.enc.Ends(s)
+	}
+	var out []int
+	inWord := false
+	for i, r := range s {
+		if unicode.IsSpace(r) {
+			if inWord {
+				out = append(out, i)
+			}
+			inWord = false
+		} else {
+			inWord = true
+		}
+	}
+	if inWord {
+		out = append(out, len(s))
+	}
+	return out
+}
+
+// chatPrompt counts the prompt of a chat completion the way OpenAI bills it:
+// each message costs 3 tokens of framing plus its role and content, and the
+// reply is primed with 3 more.
+func (t tokenCounter) chatPrompt(messages []Message) int {
+	if t.enc == nil {
+		n := 0
+		for _, m := range messages {
+			n += countWords(m.Content)
+		}
+		return n
+	}
+	n := 3
+	for _, m := range messages {
+		n += 3 + t.enc.Count(m.Role) + t.enc.Count(m.Content)
+	}
+	return n
+}
+
+func newUsage(prompt, completion int) Usage {
+	return Usage{PromptTokens: prompt, CompletionTokens: completion, TotalTokens: prompt + completion}
+}
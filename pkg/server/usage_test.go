@@ -0,0 +1,80 @@
+package server
+
+import (
+	"encoding/json"
+	"net/http"
+	"net/http/httptest"
+	"os"
+	"path/filepath"
+	"strings"
+	"testing"
+
+	cfg "mock-openai-server/pkg/server/config"
+)
+
+// tinyVocabDir returns a vocab_dir holding the tokenizer's test vocabulary
+// as o200k_base, the encoding of gpt-4o.
+func tinyVocabDir(t *testing.T) string {
+	t.Helper()
+	dir := t.TempDir()
+	vocab, err := os.ReadFile(filepath.Join("tokenizer", "testdata", "tiny.tiktoken"))
+	if err != nil {
+		t.Fatal(err)
+	}
+	if err := os.WriteFile(filepath.Join(dir, "o200k_base.tiktoken"), vocab, 0o644); err != nil {
+		t.Fatal(err)
+	}
+	return dir
+}
+
+func TestUsageCountsTokens(t *testing.T) {
+	dir := tinyVocabDir(t)
+	reply := "The mock server is working correctly, naïvely."
+	conf := &cfg.BotConfig{
+		Tokenizer: cfg.TokenizerConfig{VocabDir: dir},
+		Fallback:  cfg.RespondWrapper{Text: reply},
+	}
+	if err := conf.Compile(); err != nil {
+		t.Fatal(err)
+	}
+	prev := cfg.Get()
+	cfg.Set(conf)
+	defer cfg.Set(prev)
+	enc := conf.TokenizerFor("gpt-4o")
+	if enc == nil {
+		t.Fatal("no tokenizer for gpt-4o")
+	}
+
+	post := func(handler http.HandlerFunc, body string, out interface{}) {
+		t.Helper()
+		rec := httptest.NewRecorder()
+		handler(rec, httptest.NewRequest(http.MethodPost, "/", strings.NewReader(body)))
+		if err := json.Unmarshal(rec.Body.Bytes(), out); err != nil {
+			t.Fatalf("%v: %s", err, rec.Body)
+		}
+	}
+
+	var chat ChatCompletionResponse
+	post(handleChatCompletions, `{"model":"gpt-4o","messages":[{"role":"system","content":"Be brief."},{"role":"user","content":"Say hello"}]}`, &chat)
+	prompt := 3 + 3 + enc.Count("system") + enc.Count("Be brief.") + 3 + enc.Count("user") + enc.Count("Say hello")
+	if want := newUsage(prompt, enc.Count(reply)); chat.Usage != want {
+		t.Fatalf("chat usage %+v, want %+v", chat.Usage, want)
+	}
+
+	// a follow-up's prompt is the whole conversation so far plus its input
+	var first, second ResponsesResponse
+	post(handleResponsesCreate, `{"model":"gpt-4o","input":"hello there"}`, &first)
+	post(handleResponsesCreate, `{"model":"gpt-4o","input":"and again","previous_response_id":"`+first.ID+`"}`, &second)
+	if want := newUsage(enc.Count("hello there"), enc.Count(reply)); first.Usage != want {
+		t.Fatalf("first turn usage %+v, want %+v", first.Usage, want)
+	}
+	if want := newUsage(first.Usage.TotalTokens+enc.Count("and again"), enc.Count(reply)); second.Usage != want {
+		t.Fatalf("second turn usage %+v, want %+v", second.Usage, want)
+	}
+
+	// token chunking streams real tokens
+	chunks := splitChunks(reply, cfg.ChunkingConfig{Unit: cfg.ChunkTokens, Size: 2}, conf, "gpt-4o")
+	if strings.Join(chunks, "") != reply || len(chunks) != (len(enc.Split(reply))+1)/2 {
+		t.Fatalf("token chunks %q", chunks)
+	}
+}
@@ -0,0 +1,502 @@
+package server
+
+import (
+	"bytes"
+	"context"
+	"encoding/json"
+	"errors"
+	"fmt"
+	"io"
+	"log"
+	"net"
+	"net/http"
+	"net/http/httputil"
+	"net/url"
+	"os"
+	"os/exec"
+	"os/signal"
+	"path/filepath"
+	"sort"
+	"strconv"
+	"strings"
+	"sync"
+	"syscall"
+	"time"
+
+	cfg "mock-openai-server/pkg/server/config"
+)
+
+// Worker mode: serve --workers N re-runs this binary N times. Every worker
+// binds the same TCP addresses with SO_REUSEPORT, so the kernel spreads
+// connections across them, and keeps its own response store. A worker's
+// index is the top byte of its ID tag; a request that names another
+// worker's response (previous_response_id, GET /v1/responses/{id}) is
+// proxied to the owner over its private Unix socket in the run directory,
+// and GET /v1/responses merges a page from every worker (listWorkers).
+// The supervisor only starts the workers, relays SIGHUP and reports the
+// addresses once every worker is listening.
+
+const (
+	maxWorkers = 256
+
+	envWorker       = "MOCK_WORKER"        // "index/count" in a worker process
+	envWorkerDir    = "MOCK_WORKER_DIR"    // run directory: sockets and ready files
+	envWorkerListen = "MOCK_WORKER_LISTEN" // the bound TCP addresses, comma separated
+
+	// headerForwarded marks a request proxied from another worker, which
+	// is answered where it lands rather than forwarded again.
+	headerForwarded = "X-Mock-Forwarded"
+)
+
+// workerPeers holds a proxy to every other worker, indexed by worker (nil
+// for this one); it is nil outside worker mode.
+var workerPeers []*httputil.ReverseProxy
+
+// workerCommand is the command line each worker runs: this binary with the
+// same arguments. Tests substitute the test binary.
+var workerCommand = func() ([]string, error) {
+	exe, err := os.Executable()
+	if err != nil {
+		return nil, err
+	}
+	return append([]string{exe}, os.Args[1:]...), nil
+}
+
+// workerCount resolves the number of worker processes; below 2 the server
+// runs in this process.
+func workerCount(conf *cfg.BotConfig, opts ServeOptions) int {
+	if opts.Workers > 0 {
+		return opts.Workers
+	}
+	if conf != nil {
+		return conf.Server.Workers
+	}
+	return 0
+}
+
+func workerSocket(dir string, i int) string {
+	return filepath.Join(dir, "worker-"+strconv.Itoa(i)+".sock")
+}
+
+func workerReadyFile(dir string, i int) string {
+	return filepath.Join(dir, "worker-"+strconv.Itoa(i)+".ready")
+}
+
+// superviseWorkers starts n workers and runs until one exits, ctx is done
+// or SIGINT/SIGTERM arrives, then stops them all.
+func superviseWorkers(ctx context.Context, n int, opts ServeOptions) error {
+	if !reusePortSupported {
+		return errors.New("workers: SO_REUSEPORT is not supported on this platform")
+	}
+	if n > maxWorkers {
+		return fmt.Errorf("workers: at most %d", maxWorkers)
+	}
+	conf := cfg.Get()
+	var hc cfg.HTTPConfig
+	readyFile := opts.ReadyFile
+	if conf != nil {
+		hc = conf.Server.HTTP
+		if readyFile == "" {
+			readyFile = conf.Server.ReadyFile
+		}
+	}
+
+	// Bind every address here first so port 0 resolves to one port all the
+	// workers share. These sockets are held, never accepted on, until the
+	// workers are listening, so nothing else can take the port meanwhile.
+	var held []net.Listener
+	release := func() {
+		for _, ln := range held {
+			_ = ln.Close()
+		}
+		held = nil
+	}
+	defer release()
+	var bound, addrs []string
+	for _, a := range listenAddrs(conf, opts) {
+		if strings.HasPrefix(a, "unix:") {
+			return fmt.Errorf("listen on %s: workers can only share TCP addresses", a)
+		}
+		ln, addr, err := listen(hc, a, true)
+		if err != nil {
+			return fmt.Errorf("listen on %s: %w", a, err)
+		}
+		held = append(held, ln)
+		bound = append(bound, ln.Addr().String())
+		addrs = append(addrs, addr)
+	}
+
+	dir, err := os.MkdirTemp("", "openai-mock-workers-")
+	if err != nil {
+		return err
+	}
+	defer os.RemoveAll(dir)
+	argv, err := workerCommand()
+	if err != nil {
+		return err
+	}
+
+	sigc := make(chan os.Signal, 1)
+	signal.Notify(sigc, os.Interrupt, syscall.SIGTERM, syscall.SIGHUP)
+	defer signal.Stop(sigc)
+
+	var procs []*os.Process
+	exited := make(chan error, n)
+	running := 0
+	stop := func() {
+		for _, p := range procs {
+			_ = p.Kill()
+		}
+		for ; running > 0; running-- {
+			<-exited
+		}
+	}
+	for i := 0; i < n; i++ {
+		cmd := exec.Command(argv[0], argv[1:]...)
+		cmd.Env = append(os.Environ(),
+			fmt.Sprintf("%s=%d/%d", envWorker, i, n),
+			envWorkerDir+"="+dir,
+			envWorkerListen+"="+strings.Join(bound, ","))
+		// the bound addresses are printed here; workers only log
+		cmd.Stdout, cmd.Stderr = os.Stderr, os.Stderr
+		if err := cmd.Start(); err != nil {
+			stop()
+			return fmt.Errorf("start worker %d: %w", i, err)
+		}
+		procs = append(procs, cmd.Process)
+		running++
+		go func(i int) {
+			if err := cmd.Wait(); err != nil {
+				exited <- fmt.Errorf("worker %d: %w", i, err)
+				return
+			}
+			exited <- fmt.Errorf("worker %d exited", i)
+		}(i)
+	}
+
+	ready := 0
+	poll := time.NewTicker(10 * time.Millisecond)
+	defer poll.Stop()
+	tick := poll.C
+	for {
+		select {
+		case err := <-exited:
+			running--
+			stop()
+			return err
+		case sig := <-sigc:
+			if sig == syscall.SIGHUP {
+				for _, p := range procs {
+					_ = p.Signal(sig)
+				}
+				continue
+			}
+			stop()
+			return nil
+		case <-ctx.Done():
+			stop()
+			return nil
+		case <-tick:
+			for ready < n {
+				if _, err := os.Stat(workerReadyFile(dir, ready)); err != nil {
+					break
+				}
+				ready++
+			}
+			if ready < n {
+				continue
+			}
+			tick = nil
+			release()
+			log.Printf("[workers] %d workers serving on %s", n, strings.Join(addrs, ", "))
+			for _, a := range addrs {
+				fmt.Println("listening on " + a)
+			}
+			if readyFile != "" {
+				if err := writeReadyFile(readyFile, addrs); err != nil {
+					stop()
+					return fmt.Errorf("ready file: %w", err)
+				}
+			}
+		}
+	}
+}
+
+// serveWorker runs this process as worker spec ("index/count") on the
+// addresses its supervisor bound, plus its private socket.
+func serveWorker(ctx context.Context, spec string) error {
+	var i, n int
+	if _, err := fmt.Sscanf(spec, "%d/%d", &i, &n); err != nil || i < 0 || i >= n || n > maxWorkers {
+		return fmt.Errorf("%s=%q: want index/count", envWorker, spec)
+	}
+	dir := os.Getenv(envWorkerDir)
+	setIDWorker(i)
+	peers := make([]*httputil.ReverseProxy, n)
+	for j := range peers {
+		if j != i {
+			peers[j] = newWorkerProxy(workerSocket(dir, j))
+		}
+	}
+	workerPeers = peers
+
+	addrs := append(strings.Split(os.Getenv(envWorkerListen), ","), "unix:"+workerSocket(dir, i))
+	return serve(ctx, ServeOptions{
+		Listen:    addrs,
+		ReadyFile: workerReadyFile(dir, i),
+		reusePort: true,
+		noAdmin:   i != 0, // one admin address; profiles worker 0
+	})
+}
+
+// newWorkerProxy proxies to the worker listening on sock.
+func newWorkerProxy(sock string) *httputil.ReverseProxy {
+	p := httputil.NewSingleHostReverseProxy(&url.URL{Scheme: "http", Host: "worker"})
+	p.Transport = &http.Transport{
+		DialContext: func(ctx context.Context, _, _ string) (net.Conn, error) {
+			var d net.Dialer
+			return d.DialContext(ctx, "unix", sock)
+		},
+		MaxIdleConnsPerHost: 64,
+	}
+	p.FlushInterval = -1 // pass SSE events through as they arrive
+	director := p.Director
+	p.Director = func(r *http.Request) {
+		director(r)
+		r.Header.Set(headerForwarded, "1")
+	}
+	return p
+}
+
+// ownerProxy returns the proxy to the worker that owns response id, or nil
+// when this process answers: outside worker mode, for its own IDs, for IDs
+// it did not make and for requests another worker already forwarded.
+func ownerProxy(r *http.Request, id string) *httputil.ReverseProxy {
+	if workerPeers == nil || r.Header.Get(headerForwarded) != "" {
+		return nil
+	}
+	i, ok := idWorker(id)
+	if !ok || i >= len(workerPeers) {
+		return nil
+	}
+	return workerPeers[i]
+}
+
+// forwardCreate proxies a decoded Responses API request to the worker that
+// owns its previous_response_id. Decoding consumed the body, so it is
+// re-encoded from req; fields the server ignores are dropped.
+func forwardCreate(w http.ResponseWriter, r *http.Request, p *httputil.ReverseProxy, req *ResponsesCreateRequest) {
+	body, err := json.Marshal(req)
+	if err != nil {
+		http.Error(w, err.Error(), http.StatusInternalServerError)
+		return
+	}
+	r = r.Clone(r.Context())
+	r.Body = io.NopCloser(bytes.NewReader(body))
+	r.ContentLength = int64(len(body))
+	p.ServeHTTP(w, r)
+}
+
+// errWorkerUnreachable wraps a failure to reach another worker.
+var errWorkerUnreachable = errors.New("worker unreachable")
+
+// listPos is a response's place in a listing merged across workers: its
+// store stamp, with ties between workers broken by index.
+type listPos struct {
+	stamp  int64
+	worker int
+}
+
+func (p listPos) less(q listPos) bool {
+	return p.stamp < q.stamp || p.stamp == q.stamp && p.worker < q.worker
+}
+
+// stampBound converts p into a stamp bound for worker j's store, whose
+// stamp bounds are strict: the bound that keeps j's responses below p
+// (above p unless below), including those stamped the same as p that the
+// worker index puts on that side.
+func (p listPos) stampBound(j int, below bool) int64 {
+	switch {
+	case below && j < p.worker:
+		return p.stamp + 1
+	case !below && j > p.worker:
+		return p.stamp - 1
+	}
+	return p.stamp
+}
+
+// listWorkers reads a page of GET /v1/responses across every worker's
+// store, in the order the responses were stored. An ID cursor is first
+// resolved to its position by the worker that stored it; every worker then
+// lists its responses beyond that position and the pages are merged.
+func listWorkers(ctx context.Context, opts ListOptions) (ListPage, error) {
+	n := len(workerPeers)
+	resolve := func(id string, before bool) (listPos, error) {
+		if id == "" {
+			return listPos{}, nil
+		}
+		j, ok := idWorker(id)
+		if !ok || j >= n {
+			if before {
+				return listPos{}, fmt.Errorf("before: no stored response %q", id)
+			}
+			return listPos{}, fmt.Errorf("after: no stored response %q", id)
+		}
+		o := ListOptions{Limit: 1, Desc: opts.Desc}
+		if before {
+			o.Before = id
+		} else {
+			o.After = id
+		}
+		page, err := workerList(ctx, j, o)
+		if before {
+			return listPos{page.BeforeStamp, j}, err
+		}
+		return listPos{page.AfterStamp, j}, err
+	}
+	after, err := resolve(opts.After, false)
+	if err != nil {
+		return ListPage{}, err
+	}
+	before, err := resolve(opts.Before, true)
+	if err != nil {
+		return ListPage{}, err
+	}
+
+	pages := make([]ListPage, n)
+	errs := make([]error, n)
+	var wg sync.WaitGroup
+	for j := 0; j < n; j++ {
+		o := ListOptions{Limit: opts.Limit, Desc: opts.Desc}
+		if opts.After != "" {
+			// desc lists below the cursor, asc above it
+			if o.AfterStamp = after.stampBound(j, opts.Desc); j == after.worker {
+				o.After = opts.After
+			}
+		}
+		if opts.Before != "" {
+			if o.BeforeStamp = before.stampBound(j, !opts.Desc); j == before.worker {
+				o.Before = opts.Before
+			}
+		}
+		wg.Add(1)
+		go func(j int, o ListOptions) {
+			defer wg.Done()
+			pages[j], errs[j] = workerList(ctx, j, o)
+		}(j, o)
+	}
+	wg.Wait()
+
+	type item struct {
+		resp *ResponsesResponse
+		pos  listPos
+	}
+	var items []item
+	merged := ListPage{}
+	for j, page := range pages {
+		if errs[j] != nil {
+			return ListPage{}, errs[j]
+		}
+		for k, resp := range page.Data {
+			items = append(items, item{resp, listPos{page.Stamps[k], j}})
+		}
+		merged.HasMore = merged.HasMore || page.HasMore
+	}
+	sort.Slice(items, func(a, b int) bool {
+		if opts.Desc {
+			return items[b].pos.less(items[a].pos)
+		}
+		return items[a].pos.less(items[b].pos)
+	})
+	if len(items) > opts.Limit {
+		merged.HasMore = true
+		if opts.After == "" && opts.Before != "" {
+			// read back from before: keep the responses next to it
+			items = items[len(items)-opts.Limit:]
+		} else {
+			items = items[:opts.Limit]
+		}
+	}
+	merged.Data = make([]*ResponsesResponse, len(items))
+	merged.Stamps = make([]int64, len(items))
+	for i, it := range items {
+		merged.Data[i], merged.Stamps[i] = it.resp, it.pos.stamp
+	}
+	return merged, nil
+}
+
+// workerList reads a page from worker j's store: directly for this
+// worker, through a forwarded GET /v1/responses for another.
+func workerList(ctx context.Context, j int, opts ListOptions) (ListPage, error) {
+	p := workerPeers[j]
+	if p == nil {
+		return responseStore.List(opts)
+	}
+	q := url.Values{"limit": {strconv.Itoa(opts.Limit)}}
+	if !opts.Desc {
+		q.Set("order", "asc")
+	}
+	for _, v := range []struct {
+		key, id string
+		stamp   int64
+	}{{"after", opts.After, opts.AfterStamp}, {"before", opts.Before, opts.BeforeStamp}} {
+		if v.id != "" {
+			q.Set(v.key, v.id)
+		} else if v.stamp != 0 {
+			q.Set(v.key+"_stamp", strconv.FormatInt(v.stamp, 10))
+		}
+	}
+	req, err := http.NewRequestWithContext(ctx, http.MethodGet, "http://worker/v1/responses?"+q.Encode(), nil)
+	if err != nil {
+		return ListPage{}, err
+	}
+	req.Header.Set(headerForwarded, "1")
+	resp, err := p.Transport.RoundTrip(req)
+	if err != nil {
+		return ListPage{}, fmt.Errorf("%w: %d: %v", errWorkerUnreachable, j, err)
+	}
+	defer resp.Body.Close()
+	if resp.StatusCode != http.StatusOK {
+		var e struct {
+			Error struct {
+				Message string `json:"message"`
+			} `json:"error"`
+		}
+		if json.NewDecoder(resp.Body).Decode(&e) != nil || e.Error.Message == "" {
+			return ListPage{}, fmt.Errorf("%w: %d: %s", errWorkerUnreachable, j, resp.Status)
+		}
+		return ListPage{}, errors.New(e.Error.Message)
+	}
+	var page ListPage
+	if err := json.NewDecoder(resp.Body).Decode(&page); err != nil {
+		return ListPage{}, fmt.Errorf("%w: %d: %v", errWorkerUnreachable, j, err)
+	}
+	return page, nil
+}
+
+// listWorkerPart answers workerList: this worker's page, stamps included,
+// with the cursors either response IDs or stamps.
+func listWorkerPart(w http.ResponseWriter, r *http.Request, opts ListOptions) {
+	q := r.URL.Query()
+	for _, v := range []struct {
+		key   string
+		stamp *int64
+	}{{"after_stamp", &opts.AfterStamp}, {"before_stamp", &opts.BeforeStamp}} {
+		if s := q.Get(v.key); s != "" {
+			n, err := strconv.ParseInt(s, 10, 64)
+			if err != nil {
+				writeBadRequest(w, fmt.Errorf("%s: %v", v.key, err))
+				return
+			}
+			*v.stamp = n
+		}
+	}
+	page, err := responseStore.List(opts)
+	if err != nil {
+		writeBadRequest(w, err)
+		return
+	}
+	w.Header().Set("Content-Type", "application/json")
+	if err := json.NewEncoder(w).Encode(page); err != nil {
+		http.Error(w, err.Error(), http.StatusInternalServerError)
+	}
+}
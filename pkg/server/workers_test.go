@@ -0,0 +1,193 @@
+package server
+
+import (
+	"context"
+	"encoding/json"
+	"fmt"
+	"io"
+	"net/http"
+	"os"
+	"path/filepath"
+	"runtime"
+	"strings"
+	"testing"
+
+	cfg "mock-openai-server/pkg/server/config"
+)
+
+// TestWorkerProcess is not a test of its own: startWorkers re-runs this
+// test binary with only it selected as each worker process.
+func TestWorkerProcess(t *testing.T) {
+	if os.Getenv(envWorker) == "" {
+		t.Skip("run as a worker by startWorkers")
+	}
+	conf := &cfg.BotConfig{Fallback: cfg.RespondWrapper{Text: "The mock server is working correctly."}}
+	if err := conf.Compile(); err != nil {
+		t.Fatal(err)
+	}
+	cfg.Set(conf)
+	fmt.Fprintln(os.Stderr, Serve(ServeOptions{}))
+	os.Exit(1)
+}
+
+// startWorkers supervises n workers on a free loopback port and returns
+// the base URL.
+func startWorkers(tb testing.TB, n int) string {
+	tb.Helper()
+	prev := workerCommand
+	workerCommand = func() ([]string, error) {
+		return []string{os.Args[0], "-test.run=^TestWorkerProcess$"}, nil
+	}
+	tb.Cleanup(func() { workerCommand = prev })
+	ready := filepath.Join(tb.TempDir(), "ready")
+	ctx, cancel := context.WithCancel(context.Background())
+	done := make(chan error, 1)
+	go func() {
+		done <- superviseWorkers(ctx, n, ServeOptions{Listen: []string{"127.0.0.1:0"}, ReadyFile: ready})
+	}()
+	tb.Cleanup(func() {
+		cancel()
+		if err := <-done; err != nil {
+			tb.Errorf("workers: %v", err)
+		}
+	})
+	return waitReadyFile(tb, ready, done)[0]
+}
+
+func TestIDWorker(t *testing.T) {
+	prev := idTag
+	defer func() { idTag = prev }()
+	setIDWorker(7)
+	if w, ok := idWorker(generateResponseID()); !ok || w != 7 {
+		t.Fatalf("idWorker = %d, %v; want 7", w, ok)
+	}
+	if _, ok := idWorker("resp_abc"); ok {
+		t.Fatal("a foreign ID should not name a worker")
+	}
+}
+
+func TestWorkers(t *testing.T) {
+	base := startWorkers(t, 2)
+	// a connection per request, so the kernel spreads them over the workers
+	client := &http.Client{Transport: &http.Transport{DisableKeepAlives: true}}
+	var created []string
+	create := func(body string) string {
+		t.Helper()
+		resp, err := client.Post(base+"/v1/responses", "application/json", strings.NewReader(body))
+		if err != nil {
+			t.Fatal(err)
+		}
+		defer resp.Body.Close()
+		var out struct {
+			ID string `json:"id"`
+		}
+		if err := json.NewDecoder(resp.Body).Decode(&out); err != nil || resp.StatusCode != http.StatusOK {
+			t.Fatalf("status %d: %v", resp.StatusCode, err)
+		}
+		created = append(created, out.ID)
+		return out.ID
+	}
+
+	owned := map[int]string{} // a response made by each worker
+	for i := 0; i < 200 && len(owned) < 2; i++ {
+		id := create(`{"model":"gpt-4o","input":"hi"}`)
+		w, ok := idWorker(id)
+		if !ok {
+			t.Fatalf("malformed ID %q", id)
+		}
+		owned[w] = id
+	}
+	if len(owned) < 2 {
+		t.Fatalf("200 connections all went to worker %v", owned)
+	}
+
+	for w, id := range owned {
+		for i := 0; i < 10; i++ {
+			// whichever worker takes the follow-up, its owner answers it
+			next := create(`{"model":"gpt-4o","input":"again","previous_response_id":"` + id + `"}`)
+			if got, _ := idWorker(next); got != w {
+				t.Fatalf("follow-up to %s was answered by worker %d", id, got)
+			}
+			resp, err := client.Get(base + "/v1/responses/" + next)
+			if err != nil {
+				t.Fatal(err)
+			}
+			resp.Body.Close()
+			if resp.StatusCode != http.StatusOK {
+				t.Fatalf("GET %s: status %d", next, resp.StatusCode)
+			}
+		}
+	}
+
+	// listings merge every worker's responses in creation order, whichever
+	// worker takes each page
+	list := func(query string) (ids []string, hasMore bool) {
+		t.Helper()
+		resp, err := client.Get(base + "/v1/responses?" + query)
+		if err != nil {
+			t.Fatal(err)
+		}
+		defer resp.Body.Close()
+		var page struct {
+			Data []struct {
+				ID string `json:"id"`
+			} `json:"data"`
+			HasMore bool `json:"has_more"`
+		}
+		if err := json.NewDecoder(resp.Body).Decode(&page); err != nil || resp.StatusCode != http.StatusOK {
+			t.Fatalf("list %s: status %d: %v", query, resp.StatusCode, err)
+		}
+		for _, d := range page.Data {
+			ids = append(ids, d.ID)
+		}
+		return ids, page.HasMore
+	}
+	var desc []string
+	for query := "limit=7"; ; {
+		ids, more := list(query)
+		desc = append(desc, ids...)
+		if !more {
+			break
+		}
+		query = "limit=7&after=" + ids[len(ids)-1]
+	}
+	want := make([]string, len(created))
+	for i, id := range created {
+		want[len(created)-1-i] = id
+	}
+	if strings.Join(desc, " ") != strings.Join(want, " ") {
+		t.Fatalf("paged listing\n got %v\nwant %v", desc, want)
+	}
+	if ids, more := list("order=asc&limit=5&before=" + created[10]); strings.Join(ids, " ") != strings.Join(created[5:10], " ") || !more {
+		t.Fatalf("page before %s: %v (has_more %v), want %v", created[10], ids, more, created[5:10])
+	}
+}
+
+// BenchmarkWorkers measures Responses API throughput from concurrent
+// keep-alive clients against one worker and one per CPU.
+func BenchmarkWorkers(b *testing.B) {
+	body := `{"model":"gpt-4o","input":"hi"}`
+	counts := []int{1}
+	if c := runtime.NumCPU(); c > 1 {
+		counts = append(counts, c)
+	}
+	for _, n := range counts {
+		b.Run(fmt.Sprintf("workers=%d", n), func(b *testing.B) {
+			base := startWorkers(b, n)
+			client := &http.Client{Transport: &http.Transport{MaxIdleConnsPerHost: 64}}
+			b.SetParallelism(8)
+			b.ResetTimer()
+			b.RunParallel(func(pb *testing.PB) {
+				for pb.Next() {
+					resp, err := client.Post(base+"/v1/responses", "application/json", strings.NewReader(body))
+					if err != nil {
+						b.Error(err)
+						return
+					}
+					_, _ = io.Copy(io.Discard, resp.Body)
+					resp.Body.Close()
+				}
+			})
+		})
+	}
+}